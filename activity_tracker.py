@@ -0,0 +1,103 @@
+"""
+Activity Tracker for Ketha AI Agent
+Bounded per-user last-seen tracking with O(1) active-user counts,
+TTL eviction of idle users and a fixed-size event log
+"""
+
+import heapq
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional
+
+from dashboard_config import PERFORMANCE_CONFIG
+
+
+class ActivityTracker:
+    """
+    Users live in one of two OrderedDicts kept in last-seen order: `active`
+    (seen within active_window) and `idle` (seen within idle_ttl). A touch
+    moves the user to the end of `active`; expiry pops stale users off the
+    front of each, so every operation is amortised O(1) and the active
+    count is just len(active). max_users caps memory regardless of traffic
+    by evicting the least recently seen user.
+    """
+
+    def __init__(self, active_window: float = 300, idle_ttl: float = 3600, max_users: int = 10000,
+                 max_events: int = 1000, clock: Callable[[], float] = time.time):
+        self.active_window = active_window
+        self.idle_ttl = max(idle_ttl, active_window)
+        self.max_users = max_users
+        self.clock = clock
+        # user_id -> [last_seen, count]
+        self.active = OrderedDict()
+        self.idle = OrderedDict()
+        self.events = deque(maxlen=max_events)
+        self.peak_active = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+    def _expire(self, now: float):
+        active_cutoff = now - self.active_window
+        while self.active:
+            user_id, entry = next(iter(self.active.items()))
+            if entry[0] >= active_cutoff:
+                break
+            self.active.popitem(last=False)
+            self.idle[user_id] = entry
+        idle_cutoff = now - self.idle_ttl
+        while self.idle and next(iter(self.idle.values()))[0] < idle_cutoff:
+            self.idle.popitem(last=False)
+            self.evicted += 1
+
+    def _evict_overflow(self):
+        while len(self.active) + len(self.idle) > self.max_users:
+            (self.idle or self.active).popitem(last=False)
+            self.evicted += 1
+
+    def touch(self, user_id: str, action: Optional[str] = None):
+        """Record activity for a user, counting it towards their total"""
+        now = self.clock()
+        with self.lock:
+            entry = self.active.pop(user_id, None) or self.idle.pop(user_id, None) or [now, 0]
+            entry[0] = now
+            entry[1] += 1
+            self.active[user_id] = entry
+            self._expire(now)
+            self._evict_overflow()
+            if len(self.active) > self.peak_active:
+                self.peak_active = len(self.active)
+            if action is not None:
+                self.events.append((now, user_id, action))
+
+    def active_count(self) -> int:
+        with self.lock:
+            self._expire(self.clock())
+            return len(self.active)
+
+    def tracked_count(self) -> int:
+        """Users seen within idle_ttl that are still held"""
+        with self.lock:
+            self._expire(self.clock())
+            return len(self.active) + len(self.idle)
+
+    def top_users(self, limit: int = 20) -> Dict[str, int]:
+        """Most active tracked users by activity count"""
+        with self.lock:
+            entries = list(self.active.items()) + list(self.idle.items())
+        return {user_id: entry[1] for user_id, entry in heapq.nlargest(limit, entries, key=lambda item: item[1][1])}
+
+    def recent_events(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self.lock:
+            events = list(self.events)[-limit:]
+        return [{'timestamp': ts, 'user_id': user_id, 'action': action} for ts, user_id, action in events]
+
+
+def create_activity_tracker(max_events: int = None) -> ActivityTracker:
+    """A tracker sized from PERFORMANCE_CONFIG"""
+    return ActivityTracker(
+        active_window=PERFORMANCE_CONFIG["active_user_window"],
+        idle_ttl=PERFORMANCE_CONFIG["user_idle_ttl"],
+        max_users=PERFORMANCE_CONFIG["max_tracked_users"],
+        max_events=max_events if max_events is not None else PERFORMANCE_CONFIG["activity_log_size"]
+    )
@@ -5,8 +5,14 @@ Provides performance monitoring and metrics collection
 
 import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 from memory_utils import get_detailed_memory_info, get_memory_usage
+from histograms import latency_registry
+from metrics_rollup import rollup_store
+from metrics_store import metrics_store
+from activity_tracker import create_activity_tracker
+from sketches import HyperLogLog
+from shared_metrics import shared_metrics
 import logging
 from collections import defaultdict, deque
 import threading
@@ -20,25 +26,33 @@ except ImportError:
     logging.warning("psutil not available - using fallback memory monitoring")
 
 class AdminMetrics:
-    def __init__(self, max_history=100):
+    def __init__(self, max_history=100, shared=None):
         self.max_history = max_history
+        # Fleet-wide counters shared by every worker; None keeps the stats per process
+        self.shared = shared
         self.query_history = deque(maxlen=max_history)
         self.memory_history = deque(maxlen=max_history)
-        self.response_times = deque(maxlen=max_history)
+        # Monotonic sequence shared by query and memory events, used as a stream cursor
+        self.event_seq = 0
         self.error_count = 0
         self.total_queries = 0
         self.db_queries = 0
         self.bedrock_queries = 0
-        self.user_activity = defaultdict(int)
+        self.user_activity = create_activity_tracker(max_events=0)
+        self.unique_users = HyperLogLog()
         self.peak_memory = 0
         self.start_time = datetime.now()
         self.lock = threading.Lock()
         
-    def log_query(self, user_id: str, query: str, route: str, response_time: float, success: bool):
+    def log_query(self, user_id: str, query: str, route: str, response_time: float, success: bool,
+                  request_id: str = None):
         with self.lock:
             timestamp = datetime.now()
+            self.event_seq += 1
             self.query_history.append({
+                'seq': self.event_seq,
                 'timestamp': timestamp.isoformat(),
+                'request_id': request_id,
                 'user_id': user_id,
                 'query': query[:100] + "..." if len(query) > 100 else query,
                 'route': route,
@@ -55,31 +69,45 @@ class AdminMetrics:
             if not success:
                 self.error_count += 1
                 
-            self.user_activity[user_id] += 1
-            self.response_times.append(response_time)
+            self.unique_users.add(user_id)
+        self.user_activity.touch(user_id)
+        if self.shared is not None:
+            self.shared.record_query(user_id, route, response_time, success)
+        latency_registry.record("route", route, response_time)
+        latency_registry.record("route", "all", response_time)
+        rollup_store.record("latency", response_time)
+        rollup_store.record("requests")
+        if not success:
+            rollup_store.record("errors")
+        metrics_store.record_query(user_id, route, response_time, success, request_id)
             
-    def log_memory(self):
-        with self.lock:
+    def log_memory(self, memory_mb: Optional[float] = None):
+        """Record a memory sample; the system sampler calls this on every tick"""
+        if memory_mb is None:
             memory_mb = get_memory_usage()
+        with self.lock:
             if memory_mb > self.peak_memory:
                 self.peak_memory = memory_mb
                 
+            self.event_seq += 1
             self.memory_history.append({
+                'seq': self.event_seq,
                 'timestamp': datetime.now().isoformat(),
                 'memory_mb': memory_mb
             })
+        rollup_store.record("memory_mb", memory_mb)
+        metrics_store.record_sample("memory_mb", memory_mb)
             
     def get_stats(self, session_store=None) -> Dict[str, Any]:
+        if self.shared is not None:
+            return self._fleet_stats()
         with self.lock:
             uptime = datetime.now() - self.start_time
-            avg_response_time = sum(self.response_times) / len(self.response_times) if self.response_times else 0
+            recent = latency_registry.window("route", "all", 3600)
+            latency = recent.summary() if recent else {'avg': 0, 'p50': 0, 'p95': 0, 'p99': 0}
             
-            # Get active users count safely
-            active_users = 0
-            if session_store and hasattr(session_store, 'store'):
-                active_users = len(session_store.store)
-            elif session_store and isinstance(session_store, dict):
-                active_users = len(session_store)
+            # Sessions held in memory (a SessionStore or a plain dict)
+            active_users = len(session_store) if session_store is not None else 0
             
             return {
                 'uptime_hours': round(uptime.total_seconds() / 3600, 2),
@@ -87,14 +115,43 @@ class AdminMetrics:
                 'db_queries': self.db_queries,
                 'bedrock_queries': self.bedrock_queries,
                 'error_rate': round((self.error_count / max(self.total_queries, 1)) * 100, 2),
-                'avg_response_time': round(avg_response_time, 3),
+                'avg_response_time': round(latency['avg'], 3),
+                'p50_response_time': round(latency['p50'], 3),
+                'p95_response_time': round(latency['p95'], 3),
+                'p99_response_time': round(latency['p99'], 3),
                 'peak_memory': self.peak_memory,
                 'current_memory': get_memory_usage(),
                 'active_users': active_users,
-                'unique_users': len(self.user_activity),
+                'unique_users': self.unique_users.count(),
                 'queries_per_hour': round(self.total_queries / max(uptime.total_seconds() / 3600, 1), 2)
             }
             
+    def _fleet_stats(self) -> Dict[str, Any]:
+        """get_stats() summed over every worker sharing the metrics file"""
+        fleet = self.shared.read()
+        counters, gauges = fleet['counters'], fleet['gauges']
+        recent, _ = self.shared.window("route", 3600)
+        latency = recent.summary()
+        uptime_seconds = time.time() - fleet['started_at']
+        return {
+            'uptime_hours': round(uptime_seconds / 3600, 2),
+            'total_queries': counters['queries'],
+            'db_queries': counters['db_queries'],
+            'bedrock_queries': counters['bedrock_queries'],
+            'error_rate': round((counters['errors'] / max(counters['queries'], 1)) * 100, 2),
+            'avg_response_time': round(latency['avg'], 3),
+            'p50_response_time': round(latency['p50'], 3),
+            'p95_response_time': round(latency['p95'], 3),
+            'p99_response_time': round(latency['p99'], 3),
+            'peak_memory': max(gauges['peak_memory_mb'], self.peak_memory),
+            'current_memory': get_memory_usage(),
+            'fleet_memory': round(gauges['rss_mb'], 2),
+            'workers': fleet['workers'],
+            'active_users': int(gauges['sessions']),
+            'unique_users': fleet['unique_users'],
+            'queries_per_hour': round(counters['queries'] / max(uptime_seconds / 3600, 1), 2)
+        }
+
     def get_memory_history(self) -> List[Dict[str, Any]]:
         with self.lock:
             return list(self.memory_history)
@@ -103,5 +160,14 @@ class AdminMetrics:
         with self.lock:
             return list(self.query_history)
 
+    def events_since(self, cursor: int) -> Tuple[Dict[str, List[Dict[str, Any]]], int]:
+        """Query and memory events with seq above cursor, and the new cursor"""
+        with self.lock:
+            events = {
+                'queries': [entry for entry in self.query_history if entry['seq'] > cursor],
+                'memory': [entry for entry in self.memory_history if entry['seq'] > cursor]
+            }
+            return events, self.event_seq
+
 # Global metrics instance
-admin_metrics = AdminMetrics()
\ No newline at end of file
+admin_metrics = AdminMetrics(shared=shared_metrics)
\ No newline at end of file
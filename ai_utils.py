@@ -1,21 +1,28 @@
 import os
 import json
 import time
+import uuid
 import pandas as pd
 import numpy as np
-from io import StringIO
 from sqlalchemy import text
 from threading import Lock
 from dotenv import load_dotenv
 from sql_agent import get_sql_agent
 from langchain_core.output_parsers import JsonOutputParser
 from datetime import datetime
-from database import execute_query
+from columnar import FORMATS, ColumnarResult, render_formats
+from database import capture_query_results, execute_query
+from deadline import DeadlineExceeded, bedrock_client_config, get_current_deadline
+from memory_governor import memory_governor, MemoryBudgetExceeded
+from history_manager import history_manager
+from result_cache import result_cache
+from result_pages import encode_cursor
+from tracing import span, traced, get_current_trace, get_tracing_callbacks
 from typing import Dict, Any, Optional, List
 import re
 import logging
 from functools import lru_cache
-import gc
+from urllib.parse import urlencode
 
 load_dotenv()
 
@@ -33,14 +40,22 @@ def get_sentence_model():
     if _sentence_model is None:
         from sentence_transformers import SentenceTransformer
         # Using much lighter model to save memory and improve performance
-        _sentence_model = SentenceTransformer('paraphrase-MiniLM-L3-v2')
+        model = SentenceTransformer('paraphrase-MiniLM-L3-v2')
+        # Inference only: no autograd state is attached to (or written into) the shared weights
+        model.eval()
+        for parameter in model.parameters():
+            parameter.requires_grad_(False)
+        _sentence_model = model
     return _sentence_model
 
 def get_generic_embeddings():
-    """Lazy load generic response embeddings - focused on DB-related generic responses"""
+    """
+    Lazy load generic response embeddings - focused on DB-related generic responses.
+    Kept as one read-only, L2-normalised float32 NumPy buffer: a dot product
+    gives cosine similarity, and the pages stay shared after fork.
+    """
     global _generic_embeddings
     if _generic_embeddings is None:
-        from sentence_transformers import util
         # More specific generic responses that indicate database query is needed
         GENERIC_RESPONSES = [
             "I don't have that information about your data.",
@@ -51,23 +66,32 @@ def get_generic_embeddings():
             "I cannot access your farm records."
         ]
         model = get_sentence_model()
-        _generic_embeddings = model.encode(GENERIC_RESPONSES)
+        embeddings = np.asarray(model.encode(GENERIC_RESPONSES, convert_to_numpy=True), dtype=np.float32)
+        embeddings = np.ascontiguousarray(embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True))
+        embeddings.setflags(write=False)
+        _generic_embeddings = embeddings
     return _generic_embeddings
 
 def call_bedrock(prompt: str, system_prompt: str = "") -> str:
     global last_bedrock_call_time
+    deadline = get_current_deadline()
     with bedrock_call_lock:
+        if deadline is not None:
+            deadline.check("bedrock call")
         current_time = time.time()
         elapsed = current_time - last_bedrock_call_time
         if elapsed < MIN_CALL_INTERVAL:
             time.sleep(MIN_CALL_INTERVAL - elapsed)
+        if deadline is not None:
+            deadline.check("bedrock call")
         try:
             import boto3
             bedrock = boto3.client(
                 service_name='bedrock-runtime',
                 region_name=os.getenv("AWS_REGION"),
                 aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
+                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                config=bedrock_client_config()
             )
             body = json.dumps({
                 "anthropic_version": "bedrock-2023-05-31",
@@ -76,12 +100,13 @@ def call_bedrock(prompt: str, system_prompt: str = "") -> str:
                 "system": system_prompt,
                 "messages": [{"role": "user", "content": [{"type": "text", "text": prompt}]}]
             })
-            response = bedrock.invoke_model(
-                modelId='anthropic.claude-3-sonnet-20240229-v1:0',
-                contentType='application/json',
-                accept='application/json',
-                body=body
-            )
+            with span("bedrock_call", prompt_chars=len(prompt)):
+                response = bedrock.invoke_model(
+                    modelId='anthropic.claude-3-sonnet-20240229-v1:0',
+                    contentType='application/json',
+                    accept='application/json',
+                    body=body
+                )
             last_bedrock_call_time = time.time()
             result = json.loads(response['body'].read())
             text = result['content'][0]['text']
@@ -89,6 +114,8 @@ def call_bedrock(prompt: str, system_prompt: str = "") -> str:
                 return "Hi, I am Ketha AI! Ask me anything about your farm data."
             return text
         except Exception as e:
+            if deadline is not None and deadline.expired():
+                deadline.check("bedrock call")
             print("Bedrock Error:", str(e))
             return f"An error occurred: {str(e)}"
 
@@ -102,6 +129,39 @@ def get_schema_words():
         schema_words.update([w.lower() for w in parts if w and w.isalpha()])
     return schema_words
 
+def warm_caches(heavy_hitters: List[Dict[str, Any]]) -> List[str]:
+    """
+    Load what the most frequent query patterns will need before a request
+    has to: the schema caches that routing and the SQL agent read, and the
+    sentence model used to check Bedrock answers if Bedrock-routed patterns
+    are among the heavy hitters. Returns the names of what was loaded.
+    """
+    warmed = []
+    routes = {hit.get('route') for hit in heavy_hitters}
+    if not routes:
+        return warmed
+    if not get_schema_words.cache_info().currsize:
+        get_schema_words()
+        warmed.append("schema")
+    if "database" in routes:
+        from sql_agent import get_valid_tables_and_columns, get_join_guides
+        for loader in (get_valid_tables_and_columns, get_join_guides):
+            if not loader.cache_info().currsize:
+                loader()
+                warmed.append(loader.__name__)
+    if "bedrock" in routes and _generic_embeddings is None:
+        get_generic_embeddings()
+        warmed.append("sentence_model")
+    return warmed
+
+def preload_shared_assets() -> List[str]:
+    """
+    Materialise the read-only assets every request path uses: the schema
+    caches, the sentence model and the generic-response embeddings. Called
+    before forking workers, so they share one copy of each.
+    """
+    return warm_caches([{'route': "database"}, {'route': "bedrock"}])
+
 def needs_db_query(query: str) -> bool:
     """Determine if a query needs database access"""
     query_lower = query.lower().strip()
@@ -234,30 +294,18 @@ def analyze_data(df: pd.DataFrame) -> Dict[str, Any]:
             })
     return analysis
 
-def format_results(data) -> Dict[str, Any]:
-    if not data:
-        return {
-            "markdown": "No data available",
-            "json": {"data": []},
-            "csv": ""
-        }
+@traced("format_results")
+def format_results(data, formats=FORMATS, records: Optional[List[dict]] = None) -> Dict[str, Any]:
+    """
+    The requested renderings (markdown, csv, json) of a ColumnarResult or a
+    list of row dicts, limited to 1000 rows. Nothing is rendered when no
+    format is requested.
+    """
     try:
         # Limit data size to prevent memory issues
-        limited_data = data[:1000] if len(data) > 1000 else data
-        df = pd.DataFrame(limited_data)
-        
-        # Use more memory-efficient operations
-        markdown = df.to_markdown(index=False, max_rows=50)
-        csv_buffer = StringIO()
-        df.to_csv(csv_buffer, index=False)
-        csv = csv_buffer.getvalue()
-        csv_buffer.close()  # Explicitly close to free memory
-        
-        return {
-            "markdown": markdown,
-            "json": {"data": limited_data},
-            "csv": csv
-        }
+        if not isinstance(data, ColumnarResult):
+            data = ColumnarResult.from_records(data[:1000])
+        return render_formats(data.head(1000), formats, records[:1000] if records is not None else None)
     except Exception as e:
         print(f"Formatting error: {str(e)}")
         return {
@@ -356,11 +404,10 @@ def is_generic_response(text: str, threshold: float = 0.85) -> bool:
     # Only use semantic similarity for responses that might be data-related generics
     if any(word in text_lower for word in ["data", "information", "database", "farm", "don't", "cannot", "unable"]):
         try:
-            from sentence_transformers import util
             model = get_sentence_model()
             embeddings = get_generic_embeddings()
-            text_embedding = model.encode([text])
-            similarities = util.cos_sim(text_embedding, embeddings)
+            text_embedding = np.asarray(model.encode([text], convert_to_numpy=True)[0], dtype=np.float32)
+            similarities = embeddings @ (text_embedding / np.linalg.norm(text_embedding))
             if similarities.max() > threshold:
                 return True
         except Exception as e:
@@ -368,28 +415,57 @@ def is_generic_response(text: str, threshold: float = 0.85) -> bool:
     
     return False
 
+@traced("build_prompt")
 def build_prompt(query: str, history: Optional[List[dict]]) -> str:
+    """
+    The question with its conversation context, fitted to the history token
+    budget: older turns arrive as a summary, table dumps as references
+    """
     prompt = ""
     if history:
-        prompt += "Previous conversation:\n"
-        for turn in history:
-            if turn.get("isUser", True):
-                prompt += f"User: {turn['text']}\n"
-            else:
-                prompt += f"AI: {turn['text']}\n"
-        prompt += "\n"
+        prepared = history_manager.prepare(history)
+        history_manager.record(prepared)
+        if prepared.summary:
+            prompt += f"Summary of earlier conversation:\n{prepared.summary}\n\n"
+        if prepared.messages:
+            prompt += "Previous conversation:\n"
+            for role, text in prepared.messages:
+                prompt += f"{'User' if role == 'user' else 'AI'}: {text}\n"
+            prompt += "\n"
     prompt += f"Current question: {query}\n"
     return prompt
 
-def handle_db_query(query: str, chiller_id: Optional[int] = None, history: Optional[list] = None) -> Dict[str, Any]:
+def handle_db_query(query: str, chiller_id: Optional[int] = None, history: Optional[list] = None,
+                    columnar: bool = False, formats: Optional[List[str]] = None, user_id=None) -> Dict[str, Any]:
+    """
+    Answer a data question with the SQL agent. The agent's result is shared
+    as one ColumnarResult by formatting, charting and analysis; with
+    columnar the rows go out as value lists under `rows` instead of dicts
+    under `data`. Only the requested formats are rendered; the result is
+    cached so the others can be fetched later from /results/{result_id} by
+    user_id with the response's result_token.
+    Only the first page of a longer result is fetched; next_cursor pages
+    through the rest with /query/{result_id}/rows.
+    """
     if chiller_id is not None:
         prompt = f"{build_prompt(query, history or [])}\nChiller ID: {chiller_id}\n"
     else:
         prompt = build_prompt(query, history or [])
     
+    deadline = get_current_deadline()
     agent = get_sql_agent()
     try:
-        result = agent.invoke({"input": prompt})
+        if deadline is not None:
+            # The executor stops between agent steps once the budget is spent
+            deadline.check("agent")
+            agent.max_execution_time = deadline.remaining()
+        # The SQL tool hands its rows over here; the agent only sees a sample of them
+        with span("agent") as current, capture_query_results() as capture:
+            result = agent.invoke({"input": prompt}, config={"callbacks": get_tracing_callbacks()})
+            if current is not None:
+                current.attributes['rows'] = len(capture.result)
+        if deadline is not None:
+            deadline.check("agent")
         # Handle different possible result formats
         text = result.get("output") or result.get("final_answer") or result.get("text") or ""
         
@@ -397,35 +473,66 @@ def handle_db_query(query: str, chiller_id: Optional[int] = None, history: Optio
         if "anthropic" in text.lower():
             text = "Hi, I am Ketha AI! Ask me anything about your farm data."
         
-        data = result.get("data", [])
-        formats = format_results(data)
-        is_table = bool(data)
+        result_set = capture.result
+        data, rows = ([], result_set.to_rows()) if columnar else (result_set.to_records(), [])
+        columns = max(result_set.width, 1)
+        is_table = bool(len(result_set))
+        result_id = None
+        result_token = None
+        next_cursor = None
+        if is_table:
+            trace = get_current_trace()
+            result_id = trace.request_id if trace is not None else uuid.uuid4().hex
+            # The id is in traces and admin metrics; the token that unlocks the result is only in this response
+            result_token = result_cache.put(result_id, result_set, capture.query, owner=user_id).token
+            if capture.more:
+                # This response is page 0; the client asks for the rest when it needs it
+                next_cursor = encode_cursor(result_id, 1)
+        rendered = {}
+        if formats:
+            # Reserve memory for each expensive stage; under pressure they run on fewer rows
+            with memory_governor.reserve("format_results", min(len(result_set), 1000), columns) as grant:
+                rendered = format_results(result_set.head(grant.rows), formats,
+                                          records=data[:grant.rows] if data else None)
+                if grant.rows < len(result_set) or capture.more:
+                    # Say so rather than clip silently; the export streams every row
+                    rendered["truncated_to"] = grant.rows
+                    rendered["export"] = f"/results/{result_id}/export?" + urlencode(
+                        {"token": result_token, "user_id": user_id} if user_id is not None else {"token": result_token})
         is_chart = False
         chart_config = {}
         analysis = {}
         
-        if data:
-            df = pd.DataFrame(data)
-            chart = generate_chart_config(df)
-            if chart:
-                is_chart = True
-                chart_config = chart
-            analysis = analyze_data(df)
-            # Clean up DataFrame to free memory
-            del df
-            gc.collect()
+        if is_table:
+            with memory_governor.reserve("analysis", len(result_set), columns) as grant:
+                # A view over the result's arrays, not another copy of the rows
+                df = result_set.head(grant.rows).to_frame()
+                chart = generate_chart_config(df)
+                if chart:
+                    is_chart = True
+                    chart_config = chart
+                analysis = analyze_data(df)
+                # Dropping the last reference frees the DataFrame; no cycle collection needed
+                del df
         
         return {
             "text": text,
             "final_answer": text,
             "data": data,
-            "formats": formats,
+            "columns": result_set.describe(),
+            "rows": rows,
+            "result_id": result_id,
+            "result_token": result_token,
+            "next_cursor": next_cursor,
+            "formats": rendered,
             "isReport": is_table,
             "isTable": is_table,
             "isChart": is_chart,
             "chartConfig": chart_config,
             "analysis": analysis
         }
+    except (DeadlineExceeded, MemoryBudgetExceeded):
+        raise
     except Exception as e:
         logging.error(f"DB Query Error: {str(e)}", exc_info=True)
         
@@ -442,7 +549,7 @@ def handle_db_query(query: str, chiller_id: Optional[int] = None, history: Optio
                         "text": extracted_text,
                         "final_answer": extracted_text,
                         "data": [],
-                        "formats": format_results([]),
+                        "formats": format_results([], formats or ()),
                         "isReport": False,
                         "isTable": False,
                         "isChart": False,
@@ -456,7 +563,7 @@ def handle_db_query(query: str, chiller_id: Optional[int] = None, history: Optio
             "text": "Sorry, I couldn't retrieve the requested data due to an internal error.",
             "final_answer": "Sorry, I couldn't retrieve the requested data due to an internal error.",
             "data": [],
-            "formats": format_results([]),
+            "formats": format_results([], formats or ()),
             "isReport": False,
             "isTable": False,
             "isChart": False,
@@ -0,0 +1,331 @@
+"""
+Benchmarks for Ketha AI Agent
+Micro-benchmarks for the monitoring hot paths. Run with: python benchmarks.py
+"""
+
+import gc
+import json
+import statistics
+import sys
+import threading
+import time
+
+
+def _percentile(samples, quantile):
+    ordered = sorted(samples)
+    return ordered[min(int(quantile * len(ordered)), len(ordered) - 1)]
+
+
+def bench_summary_contention(pollers: int = 50, writers: int = 4, duration: float = 3.0, mode: str = "snapshot",
+                             poll_interval: float = 0.1):
+    """
+    Time the per-request monitoring calls while `pollers` dashboards each
+    read the performance summary every poll_interval seconds (100x the real
+    10 s refresh). Polls are served from one thread, as FastAPI serves them
+    from the event loop. mode="snapshot" reads the published summary;
+    mode="recompute" rebuilds it on every poll, as the dashboard did before
+    summaries were published in the background.
+    """
+    from performance_monitor import PerformanceMonitor
+
+    monitor = PerformanceMonitor()
+    monitor.start_snapshotter()
+    read = monitor.get_performance_summary if mode == "snapshot" else monitor.build_summary
+    stop = threading.Event()
+    latencies = [[] for _ in range(writers)]
+    polls = [0]
+
+    def request_path(index):
+        i = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            user_id = f"user-{index}-{i % 500}"
+            monitor.log_user_session(user_id, "query_start")
+            monitor.log_query_pattern(f"show milk collected by farmer {i} on 2024-01-{i % 28 + 1:02d}", "database")
+            monitor.log_db_performance("SELECT * FROM milk_collections JOIN farmers USING (farmer_id)", 0.05, True)
+            monitor.log_user_session(user_id, "query_success")
+            latencies[index].append(time.perf_counter() - started)
+            i += 1
+
+    def event_loop():
+        while not stop.is_set():
+            for _ in range(pollers):
+                read()
+                polls[0] += 1
+            time.sleep(poll_interval)
+
+    threads = [threading.Thread(target=request_path, args=(i,)) for i in range(writers)]
+    if pollers:
+        threads.append(threading.Thread(target=event_loop))
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    samples = [latency for per_writer in latencies for latency in per_writer]
+    return {
+        'mode': mode,
+        'pollers': pollers,
+        'requests': len(samples),
+        'polls': polls[0],
+        'p50_us': _percentile(samples, 0.5) * 1e6,
+        'p99_us': _percentile(samples, 0.99) * 1e6,
+        'mean_us': statistics.fmean(samples) * 1e6
+    }
+
+
+def _simulated_request(i: int) -> int:
+    """Allocation pattern of one /query: result rows, a few reference cycles, JSON out"""
+    rows = [{'farmer_id': n, 'name': f"farmer {n}", 'litres': n * 1.5, 'date': f"2024-01-{n % 28 + 1:02d}"}
+            for n in range(300)]
+    for _ in range(20):
+        node = {'request': i, 'rows': rows}
+        node['self'] = node  # callback handlers and tracebacks form cycles like this
+    return len(json.dumps(rows))
+
+
+def bench_gc_policy(requests: int = 300, mode: str = "adaptive", heap_objects: int = 200_000):
+    """
+    Throughput, latency and RSS of simulated requests over a heap of
+    long-lived objects (standing in for loaded models and caches).
+    mode="per_request" forces gc.collect() after each request, as the
+    memory_cleanup decorator did; mode="adaptive" runs the GC manager.
+    """
+    from gc_manager import GCManager
+    from system_sampler import system_sampler
+
+    heap = [{'key': n, 'values': [n, str(n)]} for n in range(heap_objects)]
+    manager = GCManager(pressure_mb=float("inf"), idle_delay=3600)
+    if mode == "adaptive":
+        manager.start()
+        manager.freeze()
+    start_rss = system_sampler.sample()['rss_mb']
+    latencies = []
+    pause = 0.0
+    started = time.perf_counter()
+    for i in range(requests):
+        request_started = time.perf_counter()
+        _simulated_request(i)
+        if mode == "per_request":
+            collect_started = time.perf_counter()
+            gc.collect()
+            pause += time.perf_counter() - collect_started
+        latencies.append(time.perf_counter() - request_started)
+    elapsed = time.perf_counter() - started
+    end_rss = system_sampler.sample()['rss_mb']
+    if mode == "adaptive":
+        stats = manager.get_stats()
+        pause = sum(generation['total_ms'] for generation in stats['pauses'].values()) / 1000
+        manager.stop()
+    del heap
+    gc.collect()
+    return {
+        'mode': mode,
+        'requests': requests,
+        'throughput': requests / elapsed,
+        'p50_ms': _percentile(latencies, 0.5) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'gc_pause_ms': pause * 1000,
+        'rss_growth_mb': end_rss - start_rss
+    }
+
+
+def bench_session_store(users: int = 10_000, operations: int = 40_000, threads: int = 4, backend: str = "memory",
+                        front: int = 10_000, stripes: int = 16):
+    """
+    Read and write latency of the session store with `users` active users,
+    each operation a /query's get_session() then add_to_session() for a
+    random user. front is how many sessions the in-memory tier holds; with
+    backend="sqlite" and front < users, misses read through from SQLite
+    while the write-behind thread flushes. stripes=1 is a single global lock.
+    """
+    import os
+    import random
+    import tempfile
+    from session_store import SessionStore, SQLiteSessionBackend
+
+    directory = tempfile.mkdtemp()
+    durable = SQLiteSessionBackend(os.path.join(directory, "sessions.db")) if backend == "sqlite" else None
+    store = SessionStore(max_users=front, max_history=10, idle_ttl=3600, max_total_bytes=1 << 30,
+                         stripes=stripes, backend=durable)
+    turn = {"user": "how much milk did farmer 42 deliver last week?", "ai": "Farmer 42 delivered 312 litres." * 4}
+    for user in range(users):
+        store.add_to_session(f"user{user}", turn)
+    store.flush()
+    for stripe in store.stripes:
+        stripe.hits = stripe.loads = stripe.misses = 0  # hit rate of the measured operations only
+    store.start()
+    reads = [[] for _ in range(threads)]
+    writes = [[] for _ in range(threads)]
+
+    def client(index):
+        rng = random.Random(index)
+        for _ in range(operations // threads):
+            user_id = f"user{rng.randrange(users)}"
+            started = time.perf_counter()
+            store.get_session(user_id)
+            read_done = time.perf_counter()
+            store.add_to_session(user_id, turn)
+            reads[index].append(read_done - started)
+            writes[index].append(time.perf_counter() - read_done)
+
+    workers = [threading.Thread(target=client, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    store.stop()
+    stats = store.get_stats()
+    if durable is not None:
+        durable.close()
+    read_samples = [sample for per_thread in reads for sample in per_thread]
+    write_samples = [sample for per_thread in writes for sample in per_thread]
+    return {
+        'backend': backend,
+        'front': front,
+        'stripes': stripes,
+        'ops_per_s': len(read_samples) / elapsed,
+        'read_p50_us': _percentile(read_samples, 0.5) * 1e6,
+        'read_p99_us': _percentile(read_samples, 0.99) * 1e6,
+        'write_p50_us': _percentile(write_samples, 0.5) * 1e6,
+        'write_p99_us': _percentile(write_samples, 0.99) * 1e6,
+        'hit_rate': stats['hit_rate']
+    }
+
+
+def bench_result_formats(rows: int = 1000, requests: int = 200, formats=("markdown", "csv", "json")):
+    """
+    CPU time and response bytes of a DB answer's result handling: building
+    the row dicts, rendering `formats` and serializing the response, for a
+    synthetic result of `rows` collection records. formats=() is the lazy
+    default, where renderings are fetched from /results/{id} only if needed.
+    """
+    from datetime import date, timedelta
+    from columnar import ColumnarResult, render_formats
+
+    start_day = date(2024, 1, 1)
+    result = ColumnarResult.from_rows(
+        ["collection_date", "chiller", "farmer", "quantity", "fat_percent"],
+        [(start_day + timedelta(days=i % 365), f"Chiller {i % 12}", f"Farmer {i % 400}", 20 + i % 37, 3.5 + (i % 9) / 10)
+         for i in range(rows)]
+    )
+    cpu, sizes = [], []
+    for _ in range(requests):
+        started = time.process_time()
+        records = result.to_records()
+        body = json.dumps({"text": "Here are your results:", "data": records,
+                           "formats": render_formats(result, formats, records)}, default=str)
+        cpu.append(time.process_time() - started)
+        sizes.append(len(body))
+    return {
+        'formats': ",".join(formats) or "lazy",
+        'rows': rows,
+        'cpu_ms': statistics.mean(cpu) * 1000,
+        'p99_cpu_ms': _percentile(cpu, 0.99) * 1000,
+        'response_kb': statistics.mean(sizes) / 1024
+    }
+
+
+def bench_export(rows: int = 5_000_000, chunk_rows: int = 10_000, format_name: str = "csv"):
+    """
+    Stream `rows` synthetic collection records through an export encoder in
+    chunks of chunk_rows, the way /results/{id}/export pulls them from a
+    server-side cursor, and sample RSS throughout. Peak RSS should not grow
+    with rows.
+    """
+    from datetime import date, timedelta
+    from columnar import ColumnarResult
+    from result_export import ExportStats
+    from system_sampler import read_process_memory
+
+    names = ["collection_date", "chiller", "farmer", "quantity", "fat_percent"]
+    days = [date(2024, 1, 1) + timedelta(days=day) for day in range(365)]
+    chillers = [f"Chiller {i}" for i in range(12)]
+    farmers = [f"Farmer {i}" for i in range(400)]
+
+    def cursor():
+        for offset in range(0, rows, chunk_rows):
+            yield ColumnarResult.from_rows(names, [
+                (days[i % 365], chillers[i % 12], farmers[i % 400], 20 + i % 37, 3.5 + (i % 9) / 10)
+                for i in range(offset, min(offset + chunk_rows, rows))
+            ])
+
+    peak = [read_process_memory()['rss_mb']]
+    start_rss = peak[0]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.05):
+            peak[0] = max(peak[0], read_process_memory()['rss_mb'])
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    stats = ExportStats()
+    started = time.perf_counter()
+    sent = sum(len(data) for data in stats.track(cursor(), format_name))
+    elapsed = time.perf_counter() - started
+    done.set()
+    sampler.join()
+    return {
+        'format': format_name,
+        'rows': stats.get_stats()['rows'],
+        'rows_per_s': rows / elapsed,
+        'output_mb': sent / (1024 * 1024),
+        'start_rss_mb': start_rss,
+        'peak_rss_mb': peak[0]
+    }
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    # First, while the process holds nothing but its imports
+    print("📦 Streaming export of 5M synthetic collection rows")
+    print(f"{'format':<8} {'rows':>9} {'rows/s':>9} {'out MB':>7} {'start MB':>9} {'peak MB':>8}")
+    from columnar import ARROW_AVAILABLE
+    for format_name in ("csv", "parquet", "arrow") if ARROW_AVAILABLE else ("csv",):
+        result = bench_export(format_name=format_name)
+        print(f"{result['format']:<8} {result['rows']:>9} {result['rows_per_s']:>9.0f} {result['output_mb']:>7.1f} "
+              f"{result['start_rss_mb']:>9.1f} {result['peak_rss_mb']:>8.1f}")
+
+    print()
+    print("📊 Request-path latency of monitoring calls under dashboard polling")
+    print(f"{'mode':<10} {'pollers':>7} {'requests':>9} {'polls':>9} {'p50 µs':>8} {'p99 µs':>8} {'mean µs':>8}")
+    for pollers, mode in ((0, "snapshot"), (50, "snapshot"), (50, "recompute")):
+        result = bench_summary_contention(pollers=pollers, duration=duration, mode=mode)
+        print(f"{result['mode']:<10} {result['pollers']:>7} {result['requests']:>9} {result['polls']:>9} "
+              f"{result['p50_us']:>8.1f} {result['p99_us']:>8.1f} {result['mean_us']:>8.1f}")
+
+    print()
+    print("🧹 Simulated requests under each garbage-collection policy")
+    print(f"{'mode':<12} {'requests':>8} {'req/s':>8} {'p50 ms':>7} {'p99 ms':>7} {'gc ms':>8} {'rss +MB':>8}")
+    for mode in ("per_request", "adaptive"):
+        result = bench_gc_policy(mode=mode)
+        print(f"{result['mode']:<12} {result['requests']:>8} {result['throughput']:>8.0f} {result['p50_ms']:>7.2f} "
+              f"{result['p99_ms']:>7.2f} {result['gc_pause_ms']:>8.0f} {result['rss_growth_mb']:>8.1f}")
+
+    print()
+    print("💬 Session store read/write latency at 10k active users")
+    print(f"{'backend':<8} {'front':>6} {'stripes':>7} {'ops/s':>8} {'read p50':>9} {'read p99':>9} "
+          f"{'write p50':>9} {'write p99':>9} {'hit %':>6}")
+    for backend, front, stripes in (("memory", 10_000, 1), ("memory", 10_000, 16),
+                                    ("sqlite", 10_000, 16), ("sqlite", 2_000, 16)):
+        result = bench_session_store(backend=backend, front=front, stripes=stripes)
+        print(f"{result['backend']:<8} {result['front']:>6} {result['stripes']:>7} {result['ops_per_s']:>8.0f} "
+              f"{result['read_p50_us']:>9.1f} {result['read_p99_us']:>9.1f} {result['write_p50_us']:>9.1f} "
+              f"{result['write_p99_us']:>9.1f} {result['hit_rate']:>6.1f}")
+
+    print()
+    print("📄 Result handling per DB answer: every format rendered vs lazy formats")
+    print(f"{'formats':<20} {'rows':>6} {'cpu ms':>8} {'p99 ms':>8} {'resp KB':>8}")
+    for formats in (("markdown", "csv", "json"), ()):
+        result = bench_result_formats(formats=formats)
+        print(f"{result['formats']:<20} {result['rows']:>6} {result['cpu_ms']:>8.2f} {result['p99_cpu_ms']:>8.2f} "
+              f"{result['response_kb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
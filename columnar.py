@@ -0,0 +1,298 @@
+"""
+Columnar Results for Ketha AI Agent
+A query result held once as column names plus one typed NumPy array per
+column. Formatting, analysis and charting read it through zero-copy views
+(head(), to_frame()); per-row Python objects are only built when the result
+is serialized, either as records or as the compact columns/rows layout.
+"""
+
+import io
+import json
+import math
+import zipfile
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Optional pyarrow import for Parquet and Arrow IPC exports
+try:
+    import pyarrow as pa
+    ARROW_AVAILABLE = True
+except ImportError:
+    pa = None
+    ARROW_AVAILABLE = False
+
+_NUMBER_TYPES = (int, float, Decimal, np.integer, np.floating)
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+# Typical size of a short string or date object held in an object column
+OBJECT_CELL_BYTES = 56
+
+# Column kind -> type reported to clients
+_CLIENT_TYPES = {
+    "integer": "number",
+    "float": "number",
+    "boolean": "boolean",
+    "datetime": "datetime",
+    "text": "text",
+    "null": "unknown",
+}
+
+
+def _to_array(values: Sequence[Any]):
+    """(array, kind) for one column's values; None becomes NaN in numeric columns"""
+    present = [value for value in values if value is not None]
+    nulls = len(present) != len(values)
+    if not present:
+        return np.array(values, dtype=object), "null"
+    if all(isinstance(value, (bool, np.bool_)) for value in present):
+        if nulls:
+            return np.array(values, dtype=object), "boolean"
+        return np.array(values, dtype=np.bool_), "boolean"
+    if all(isinstance(value, _NUMBER_TYPES) and not isinstance(value, bool) for value in present):
+        integers = all(isinstance(value, (int, np.integer)) for value in present)
+        if integers and not nulls and _INT64_MIN <= min(present) and max(present) <= _INT64_MAX:
+            return np.array(values, dtype=np.int64), "integer"
+        array = np.array([math.nan if value is None else float(value) for value in values], dtype=np.float64)
+        return array, "integer" if integers else "float"
+    if all(isinstance(value, (date, datetime, time)) for value in present):
+        return np.array(values, dtype=object), "datetime"
+    return np.array(values, dtype=object), "text"
+
+
+# Temporal cells of object columns, by type, in to_bytes(); datetime is checked before its base class date
+_TEMPORAL_TYPES = (("datetime", datetime), ("date", date), ("time", time))
+_TEMPORAL_PARSERS = {"datetime": datetime.fromisoformat, "date": date.fromisoformat, "time": time.fromisoformat}
+
+
+def _encode_objects(array: np.ndarray, kind: str) -> List[Any]:
+    """An object column as JSON values; temporal cells become [type, ISO string]"""
+    values = array.tolist()
+    if kind != "datetime":
+        return values
+    return [None if value is None else
+            next([name, value.isoformat()] for name, cls in _TEMPORAL_TYPES if isinstance(value, cls))
+            for value in values]
+
+
+def _decode_objects(values: List[Any], kind: str) -> np.ndarray:
+    if kind == "datetime":
+        values = [None if value is None else _TEMPORAL_PARSERS[value[0]](value[1]) for value in values]
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _unique_names(names: Iterable[str]) -> List[str]:
+    """Column names made unique (joins often return two "name" columns)"""
+    seen, unique = {}, []
+    for name in names:
+        name = str(name)
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        unique.append(f"{name}_{count + 1}" if count else name)
+    return unique
+
+
+class ColumnarResult:
+    """
+    Column names and typed arrays of one result. Integer columns with nulls
+    are stored as float64 with NaN and restored to ints when serialized;
+    dates and text stay object arrays holding the driver's values.
+    """
+
+    __slots__ = ("names", "arrays", "kinds")
+
+    def __init__(self, names: List[str], arrays: List[np.ndarray], kinds: List[str]):
+        self.names = names
+        self.arrays = arrays
+        self.kinds = kinds
+
+    @classmethod
+    def from_rows(cls, names: Iterable[str], rows: Sequence[Sequence[Any]]) -> "ColumnarResult":
+        """From value tuples in column order, as a DB cursor returns them"""
+        names = _unique_names(names)
+        if not rows:
+            return cls(names, [np.array([], dtype=object) for _ in names], ["null"] * len(names))
+        arrays, kinds = [], []
+        for values in zip(*rows):
+            array, kind = _to_array(values)
+            arrays.append(array)
+            kinds.append(kind)
+        return cls(names, arrays, kinds)
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, Any]], names: Optional[List[str]] = None) -> "ColumnarResult":
+        names = list(names if names is not None else (records[0] if records else []))
+        return cls.from_rows(names, [tuple(record.get(name) for name in names) for record in records])
+
+    @classmethod
+    def empty(cls) -> "ColumnarResult":
+        return cls([], [], [])
+
+    def __len__(self) -> int:
+        return len(self.arrays[0]) if self.arrays else 0
+
+    @property
+    def width(self) -> int:
+        return len(self.names)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the arrays (object columns count their pointers only)"""
+        return sum(array.nbytes for array in self.arrays)
+
+    @property
+    def approx_bytes(self) -> int:
+        """nbytes plus a rough size for the Python objects in object columns"""
+        objects = sum(array.size for array in self.arrays if array.dtype == object)
+        return self.nbytes + objects * OBJECT_CELL_BYTES
+
+    def column(self, name: str) -> np.ndarray:
+        return self.arrays[self.names.index(name)]
+
+    def head(self, rows: int) -> "ColumnarResult":
+        """The first rows, as views of the same arrays"""
+        if rows >= len(self):
+            return self
+        return ColumnarResult(self.names, [array[:rows] for array in self.arrays], self.kinds)
+
+    def to_frame(self) -> pd.DataFrame:
+        """A DataFrame over the arrays; numeric columns are shared, not copied"""
+        return pd.DataFrame(dict(zip(self.names, self.arrays)), columns=self.names, copy=False)
+
+    def _display_frame(self) -> pd.DataFrame:
+        """to_frame() with integer columns that hold nulls as nullable Int64, so they print as ints"""
+        frame = self.to_frame()
+        for name, array, kind in zip(self.names, self.arrays, self.kinds):
+            if kind == "integer" and array.dtype == np.float64:
+                missing = np.isnan(array)
+                frame[name] = pd.arrays.IntegerArray(np.where(missing, 0, array).astype(np.int64), missing)
+        return frame
+
+    def to_csv(self, header: bool = True) -> str:
+        return self._display_frame().to_csv(index=False, header=header)
+
+    def to_markdown(self, max_rows: Optional[int] = None) -> str:
+        frame = (self.head(max_rows) if max_rows is not None else self)._display_frame()
+        # Blank cells for nulls rather than "nan"
+        return frame.astype(object).where(frame.notna(), None).to_markdown(index=False, missingval="")
+
+    def to_arrow(self, schema=None, widen_integers: bool = False):
+        """
+        A pyarrow Table over the arrays. Pass the first chunk's schema to
+        keep a chunked export's column types stable; all-null text columns
+        are typed as strings rather than Arrow's null type. widen_integers
+        types integer columns as float64, as they are held here once they
+        have nulls or outgrow int64, so a later chunk of a stream cannot
+        overflow the type the first one fixed. Integer columns that outgrow
+        int64 are float64 either way.
+        """
+        if not ARROW_AVAILABLE:
+            raise RuntimeError("pyarrow is not installed")
+        columns = []
+        for index, (array, kind) in enumerate(zip(self.arrays, self.kinds)):
+            target = schema.field(index).type if schema is not None else None
+            if kind == "integer" and (widen_integers or target == pa.float64()):
+                column = pa.array(array.astype(np.float64), from_pandas=True)
+            elif kind == "integer" and array.dtype == np.float64:
+                finite = array[~np.isnan(array)]
+                if finite.size and (finite.min() < _INT64_MIN or finite.max() >= _INT64_MAX):
+                    column = pa.array(array, from_pandas=True)
+                else:
+                    column = pa.array(array, mask=np.isnan(array)).cast(pa.int64())
+            elif kind in ("integer", "float", "boolean"):
+                column = pa.array(array, from_pandas=True)
+            elif kind == "datetime":
+                column = pa.array(array.tolist())
+            else:
+                column = pa.array([None if value is None else str(value) for value in array.tolist()], type=pa.string())
+            if target is not None and column.type != target:
+                column = column.cast(target)
+            columns.append(column)
+        return pa.Table.from_arrays(columns, names=self.names)
+
+    def to_bytes(self, **meta) -> bytes:
+        """
+        The result as an .npz archive that loads without pickle: typed
+        arrays are stored as they are, object columns and meta as JSON.
+        Text cells that JSON cannot hold (UUIDs, bytes) come back as strings.
+        """
+        arrays, objects = {}, {}
+        for index, (array, kind) in enumerate(zip(self.arrays, self.kinds)):
+            if array.dtype == object:
+                objects[index] = _encode_objects(array, kind)
+            else:
+                arrays[f"c{index}"] = array
+        header = json.dumps({"names": self.names, "kinds": self.kinds, "objects": objects, "meta": meta}, default=str)
+        buffer = io.BytesIO()
+        np.savez(buffer, header=np.frombuffer(header.encode("utf-8"), dtype=np.uint8), **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Tuple["ColumnarResult", Dict[str, Any]]:
+        """(result, meta) from to_bytes(); raises ValueError if data is not such an archive"""
+        try:
+            with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+                header = json.loads(archive["header"].tobytes().decode("utf-8"))
+                objects = header["objects"]
+                arrays = [_decode_objects(objects[str(index)], kind) if str(index) in objects
+                          else archive[f"c{index}"] for index, kind in enumerate(header["kinds"])]
+        except (OSError, KeyError, TypeError, IndexError, UnicodeDecodeError, zipfile.BadZipFile) as e:
+            raise ValueError(f"Not a serialized result: {e}")
+        return cls(header["names"], arrays, header["kinds"]), header["meta"]
+
+    def describe(self) -> List[Dict[str, str]]:
+        return [{"name": name, "type": _CLIENT_TYPES[kind]} for name, kind in zip(self.names, self.kinds)]
+
+    def _python_columns(self) -> List[List[Any]]:
+        """Each column as JSON-ready Python values: NaN back to None, integer columns back to int"""
+        columns = []
+        for array, kind in zip(self.arrays, self.kinds):
+            values = array.tolist()
+            if array.dtype == np.float64:
+                missing = np.isnan(array)
+                if kind == "integer":
+                    values = [None if gap else int(value) for value, gap in zip(values, missing.tolist())]
+                elif missing.any():
+                    for index in np.flatnonzero(missing).tolist():
+                        values[index] = None
+            columns.append(values)
+        return columns
+
+    def to_rows(self) -> List[List[Any]]:
+        """Row-major value lists for the columns/rows wire layout"""
+        return [list(row) for row in zip(*self._python_columns())]
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """One dict per row, the layout of AIResponse.data"""
+        names = self.names
+        return [dict(zip(names, row)) for row in zip(*self._python_columns())]
+
+
+# Renderings a client can ask for in AIRequest.formats
+FORMATS = ("markdown", "csv", "json")
+
+
+def render_formats(result: ColumnarResult, formats: Iterable[str] = FORMATS, records: Optional[List[Dict[str, Any]]] = None,
+                   markdown_rows: int = 50) -> Dict[str, Any]:
+    """
+    Only the requested renderings of result. records, when the caller
+    already built them for the response, is reused for the JSON rendering.
+    """
+    wanted = [name for name in FORMATS if name in set(formats)]
+    if not wanted:
+        return {}
+    if not len(result):
+        placeholders = {"markdown": "No data available", "json": {"data": []}, "csv": ""}
+        return {name: placeholders[name] for name in wanted}
+    rendered = {}
+    if "markdown" in wanted:
+        rendered["markdown"] = result.to_markdown(markdown_rows)
+    if "json" in wanted:
+        rendered["json"] = {"data": records if records is not None else result.to_records()}
+    if "csv" in wanted:
+        rendered["csv"] = result.to_csv()
+    return rendered
@@ -24,7 +24,42 @@ PERFORMANCE_CONFIG = {
     "db_slow_query_threshold": 3.0,  # seconds
     "bedrock_slow_response_threshold": 5.0,  # seconds
     "memory_sample_interval": 10,  # seconds
+    "request_deadline": 45,  # seconds per /query, covering agent, Bedrock and SQL
+    "statement_timeout": 30,  # seconds, upper bound for a single SQL statement
+    "sql_observation_rows": 20,  # result rows shown to the agent; the full result goes to the user directly
+    "sql_observation_chars": 4000,  # cap on the agent's view of a result
+    "export_statement_timeout": 600,  # seconds, upper bound for a streamed export's statement
+    "export_chunk_rows": 10000,  # rows fetched from the server-side cursor and encoded at a time
+    "result_page_rows": 1000,  # rows per /query page; the agent's statement fetches one page plus one row
+    "disconnect_poll_interval": 0.5,  # seconds between client disconnect checks
     "performance_history_size": 200,
+    "summary_snapshot_interval": 1,  # seconds between published performance summaries
+    "stream_interval": 2,  # seconds between /admin/stream ticks, shared by every watcher
+    "trace_buffer_size": 200,  # most recent request traces kept in memory
+    "max_spans_per_trace": 100,
+    "metrics_flush_interval": 5,  # seconds between per-worker metric snapshots
+    "active_user_window": 300,  # seconds since last activity for a user to count as active
+    "user_idle_ttl": 3600,  # seconds before an idle user is forgotten
+    "max_tracked_users": 10000,  # hard cap on per-user activity entries
+    "activity_log_size": 1000,  # most recent user actions kept
+    "pattern_sketch_capacity": 200,  # query fingerprints monitored by the heavy-hitter sketch
+    "top_patterns": 20,
+    "cache_warm_interval": 300,  # seconds between cache warming passes driven by top patterns
+    "metrics_store_path": "data/metrics.db",  # durable SQLite (WAL) metrics history
+    "metrics_write_interval": 2,  # seconds between write-behind batches
+    "metrics_raw_retention_days": 2,  # raw rows older than this become hourly aggregates
+    "metrics_retention_days": 30,  # hourly aggregates older than this are dropped
+    "memory_limit_mb": 512,  # container memory limit the governor budgets against
+    "memory_headroom_mb": 64,  # kept free for the interpreter, sockets and untracked stages
+    "memory_queue_timeout": 5,  # seconds a stage waits for budget before running on fewer rows
+    "memory_min_rows": 50,  # fewest result rows a degraded stage may run on before the request is rejected
+    "memory_calibration_rate": 0.02,  # fraction of stages measured with tracemalloc to calibrate cost estimates
+    "workers": 2,  # uvicorn workers forked by launcher.py
+    "worker_max_requests": 5000,  # requests before a worker is recycled (0 disables)
+    "worker_max_requests_jitter": 500,  # random extra requests so workers do not recycle together
+    "worker_drain_timeout": 30,  # seconds a retiring worker gets to finish in-flight requests
+    "worker_check_interval": 1,  # seconds between supervisor checks of worker RSS and messages
+    "shared_metrics_slots": 16,  # worker slots in the shared metrics file (workers plus replacements)
     "query_pattern_tracking": True,
     "error_pattern_tracking": True,
     "user_session_tracking": True,
@@ -34,9 +69,32 @@ PERFORMANCE_CONFIG = {
 OPTIMIZATION_CONFIG = {
     "auto_cleanup_threshold": 400,  # MB
     "cache_size_limit": 1000,  # number of cached items
-    "session_cleanup_interval": 3600,  # seconds (1 hour)
+    "session_cleanup_interval": 3600,  # seconds between janitor sweeps of idle sessions
+    "session_max_users": 100,  # conversation sessions kept in memory; the least recently used is evicted first
+    "session_max_history": 10,  # turns kept per session
+    "session_idle_ttl": 1800,  # seconds before an idle session expires
+    "session_max_user_bytes": 64 * 1024,  # history bytes per session; larger turns are clipped
+    "session_max_total_bytes": 16 * 1024 * 1024,  # history bytes across all sessions
+    "session_lock_stripes": 16,  # independently locked partitions of the in-memory session front
+    "session_backend": "sqlite",  # durable tier behind the in-memory front: "sqlite" or "memory"
+    "session_store_path": "data/sessions.db",  # overridden by KETHA_SESSION_DB
+    "session_write_interval": 0.5,  # seconds between write-behind batches to the durable tier
+    "history_token_budget": 1200,  # prompt tokens for conversation history, summary included
+    "history_summary_tokens": 300,  # share of the budget for the summary of older turns
+    "history_max_messages": 200,  # newest history messages considered; older ones are ignored
+    "history_cache_size": 2000,  # compacted messages and summaries cached by content digest
+    "result_cache_size": 100,  # query results kept in memory for /results/{id}.csv|.md|.json
+    "result_cache_bytes": 32 * 1024 * 1024,  # memory budget of the result cache
+    "result_cache_ttl": 600,  # seconds a result can be fetched after its /query
+    "result_cache_dir": "data/results",  # spill files shared by the workers on a host ("" keeps results per worker)
+    "result_page_dir": "data/pages",  # page files for /query/{id}/rows, shared by the workers on a host
+    "result_page_bytes": 512 * 1024 * 1024,  # largest result spilled for paging; bigger ones need an export
+    "result_page_writers": 4,  # spills each worker runs at once; more page requests get 503 and retry
     "enable_lazy_loading": True,
-    "enable_gc_optimization": True,
+    "enable_gc_optimization": True,  # adaptive GC policy; False collects after every request
+    "gc_thresholds": (20000, 20, 20),  # generation thresholds; CPython defaults to (700, 10, 10)
+    "gc_idle_delay": 5,  # seconds without requests before an idle full collection
+    "gc_min_interval": 30,  # seconds between full collections under memory pressure (auto_cleanup_threshold)
     "enable_session_limits": True,
 }
 
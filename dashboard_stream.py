@@ -0,0 +1,184 @@
+"""
+Dashboard Stream for Ketha AI Agent
+Server-Sent Events channel for the admin dashboard. One shared broadcaster
+builds each update once per tick and fans the same serialized frame out to
+every watcher, so dashboard load stays constant however many admins are
+connected. Frames carry only new events, the aggregates that changed and
+the paths that were removed.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from dashboard_config import PERFORMANCE_CONFIG
+
+# Seconds of silence after which a comment line keeps proxies from closing the stream
+KEEPALIVE_INTERVAL = 15
+
+
+def _sse(event: str, data: str, event_id: Optional[int] = None) -> str:
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {data}")
+    return "\n".join(lines) + "\n\n"
+
+
+class DashboardBroadcaster:
+    """
+    Ticks every `interval` seconds while anyone is watching. Each tick reads
+    new events and the current aggregates once, diffs the aggregates against
+    the previous tick and keeps the serialized frame in a short ring. A
+    client's cursor is the id of the last frame it saw: a reconnecting
+    client replays the frames it missed, and one that fell out of the ring
+    gets a fresh snapshot.
+    """
+
+    def __init__(self, build_state: Callable[[], Dict[str, Dict[str, Any]]],
+                 read_events: Callable[[int], Tuple[Dict[str, List[Dict[str, Any]]], int]],
+                 interval: float = 2.0, max_frames: int = 120):
+        self.build_state = build_state
+        self.read_events = read_events
+        self.interval = interval
+        self.frames = deque(maxlen=max_frames)  # (frame id, serialized delta)
+        self.frame_id = 0
+        self.event_cursor = 0
+        self.sections = {}  # (group, key, subkey) -> serialized value, for the paths in the last state
+        self.state = {}
+        self.snapshot_cache = None  # (frame id, serialized snapshot)
+        self.subscribers = 0
+        self.ticks = 0
+        self.condition = asyncio.Condition()
+        self.task = None
+
+    def _tick(self) -> Optional[str]:
+        """Build one frame; runs in a worker thread"""
+        events, self.event_cursor = self.read_events(self.event_cursor)
+        state = self.build_state()
+        changed = {}
+        sections = {}
+        for group, values in state.items():
+            for key, value in values.items():
+                # Dict sections are diffed one level down and sent as partial updates
+                parts = value.items() if isinstance(value, dict) and value else [(None, value)]
+                for subkey, subvalue in parts:
+                    path = (group, key, subkey)
+                    serialized = json.dumps(subvalue, default=str, sort_keys=True)
+                    sections[path] = serialized
+                    if self.sections.get(path) == serialized:
+                        continue
+                    if subkey is None:
+                        changed.setdefault(group, {})[key] = value
+                    else:
+                        changed.setdefault(group, {}).setdefault(key, {})[subkey] = subvalue
+        # Paths that dropped out (e.g. users leaving a top-N) are sent so clients delete them;
+        # keeping only the current paths also bounds sections by the size of one state
+        removed = [list(path) for path in self.sections if path not in sections]
+        self.sections = sections
+        self.state = state
+        self.ticks += 1
+        if not changed and not removed and not any(events.values()):
+            return None
+        return json.dumps({'events': events, 'changed': changed, 'removed': removed, 'timestamp': time.time()},
+                          default=str)
+
+    async def _run(self):
+        try:
+            while self.subscribers > 0:
+                try:
+                    frame = await asyncio.to_thread(self._tick)
+                except Exception as e:
+                    logging.warning(f"Dashboard stream tick failed: {e}")
+                    frame = None
+                async with self.condition:
+                    if frame is not None:
+                        self.frame_id += 1
+                        self.frames.append((self.frame_id, frame))
+                    self.condition.notify_all()
+                await asyncio.sleep(self.interval)
+        finally:
+            self.task = None
+
+    def _snapshot(self) -> Tuple[int, str]:
+        """
+        Full state plus every retained event, serialized at most once per
+        frame. Events may reappear in the next delta; clients drop any
+        event whose seq they have already seen.
+        """
+        if self.snapshot_cache is None or self.snapshot_cache[0] != self.frame_id:
+            events, _ = self.read_events(0)
+            snapshot = dict(self.state, events=events)
+            self.snapshot_cache = (self.frame_id, json.dumps(snapshot, default=str))
+        return self.snapshot_cache
+
+    def _frames_after(self, cursor: int) -> Optional[List[Tuple[int, str]]]:
+        """Frames newer than cursor, or None if some have already left the ring"""
+        if cursor >= self.frame_id:
+            return []
+        if not self.frames or self.frames[0][0] > cursor + 1:
+            return None
+        return [(frame_id, frame) for frame_id, frame in self.frames if frame_id > cursor]
+
+    async def subscribe(self, cursor: Optional[int] = None, interval: Optional[float] = None,
+                        is_disconnected: Optional[Callable] = None) -> AsyncIterator[str]:
+        """
+        Yield SSE messages for one client. interval lets a client ask for
+        slower updates than the server tick; it can never ask for faster.
+        """
+        interval = max(interval or self.interval, self.interval)
+        self.subscribers += 1
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        try:
+            yield f"retry: {int(self.interval * 1000)}\n\n"
+            if cursor is None or self._frames_after(cursor) is None:
+                async with self.condition:
+                    await self.condition.wait_for(lambda: self.ticks > 0)
+                cursor, snapshot = await asyncio.to_thread(self._snapshot)
+                yield _sse("snapshot", snapshot, cursor)
+            last_sent = time.monotonic()
+            while True:
+                async with self.condition:
+                    try:
+                        await asyncio.wait_for(
+                            self.condition.wait_for(lambda: self.frame_id > cursor),
+                            timeout=KEEPALIVE_INTERVAL
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                if is_disconnected is not None and await is_disconnected():
+                    return
+                frames = self._frames_after(cursor)
+                if frames is None:
+                    cursor, snapshot = await asyncio.to_thread(self._snapshot)
+                    yield _sse("snapshot", snapshot, cursor)
+                    last_sent = time.monotonic()
+                elif frames:
+                    for frame_id, frame in frames:
+                        yield _sse("delta", frame, frame_id)
+                    cursor = frames[-1][0]
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent >= KEEPALIVE_INTERVAL:
+                    yield ": keepalive\n\n"
+                    last_sent = time.monotonic()
+                if interval > self.interval:
+                    await asyncio.sleep(interval - self.interval)
+        finally:
+            self.subscribers -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'subscribers': self.subscribers,
+            'ticks': self.ticks,
+            'frame_id': self.frame_id,
+            'buffered_frames': len(self.frames),
+            'interval': self.interval
+        }
+
+
+def create_broadcaster(build_state, read_events) -> DashboardBroadcaster:
+    """A broadcaster ticking at the configured stream interval"""
+    return DashboardBroadcaster(build_state, read_events, interval=PERFORMANCE_CONFIG["stream_interval"])
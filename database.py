@@ -1,15 +1,27 @@
 # Update database.py with better error handling
 import os
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
 from sqlalchemy import create_engine
 from sqlalchemy.exc import SQLAlchemyError
 from dotenv import load_dotenv
+from columnar import ColumnarResult
 from sqlalchemy import text
-from sqlalchemy.exc import SQLAlchemyError
+from dashboard_config import PERFORMANCE_CONFIG
+from deadline import DeadlineExceeded, cancellation_stats, get_current_deadline
+from tracing import span
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+_current_capture = contextvars.ContextVar("ketha_query_capture", default=None)
+
+@lru_cache(maxsize=1)
 def get_db_engine():
     try:
         # Add connection pool settings and timeout
@@ -29,20 +41,145 @@ def get_db_engine():
         print(f"Database connection error: {str(e)}")
         raise
 
+def cancel_backend(pid: int) -> bool:
+    """Ask Postgres to cancel the statement running on backend pid"""
+    engine = get_db_engine()
+    with engine.connect() as connection:
+        return bool(connection.execute(text("SELECT pg_cancel_backend(:pid)"), {"pid": pid}).scalar())
+
+def run_query(query: str, deadline=None):
+    """
+    Execute a query and return its rows, raising on failure.
+    The statement timeout is capped by the request deadline, and cancelling
+    the deadline cancels the running statement with pg_cancel_backend.
+    """
+    return run_query_columnar(query, deadline).to_records()
+
+def run_query_columnar(query: str, deadline=None, max_rows: Optional[int] = None) -> ColumnarResult:
+    """
+    run_query() returning the rows as a ColumnarResult, built straight from
+    the cursor's tuples. With max_rows, at most max_rows + 1 rows are fetched
+    from a server-side cursor, so callers can tell whether more remain
+    without the rest of the result ever leaving the database.
+    """
+    deadline = deadline or get_current_deadline()
+    statement_timeout = PERFORMANCE_CONFIG["statement_timeout"]
+    if deadline is not None:
+        deadline.check("sql execution")
+        statement_timeout = min(statement_timeout, deadline.remaining())
+
+    engine = get_db_engine()
+    with engine.connect() as connection:
+        # Set query timeout to prevent hanging
+        connection.execute(text(f"SET statement_timeout = {max(int(statement_timeout * 1000), 1)}"))
+        unregister = None
+        if deadline is not None:
+            pid = connection.execute(text("SELECT pg_backend_pid()")).scalar()
+            started = time.monotonic()
+
+            def cancel_statement():
+                if cancel_backend(pid):
+                    reclaimed = statement_timeout - (time.monotonic() - started)
+                    cancellation_stats.record_statement(max(reclaimed, 0.0))
+                    logging.info(f"Cancelled running statement on backend {pid}")
+
+            # Uncapped by the deadline: without cancellation the statement could run this long
+            unregister = deadline.on_cancel(cancel_statement, budget=PERFORMANCE_CONFIG["statement_timeout"])
+        try:
+            with span("execute_query") as current:
+                if max_rows is None:
+                    result = connection.execute(text(query))
+                    rows = ColumnarResult.from_rows(result.keys(), result.fetchall())
+                else:
+                    streaming = connection.execution_options(stream_results=True, max_row_buffer=max_rows + 1)
+                    result = streaming.execute(text(query))
+                    try:
+                        rows = ColumnarResult.from_rows(result.keys(), result.fetchmany(max_rows + 1))
+                    finally:
+                        result.close()
+                if current is not None:
+                    current.attributes['rows'] = len(rows)
+        except SQLAlchemyError:
+            if deadline is not None and deadline.cancelled:
+                raise DeadlineExceeded(deadline.reason, "sql execution")
+            raise
+        finally:
+            if unregister:
+                unregister()
+        return rows
+
+def stream_query(query: str, chunk_rows: int = 10000, statement_timeout: float = None) -> Iterator[ColumnarResult]:
+    """
+    Run a query on a server-side cursor in a read-only transaction and
+    yield its rows as ColumnarResult chunks of at most chunk_rows, so memory
+    stays constant however many rows it returns. Closing the generator (a
+    client that disconnects) closes the cursor and ends the statement.
+    """
+    statement_timeout = statement_timeout or PERFORMANCE_CONFIG["export_statement_timeout"]
+    engine = get_db_engine()
+    with engine.connect() as connection:
+        connection.execute(text("SET TRANSACTION READ ONLY"))
+        connection.execute(text(f"SET LOCAL statement_timeout = {max(int(statement_timeout * 1000), 1)}"))
+        result = connection.execution_options(stream_results=True, max_row_buffer=chunk_rows).execute(text(query))
+        names = list(result.keys())
+        try:
+            empty = True
+            for partition in result.partitions(chunk_rows):
+                empty = False
+                yield ColumnarResult.from_rows(names, partition)
+            if empty:
+                # Exports still get a header (or schema) for a result with no rows
+                yield ColumnarResult.from_rows(names, [])
+        finally:
+            result.close()
+            connection.rollback()
+
+class QueryCapture:
+    """
+    The last successful statement run while capturing, with its result, so
+    callers get the agent's actual rows instead of their text rendering
+    """
+
+    def __init__(self):
+        self.query: Optional[str] = None
+        self.result = ColumnarResult.empty()
+        self.more = False
+        self.executions = 0
+
+    def record(self, query: str, result: ColumnarResult, more: bool = False):
+        """more: result is the first page of a longer result"""
+        self.query = query
+        self.result = result
+        self.more = more
+        self.executions += 1
+
+    @property
+    def captured(self) -> bool:
+        return self.query is not None
+
+@contextmanager
+def capture_query_results():
+    """Collect the results of statements run by tools inside this block"""
+    capture = QueryCapture()
+    token = _current_capture.set(capture)
+    try:
+        yield capture
+    finally:
+        _current_capture.reset(token)
+
+def get_query_capture() -> Optional[QueryCapture]:
+    return _current_capture.get()
+
 def execute_query(query: str):
     try:
         if not query.strip():
             return []
-            
-        engine = get_db_engine()
-        with engine.connect() as connection:
-            # Set query timeout to prevent hanging
-            connection.execute(text("SET statement_timeout = '30s'"))
-            result = connection.execute(text(query))
-            return [dict(row) for row in result.mappings()]
+        return run_query(query)
+    except DeadlineExceeded:
+        raise
     except SQLAlchemyError as e:
         print(f"Database error: {str(e)}")
         return []
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
-        return []
\ No newline at end of file
+        return []
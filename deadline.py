@@ -0,0 +1,171 @@
+"""
+Request Deadlines for Ketha AI Agent
+Carries a per-request time budget from the API layer into the agent,
+Bedrock calls and SQL execution, and cancels in-flight work when it runs out
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+_current_deadline = contextvars.ContextVar("ketha_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request passes its deadline or is cancelled"""
+
+    def __init__(self, reason: str = "deadline_exceeded", stage: str = ""):
+        self.reason = reason
+        self.stage = stage
+        message = f"Request cancelled ({reason})"
+        if stage:
+            message += f" during {stage}"
+        super().__init__(message)
+
+
+class CancellationStats:
+    """Counts cancelled work and the time that cancelling it gave back"""
+
+    def __init__(self):
+        self.cancelled_requests = defaultdict(int)
+        self.cancelled_statements = 0
+        self.reclaimed_request_seconds = 0.0
+        self.reclaimed_statement_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def record_request(self, reason: str, reclaimed_seconds: float):
+        with self.lock:
+            self.cancelled_requests[reason] += 1
+            self.reclaimed_request_seconds += reclaimed_seconds
+
+    def record_statement(self, reclaimed_seconds: float):
+        with self.lock:
+            self.cancelled_statements += 1
+            self.reclaimed_statement_seconds += reclaimed_seconds
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'cancelled_requests': sum(self.cancelled_requests.values()),
+                'cancelled_by_reason': dict(self.cancelled_requests),
+                'cancelled_statements': self.cancelled_statements,
+                'reclaimed_request_seconds': round(self.reclaimed_request_seconds, 3),
+                'reclaimed_statement_seconds': round(self.reclaimed_statement_seconds, 3)
+            }
+
+
+class Deadline:
+    """A per-request time budget that in-flight work can register cancel hooks on"""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.start_time = time.monotonic()
+        self.expires_at = self.start_time + timeout
+        self.cancelled = False
+        self.reason = None
+        self._callbacks = {}
+        self._next_callback_id = 0
+        self.lock = threading.Lock()
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline, never negative"""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start_time
+
+    def expired(self) -> bool:
+        return self.cancelled or time.monotonic() >= self.expires_at
+
+    def check(self, stage: str = ""):
+        """Raise DeadlineExceeded if the request was cancelled or ran out of time"""
+        if not self.expired():
+            return
+        if not self.cancelled:
+            self.cancel("deadline_exceeded")
+        raise DeadlineExceeded(self.reason, stage)
+
+    def on_cancel(self, callback: Callable[[], None], budget: Optional[float] = None) -> Callable[[], None]:
+        """
+        Register a hook to run on cancellation; returns a function that
+        unregisters it. budget is how long the operation could run on its own
+        (e.g. the statement timeout), so cancelling it counts what it avoided.
+        """
+        runs_until = time.monotonic() + budget if budget is not None else None
+        with self.lock:
+            callback_id = self._next_callback_id
+            self._next_callback_id += 1
+            self._callbacks[callback_id] = (callback, runs_until)
+            already_cancelled = self.cancelled
+
+        if already_cancelled:
+            self._run_callback(callback)
+
+        def unregister():
+            with self.lock:
+                self._callbacks.pop(callback_id, None)
+        return unregister
+
+    def cancel(self, reason: str = "cancelled"):
+        """Cancel the request and run every registered hook once"""
+        with self.lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            self.reason = reason
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+
+        # Work avoided: the longest an in-flight operation could still have run,
+        # which outlasts the deadline itself when the deadline is what expired
+        now = time.monotonic()
+        reclaimed = max([runs_until - now for _, runs_until in callbacks if runs_until is not None] + [self.remaining()])
+        cancellation_stats.record_request(reason, max(reclaimed, 0.0))
+        logging.info(f"Cancelling request after {self.elapsed():.2f}s ({reason}), {len(callbacks)} in-flight operation(s)")
+        for callback, _ in callbacks:
+            self._run_callback(callback)
+
+    @staticmethod
+    def _run_callback(callback: Callable[[], None]):
+        try:
+            callback()
+        except Exception as e:
+            logging.warning(f"Cancellation hook failed: {e}")
+
+
+def get_current_deadline() -> Optional[Deadline]:
+    """Deadline of the request being handled in this context, if any"""
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """Make deadline the current deadline for the enclosed block"""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def bedrock_client_config(default_read_timeout: float = 60):
+    """botocore Config whose timeouts never outlive the current deadline"""
+    from botocore.config import Config
+
+    read_timeout = default_read_timeout
+    deadline = get_current_deadline()
+    if deadline is not None:
+        read_timeout = max(min(read_timeout, deadline.remaining()), 1)
+    return Config(
+        connect_timeout=min(10, read_timeout),
+        read_timeout=read_timeout,
+        retries={"max_attempts": 1 if deadline is not None else 3}
+    )
+
+
+# Global cancellation stats instance
+cancellation_stats = CancellationStats()
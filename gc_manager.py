@@ -0,0 +1,224 @@
+"""
+GC Manager for Ketha AI Agent
+Adaptive garbage collection: startup objects are frozen out of the
+collector once warm-up is done, generation thresholds are raised, and full
+collections run only under memory pressure or while the service is idle.
+Every collection's pause is recorded, and managed collections also report
+the objects and memory they freed.
+"""
+
+import gc
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+from dashboard_config import OPTIMIZATION_CONFIG
+from histograms import latency_registry
+from metrics_store import metrics_store
+from system_sampler import system_sampler
+
+# A pressure collection that frees less than this doubles the wait before the next one
+USELESS_COLLECTION_MB = 1.0
+MAX_PRESSURE_BACKOFF = 3600
+
+
+class GCManager:
+    """
+    Requests only mark their start and end; a background thread decides when
+    to collect. A full collection runs when RSS is above pressure_mb (at most
+    every min_interval seconds, backing off while those collections free
+    nothing) or once per idle period, i.e. after
+    idle_delay seconds with no request in flight. Pause times come from a
+    gc.callbacks hook, which only appends to a deque: it can fire inside any
+    allocation, so it must not take locks.
+    """
+
+    def __init__(self, thresholds: Tuple[int, int, int] = (20000, 20, 20), pressure_mb: float = 400,
+                 idle_delay: float = 5.0, min_interval: float = 30.0, check_interval: float = 1.0):
+        self.thresholds = tuple(thresholds)
+        self.pressure_mb = pressure_mb
+        self.idle_delay = idle_delay
+        self.min_interval = min_interval
+        self.check_interval = check_interval
+        self.original_thresholds = gc.get_threshold()
+        self.installed = False
+        self.in_flight = 0
+        self.requests_since_collect = 0
+        self.last_request_end = 0.0
+        self.last_full_collection = 0.0
+        self.pauses = deque(maxlen=10000)  # (generation, seconds, collected), drained by the manager thread
+        self._pause_started = None
+        self.pause_stats = {generation: {'collections': 0, 'collected': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+                            for generation in range(3)}
+        self.managed = {'pressure': 0, 'idle': 0, 'manual': 0}
+        self.objects_freed = 0
+        self.freed_mb = 0.0
+        self.frozen_objects = 0
+        self.pressure_backoff = min_interval  # grows while pressure collections free nothing
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _on_gc(self, phase: str, info: Dict[str, Any]):
+        if phase == "start":
+            self._pause_started = time.perf_counter()
+        elif self._pause_started is not None:
+            self.pauses.append((info["generation"], time.perf_counter() - self._pause_started, info["collected"]))
+            self._pause_started = None
+
+    def install(self):
+        """Apply the thresholds and start timing collections"""
+        if self.installed:
+            return
+        self.original_thresholds = gc.get_threshold()
+        gc.set_threshold(*self.thresholds)
+        gc.callbacks.append(self._on_gc)
+        self.installed = True
+
+    def uninstall(self):
+        """Restore the interpreter's thresholds and unfreeze frozen objects"""
+        if not self.installed:
+            return
+        gc.set_threshold(*self.original_thresholds)
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+        gc.unfreeze()
+        self.frozen_objects = 0
+        self.installed = False
+
+    def freeze(self):
+        """
+        Collect, then move every surviving object to the permanent
+        generation. Call once warm-up is done: modules, models and caches
+        loaded so far are never scanned again.
+        """
+        gc.collect()
+        gc.freeze()
+        self.frozen_objects = gc.get_freeze_count()
+        logging.info(f"Froze {self.frozen_objects} startup objects out of garbage collection")
+
+    def request_started(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def request_finished(self):
+        with self.lock:
+            self.in_flight -= 1
+            self.requests_since_collect += 1
+            self.last_request_end = time.time()
+
+    def _drain_pauses(self):
+        with self.lock:
+            while self.pauses:
+                generation, seconds, collected = self.pauses.popleft()
+                stats = self.pause_stats[generation]
+                stats['collections'] += 1
+                stats['collected'] += collected
+                stats['total_seconds'] += seconds
+                stats['max_seconds'] = max(stats['max_seconds'], seconds)
+                latency_registry.record("gc", f"gen{generation}", seconds)
+
+    def collection_reason(self, now: Optional[float] = None) -> Optional[str]:
+        """Why a full collection is due now, or None"""
+        now = now or time.time()
+        with self.lock:
+            in_flight = self.in_flight
+            idle_for = now - self.last_request_end
+            pending = self.requests_since_collect
+        if now - self.last_full_collection >= self.pressure_backoff \
+                and system_sampler.snapshot()['rss_mb'] > self.pressure_mb:
+            return "pressure"
+        if pending and not in_flight and idle_for >= self.idle_delay:
+            return "idle"
+        return None
+
+    def collect(self, reason: str = "manual") -> Dict[str, Any]:
+        """Run a timed full collection and record what it freed"""
+        before_mb = system_sampler.sample()['rss_mb']
+        started = time.perf_counter()
+        collected = gc.collect()
+        pause = time.perf_counter() - started
+        after_mb = system_sampler.sample()['rss_mb']
+        freed_mb = max(before_mb - after_mb, 0.0)
+        with self.lock:
+            self.requests_since_collect = 0
+        self.last_full_collection = time.time()
+        if reason == "pressure":
+            self._back_off(freed_mb)
+        self.managed[reason] = self.managed.get(reason, 0) + 1
+        self.objects_freed += collected
+        self.freed_mb += freed_mb
+        metrics_store.record_sample("gc_full_pause", pause)
+        metrics_store.record_sample("gc_freed_mb", freed_mb)
+        return {'reason': reason, 'collected': collected, 'pause_seconds': pause, 'freed_mb': freed_mb}
+
+    def _back_off(self, freed_mb: float):
+        """RSS held up by live data is not garbage; collecting again soon would only add pauses"""
+        if freed_mb < USELESS_COLLECTION_MB:
+            self.pressure_backoff = min(max(self.pressure_backoff, 1) * 2, MAX_PRESSURE_BACKOFF)
+        else:
+            self.pressure_backoff = self.min_interval
+
+    def check(self) -> Optional[Dict[str, Any]]:
+        """One pass of the manager loop"""
+        self._drain_pauses()
+        reason = self.collection_reason()
+        if reason is None:
+            return None
+        result = self.collect(reason)
+        self._drain_pauses()
+        return result
+
+    def start(self):
+        """Install the policy and run the collection loop in a background thread"""
+        if self._thread is not None:
+            return self._thread
+        self.install()
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.check_interval):
+                try:
+                    self.check()
+                except Exception as e:
+                    logging.warning(f"GC manager check failed: {e}")
+
+        self._thread = threading.Thread(target=run, name="gc-manager", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.check_interval + 1)
+        self._thread = None
+        self.uninstall()
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._drain_pauses()
+        return {
+            'thresholds': gc.get_threshold(),
+            'frozen_objects': self.frozen_objects,
+            'in_flight': self.in_flight,
+            'pauses': {f"gen{generation}": {
+                'collections': stats['collections'],
+                'collected': stats['collected'],
+                'total_ms': round(stats['total_seconds'] * 1000, 2),
+                'max_ms': round(stats['max_seconds'] * 1000, 2)
+            } for generation, stats in self.pause_stats.items()},
+            'managed_collections': dict(self.managed),
+            'pressure_backoff_seconds': self.pressure_backoff,
+            'objects_freed': self.objects_freed,
+            'freed_mb': round(self.freed_mb, 2)
+        }
+
+
+# Global GC manager instance
+gc_manager = GCManager(
+    thresholds=OPTIMIZATION_CONFIG["gc_thresholds"],
+    pressure_mb=OPTIMIZATION_CONFIG["auto_cleanup_threshold"],
+    idle_delay=OPTIMIZATION_CONFIG["gc_idle_delay"],
+    min_interval=OPTIMIZATION_CONFIG["gc_min_interval"]
+)
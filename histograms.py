@@ -0,0 +1,197 @@
+"""
+Latency Histograms for Ketha AI Agent
+Constant-memory, mergeable log-bucketed histograms (HDR-style, bounded
+relative error) with sliding 1m/15m/1h windows, per route and per stage
+"""
+
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Sliding windows served to the dashboard: name -> seconds
+WINDOWS = {"1m": 60, "15m": 900, "1h": 3600}
+
+
+class LogHistogram:
+    """
+    Sparse histogram whose bucket boundaries grow geometrically, so any
+    recorded value is reported within relative_error of its true value.
+    Recording is O(1); percentile queries touch at most a few hundred buckets.
+    """
+
+    __slots__ = ("relative_error", "min_value", "log_gamma", "buckets", "count", "sum", "min", "max")
+
+    def __init__(self, relative_error: float = 0.02, min_value: float = 1e-4):
+        self.relative_error = relative_error
+        self.min_value = min_value
+        self.log_gamma = math.log((1 + relative_error) / (1 - relative_error))
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def bucket_index(self, value: float) -> int:
+        return math.ceil(math.log(max(value, self.min_value)) / self.log_gamma)
+
+    def bucket_upper_bound(self, index: int) -> float:
+        return math.exp(index * self.log_gamma)
+
+    def record(self, value: float, count: int = 1):
+        index = self.bucket_index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+        self.sum += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: "LogHistogram"):
+        """Add other's samples into this histogram; both must share relative_error"""
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def reset(self):
+        self.buckets.clear()
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def percentiles(self, quantiles: List[float]) -> List[float]:
+        """Values at each quantile (0-1) in a single pass over the buckets"""
+        if not self.count:
+            return [0.0 for _ in quantiles]
+        ranks = [q * (self.count - 1) for q in quantiles]
+        results = [None] * len(quantiles)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            # Report the bucket midpoint, clamped to the observed range
+            estimate = 2 * self.bucket_upper_bound(index) / (1 + math.exp(self.log_gamma))
+            estimate = min(max(estimate, self.min), self.max)
+            for i, rank in enumerate(ranks):
+                if results[i] is None and seen > rank:
+                    results[i] = estimate
+            if all(r is not None for r in results):
+                break
+        return [r if r is not None else self.max for r in results]
+
+    def percentile(self, quantile: float) -> float:
+        return self.percentiles([quantile])[0]
+
+    def cumulative_counts(self, bounds: List[float]) -> List[int]:
+        """Number of samples at or below each bound, for fixed-bucket exporters"""
+        totals = [0] * len(bounds)
+        for index, count in self.buckets.items():
+            upper = self.bucket_upper_bound(index)
+            for i, bound in enumerate(bounds):
+                if upper <= bound * (1 + self.relative_error):
+                    totals[i] += count
+        return totals
+
+    def summary(self) -> Dict[str, Any]:
+        p50, p95, p99 = self.percentiles([0.5, 0.95, 0.99])
+        return {
+            'count': self.count,
+            'avg': self.sum / self.count if self.count else 0.0,
+            'p50': p50,
+            'p95': p95,
+            'p99': p99,
+            'max': self.max or 0.0
+        }
+
+
+class WindowedHistogram:
+    """
+    A LogHistogram over sliding windows, built from rings of time slots.
+    10-second slots serve the 1m window and 1-minute slots serve 15m and 1h,
+    so memory is fixed and each record touches exactly two slots.
+    """
+
+    RINGS = ((10, 6), (60, 60))  # (slot width in seconds, slots)
+
+    def __init__(self, relative_error: float = 0.02, clock: Callable[[], float] = time.time):
+        self.relative_error = relative_error
+        self.clock = clock
+        self.rings = [
+            (width, [[-1, LogHistogram(relative_error)] for _ in range(slots)])
+            for width, slots in self.RINGS
+        ]
+        self.total = LogHistogram(relative_error)
+        self.lock = threading.Lock()
+
+    def record(self, value: float):
+        now = self.clock()
+        with self.lock:
+            self.total.record(value)
+            for width, slots in self.rings:
+                epoch = int(now // width)
+                slot = slots[epoch % len(slots)]
+                if slot[0] != epoch:
+                    slot[0] = epoch
+                    slot[1].reset()
+                slot[1].record(value)
+
+    def window(self, seconds: int) -> LogHistogram:
+        """Merged histogram of roughly the last `seconds` seconds"""
+        now = self.clock()
+        width, slots = next(
+            ((w, s) for w, s in self.rings if w * len(s) >= seconds),
+            self.rings[-1]
+        )
+        current = int(now // width)
+        oldest = current - min(math.ceil(seconds / width), len(slots)) + 1
+        merged = LogHistogram(self.relative_error)
+        with self.lock:
+            for epoch, histogram in slots:
+                if oldest <= epoch <= current:
+                    merged.merge(histogram)
+        return merged
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {name: self.window(seconds).summary() for name, seconds in WINDOWS.items()}
+
+
+class LatencyRegistry:
+    """Windowed latency histograms keyed by (metric, label), e.g. ("stage", "execute_query")"""
+
+    def __init__(self, relative_error: float = 0.02):
+        self.relative_error = relative_error
+        self.histograms: Dict[Tuple[str, str], WindowedHistogram] = {}
+        self.lock = threading.Lock()
+
+    def get(self, metric: str, label: str) -> WindowedHistogram:
+        key = (metric, label)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, WindowedHistogram(self.relative_error))
+        return histogram
+
+    def record(self, metric: str, label: str, seconds: float):
+        self.get(metric, label).record(seconds)
+
+    def labels(self, metric: str) -> List[str]:
+        with self.lock:
+            return sorted(label for m, label in self.histograms if m == metric)
+
+    def window(self, metric: str, label: str, seconds: int) -> Optional[LogHistogram]:
+        histogram = self.histograms.get((metric, label))
+        return histogram.window(seconds) if histogram else None
+
+    def summary(self, metric: str) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Per-label, per-window percentiles for one metric"""
+        return {label: self.histograms[(metric, label)].summary() for label in self.labels(metric)}
+
+
+# Global latency registry instance
+latency_registry = LatencyRegistry()
@@ -0,0 +1,280 @@
+"""
+History Manager for Ketha AI Agent
+Fits conversation history into a prompt token budget: the most recent turns
+are kept verbatim, older turns are folded into a running summary (each turn
+summarised once and cached), and bulky table dumps are replaced by compact
+references. Reports how many prompt tokens each request saved.
+"""
+
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dashboard_config import OPTIMIZATION_CONFIG
+from metrics_store import metrics_store
+from tracing import get_current_trace
+
+# Rough tokens per character for English prose and SQL results (no tokenizer is loaded)
+CHARS_PER_TOKEN = 4
+
+_TABLE_ROW = re.compile(r"^\s*\|.*\|\s*$")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{2,}")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+_WHITESPACE = re.compile(r"[ \t]+")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _table_reference(rows: int, columns: List[str]) -> str:
+    shown = ", ".join(column for column in columns[:8] if column)
+    more = f" +{len(columns) - 8} more" if len(columns) > 8 else ""
+    return f"[table: {rows} rows; columns: {shown}{more}]"
+
+
+def _json_reference(text: str) -> Optional[str]:
+    stripped = text.strip()
+    if not stripped.startswith(("[", "{")) or len(stripped) < 200:
+        return None
+    try:
+        value = json.loads(stripped)
+    except ValueError:
+        return None
+    if isinstance(value, dict):
+        value = next((v for v in value.values() if isinstance(v, list)), [value])
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        return _table_reference(len(value), list(value[0]))
+    return None
+
+
+def strip_tables(text: str, min_rows: int = 3) -> Tuple[str, int]:
+    """
+    Replace markdown tables, CSV blocks and JSON row arrays of at least
+    min_rows rows with a one-line reference. Returns the text and how many
+    tables were replaced.
+    """
+    reference = _json_reference(text)
+    if reference is not None:
+        return reference, 1
+    lines = text.splitlines()
+    output, replaced, i = [], 0, 0
+    while i < len(lines):
+        j = i
+        if _TABLE_ROW.match(lines[i]):
+            while j < len(lines) and _TABLE_ROW.match(lines[j]):
+                j += 1
+            block = [line for line in lines[i:j] if not _TABLE_SEPARATOR.match(line)]
+            if len(block) - 1 >= min_rows:
+                columns = [cell.strip() for cell in block[0].strip().strip("|").split("|")]
+                output.append(_table_reference(len(block) - 1, columns))
+                replaced += 1
+                i = j
+                continue
+        elif lines[i].count(",") >= 2 and ". " not in lines[i]:
+            # CSV: a run of lines with the same number of fields (prose rarely repeats that)
+            commas = lines[i].count(",")
+            while j < len(lines) and lines[j].count(",") == commas and ". " not in lines[j]:
+                j += 1
+            if j - i - 1 >= min_rows:
+                output.append(_table_reference(j - i - 1, [cell.strip() for cell in lines[i].split(",")]))
+                replaced += 1
+                i = j
+                continue
+        output.append(lines[i])
+        i += 1
+    return "\n".join(output), replaced
+
+
+def extractive_summary(role: str, text: str, max_chars: int = 160) -> str:
+    """One line per turn: the question, or the first sentence of the answer"""
+    text = _WHITESPACE.sub(" ", text.replace("\n", " ")).strip()
+    if role == "ai":
+        text = _SENTENCE_END.split(text, maxsplit=1)[0]
+    if len(text) > max_chars:
+        text = text[:max_chars].rsplit(" ", 1)[0] + "..."
+    return f"{'User asked' if role == 'user' else 'AI answered'}: {text}"
+
+
+def normalize_history(history: Optional[List[Dict[str, Any]]]) -> List[Tuple[str, str]]:
+    """
+    (role, text) messages from either history shape: client turns
+    ({"isUser": bool, "text": ...}) or stored sessions ({"user": ..., "ai": ...})
+    """
+    messages = []
+    for turn in history or []:
+        if not isinstance(turn, dict):
+            continue
+        if "text" in turn:
+            messages.append(("user" if turn.get("isUser", True) else "ai", str(turn["text"] or "")))
+            continue
+        for role in ("user", "ai"):
+            if turn.get(role):
+                messages.append((role, str(turn[role])))
+    return messages
+
+
+class PreparedHistory:
+    __slots__ = ("summary", "messages", "raw_tokens", "prompt_tokens", "summarized", "tables_stripped")
+
+    def __init__(self, summary: str, messages: List[Tuple[str, str]], raw_tokens: int, prompt_tokens: int,
+                 summarized: int, tables_stripped: int):
+        self.summary = summary
+        self.messages = messages
+        self.raw_tokens = raw_tokens
+        self.prompt_tokens = prompt_tokens
+        self.summarized = summarized
+        self.tables_stripped = tables_stripped
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(self.raw_tokens - self.prompt_tokens, 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'raw_tokens': self.raw_tokens,
+            'prompt_tokens': self.prompt_tokens,
+            'saved_tokens': self.saved_tokens,
+            'summarized_messages': self.summarized,
+            'tables_stripped': self.tables_stripped
+        }
+
+
+class HistoryManager:
+    """
+    Walks the history newest first, keeping messages verbatim (after table
+    stripping) while they fit token_budget minus the summary's share; the
+    rest become summary lines. Compacted messages and summary lines are
+    cached by content digest, and whole summaries by the digest chain of the
+    messages they cover, so each turn is compacted and summarised once and
+    a summary only grows by the turns that newly fell out of the window.
+    """
+
+    def __init__(self, token_budget: int = 1200, summary_tokens: int = 300, max_messages: int = 200,
+                 cache_size: int = 2000, summarize: Callable[[str, str], str] = extractive_summary):
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.max_messages = max_messages
+        self.cache_size = cache_size
+        self.summarize = summarize
+        self.compacted: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self.summaries: "OrderedDict[str, List[str]]" = OrderedDict()
+        self.stats = {'requests': 0, 'raw_tokens': 0, 'prompt_tokens': 0, 'summary_cache_hits': 0,
+                      'turns_summarized': 0, 'tables_stripped': 0}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _digest(role: str, text: str) -> str:
+        return hashlib.blake2b(f"{role}\x00{text}".encode("utf-8"), digest_size=12).hexdigest()
+
+    def _cache(self, cache: OrderedDict, key: str, value):
+        cache[key] = value
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def _compact(self, digest: str, role: str, text: str) -> Tuple[str, int]:
+        with self.lock:
+            cached = self.compacted.get(digest)
+            if cached is not None:
+                self.compacted.move_to_end(digest)
+                return cached
+        compact, tables = strip_tables(text)
+        result = (compact.strip(), tables)
+        with self.lock:
+            self._cache(self.compacted, digest, result)
+        return result
+
+    def _summary_lines(self, older: List[Tuple[str, str, str]]) -> List[str]:
+        """Summary of `older` (digest, role, text), extending the longest cached prefix"""
+        chain, keys = "", []
+        for digest, _, _ in older:
+            chain = hashlib.blake2b(f"{chain}{digest}".encode(), digest_size=12).hexdigest()
+            keys.append(chain)
+        lines, start = [], 0
+        with self.lock:
+            for index in range(len(keys) - 1, -1, -1):
+                cached = self.summaries.get(keys[index])
+                if cached is not None:
+                    self.summaries.move_to_end(keys[index])
+                    self.stats['summary_cache_hits'] += 1
+                    lines, start = list(cached), index + 1
+                    break
+        for digest, role, text in older[start:]:
+            lines.append(self.summarize(role, self._compact(digest, role, text)[0]))
+        with self.lock:
+            self.stats['turns_summarized'] += len(older) - start
+            if keys and start < len(keys):
+                self._cache(self.summaries, keys[-1], list(lines))
+        return lines
+
+    def prepare(self, history: Optional[List[Dict[str, Any]]]) -> PreparedHistory:
+        messages = normalize_history(history)
+        raw_tokens = sum(estimate_tokens(text) for _, text in messages)
+        messages = messages[-self.max_messages:]
+        entries = [(self._digest(role, text), role, text) for role, text in messages]
+        budget = self.token_budget - (self.summary_tokens if len(entries) > 1 else 0)
+        kept, used, tables = [], 0, 0
+        split = len(entries)
+        for index in range(len(entries) - 1, -1, -1):
+            digest, role, text = entries[index]
+            compact, stripped = self._compact(digest, role, text)
+            cost = estimate_tokens(compact) + 2
+            if used + cost > budget:
+                if kept:
+                    break
+                # The latest message alone is over budget: keep its beginning
+                compact = compact[:max(budget - 3, 0) * CHARS_PER_TOKEN].rsplit(" ", 1)[0] + " ..."
+                cost = estimate_tokens(compact) + 2
+            kept.append((role, compact))
+            used += cost
+            tables += stripped
+            split = index
+        kept.reverse()
+        summary = ""
+        if split:
+            lines = self._summary_lines(entries[:split])
+            # Keep the newest summary lines that fit the summary budget
+            selected, size = [], 0
+            for line in reversed(lines):
+                size += estimate_tokens(line) + 1
+                if size > self.summary_tokens:
+                    break
+                selected.append(line)
+            summary = "\n".join(reversed(selected))
+        prompt_tokens = used + estimate_tokens(summary)
+        prepared = PreparedHistory(summary, kept, raw_tokens, prompt_tokens, split, tables)
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['raw_tokens'] += raw_tokens
+            self.stats['prompt_tokens'] += prompt_tokens
+            self.stats['tables_stripped'] += tables
+        return prepared
+
+    def record(self, prepared: PreparedHistory):
+        """Attach the savings to the current request's trace and the durable metrics"""
+        trace = get_current_trace()
+        if trace is not None:
+            trace.attributes['history'] = prepared.to_dict()
+        if prepared.raw_tokens:
+            metrics_store.record_sample("history_tokens_saved", prepared.saved_tokens)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+            stats['cached_messages'] = len(self.compacted)
+            stats['cached_summaries'] = len(self.summaries)
+        stats['saved_tokens'] = max(stats['raw_tokens'] - stats['prompt_tokens'], 0)
+        stats['saved_percent'] = round(stats['saved_tokens'] / stats['raw_tokens'] * 100, 2) if stats['raw_tokens'] else 0.0
+        return stats
+
+
+# Global history manager instance
+history_manager = HistoryManager(
+    token_budget=OPTIMIZATION_CONFIG["history_token_budget"],
+    summary_tokens=OPTIMIZATION_CONFIG["history_summary_tokens"],
+    max_messages=OPTIMIZATION_CONFIG["history_max_messages"],
+    cache_size=OPTIMIZATION_CONFIG["history_cache_size"]
+)
@@ -0,0 +1,402 @@
+"""
+Production Launcher for Ketha AI Agent
+Pre-fork supervisor: imports the app and loads its models and schema caches
+once, then forks uvicorn workers that share those pages copy-on-write and
+one listening socket. A worker is recycled when
+its RSS crosses max_memory_limit or after worker_max_requests requests.
+Replacements roll one at a time: the new worker is serving before the old
+one is asked to drain its in-flight requests and exit.
+Run with: python launcher.py --workers 2 --port 8000
+"""
+
+import argparse
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional
+
+from dashboard_config import PERFORMANCE_CONFIG, get_dashboard_config
+from system_sampler import read_process_memory, read_process_rss_mb
+
+# Messages a worker writes to its pipe to the supervisor
+READY = b"R"  # serving requests
+RECYCLE = b"M"  # reached its request limit
+
+# Delay before replacing a crashed worker, doubling per crash until one starts serving
+RESPAWN_BACKOFF_MIN = 0.5
+RESPAWN_BACKOFF_MAX = 30.0
+
+
+class RequestCounter:
+    """ASGI wrapper that asks for recycling once a worker has served `limit` requests"""
+
+    def __init__(self, app, limit: int, notify):
+        self.app = app
+        self.limit = limit
+        self.notify = notify
+        self.count = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            self.count += 1
+            if self.count == self.limit:
+                self.notify()
+        await self.app(scope, receive, send)
+
+
+class Worker:
+    """Supervisor-side record of one forked worker"""
+
+    __slots__ = ("pid", "channel", "started_at", "ready", "baseline_mb", "recycle_reason", "retiring_since",
+                 "exited")
+
+    def __init__(self, pid: int, channel: int):
+        self.pid = pid
+        self.channel = channel
+        self.started_at = time.time()
+        self.ready = False
+        self.baseline_mb = None  # RSS when it started serving
+        self.recycle_reason = None
+        self.retiring_since = None
+        self.exited = False
+
+
+def preload(load_models: bool = True):
+    """
+    Import the app and load what workers would otherwise each load on first
+    use, so forked workers share those pages copy-on-write. Everything
+    loaded is then frozen out of the garbage collector: a collection in a
+    worker would otherwise write to every object's header and copy the
+    pages it touched.
+    """
+    import main
+    from gc_manager import gc_manager
+    if load_models and main.AI_ENABLED:
+        try:
+            from ai_utils import preload_shared_assets
+            warmed = preload_shared_assets()
+            logging.info(f"Preloaded before fork: {', '.join(warmed) or 'nothing'}")
+        except Exception as e:
+            logging.warning(f"Model preload failed, workers will load lazily: {e}")
+        # Pooled connections must not be shared across fork; each worker opens its own
+        import database
+        if database.get_db_engine.cache_info().currsize:
+            database.get_db_engine().dispose()
+    gc_manager.freeze()
+    return main.app
+
+
+class Supervisor:
+    """
+    Keeps `workers` workers serving. The loop reaps exited workers, reads
+    worker messages, checks each worker's RSS, and advances at most one
+    rolling replacement. Workers that died unexpectedly are replaced by
+    the roll too, after a backoff that doubles with each crash until a
+    worker reaches READY, so a worker that cannot start is not fork-looped.
+    """
+
+    def __init__(self, app, sock: socket.socket, workers: int = 2, max_memory_mb: float = 512,
+                 max_requests: int = 0, max_requests_jitter: int = 0, drain_timeout: float = 30,
+                 check_interval: float = 1.0, uvicorn_options: Optional[Dict] = None):
+        self.app = app
+        self.sock = sock
+        self.target = workers
+        self.max_memory_mb = max_memory_mb
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.drain_timeout = drain_timeout
+        self.check_interval = check_interval
+        self.uvicorn_options = uvicorn_options or {}
+        self.workers: Dict[int, Worker] = {}
+        self.replacing: Optional[tuple] = None  # (old pid, new pid)
+        self.respawn_delay = 0.0
+        self.respawn_at = 0.0
+        self.stopping = False
+        self.recycled = {'memory': 0, 'requests': 0, 'reload': 0, 'crashed': 0}
+        self.reported_sharing = False
+
+    def spawn(self) -> Worker:
+        read_fd, write_fd = os.pipe()
+        limit = self.max_requests + random.randint(0, self.max_requests_jitter) if self.max_requests else 0
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for worker in self.workers.values():
+                os.close(worker.channel)
+            code = 0
+            try:
+                self._run_worker(write_fd, limit)
+            except BaseException:
+                logging.exception("Worker crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        os.close(write_fd)
+        worker = Worker(pid, read_fd)
+        self.workers[pid] = worker
+        logging.info(f"Started worker {pid}" + (f" (recycles after {limit} requests)" if limit else ""))
+        return worker
+
+    def _run_worker(self, channel: int, request_limit: int):
+        import uvicorn
+
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        random.seed()
+
+        def send(message: bytes):
+            try:
+                os.write(channel, message)
+            except OSError:
+                pass
+
+        class WorkerServer(uvicorn.Server):
+            async def startup(self, sockets=None):
+                await super().startup(sockets=sockets)
+                if self.started:
+                    send(READY)
+
+        app = RequestCounter(self.app, request_limit, lambda: send(RECYCLE)) if request_limit else self.app
+        config = uvicorn.Config(app, timeout_graceful_shutdown=self.drain_timeout, **self.uvicorn_options)
+        WorkerServer(config).run(sockets=[self.sock])
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            os.close(worker.channel)
+            self._exited(worker, status)
+
+    def _exited(self, worker: Worker, status: int):
+        if self.replacing and worker.pid in self.replacing:
+            # A crashed replacement leaves the old worker serving and still due; the roll
+            # starts another replacement for it rather than a crash replacement as well
+            self.replacing = None
+        if worker.retiring_since is None and not self.stopping:
+            self.recycled['crashed'] += 1
+            self.respawn_delay = min(max(self.respawn_delay * 2, RESPAWN_BACKOFF_MIN), RESPAWN_BACKOFF_MAX)
+            self.respawn_at = time.time() + self.respawn_delay
+            logging.warning(f"Worker {worker.pid} exited unexpectedly (status {status}); "
+                            f"replacing it in {self.respawn_delay:.1f}s")
+        else:
+            logging.info(f"Worker {worker.pid} exited after draining")
+
+    def _read_messages(self):
+        # A worker's pipe reads as closed from its exit until it is reaped; skip it until then
+        channels = {worker.channel: worker for worker in self.workers.values() if not worker.exited}
+        if not channels:
+            time.sleep(self.check_interval)
+            return
+        try:
+            readable, _, _ = select.select(list(channels), [], [], self.check_interval)
+        except InterruptedError:
+            return
+        for channel in readable:
+            worker = channels[channel]
+            try:
+                data = os.read(channel, 64)
+            except OSError:
+                continue
+            if not data:
+                worker.exited = True
+                continue
+            if READY in data:
+                worker.ready = True
+                self.respawn_delay = 0.0
+                worker.baseline_mb = read_process_rss_mb(worker.pid)
+                if worker.baseline_mb is not None and worker.baseline_mb > self.max_memory_mb:
+                    logging.warning(f"Worker {worker.pid} starts at {worker.baseline_mb:.0f} MB, above the "
+                                    f"{self.max_memory_mb} MB recycling limit; memory recycling is disabled for it")
+            if RECYCLE in data and worker.recycle_reason is None:
+                worker.recycle_reason = "requests"
+
+    def memory_report(self) -> Dict[str, float]:
+        """
+        Per-worker RSS and USS, and how much of the workers' RSS is shared.
+        Without the pre-fork preload each worker's USS would be close to
+        its RSS.
+        """
+        report = {'workers': 0, 'rss_mb': 0.0, 'uss_mb': 0.0}
+        for worker in self.workers.values():
+            memory = read_process_memory(worker.pid)
+            if memory is None:
+                continue
+            report['workers'] += 1
+            report['rss_mb'] += memory['rss_mb']
+            report['uss_mb'] += memory['uss_mb']
+        report['shared_mb'] = report['rss_mb'] - report['uss_mb']
+        return report
+
+    def _report_sharing(self):
+        """Log the copy-on-write savings once the first workers are all serving"""
+        if self.reported_sharing or len(self.workers) < self.target \
+                or not all(worker.ready for worker in self.workers.values()):
+            return
+        self.reported_sharing = True
+        report = self.memory_report()
+        if report['workers']:
+            logging.info(f"{report['workers']} workers: RSS {report['rss_mb']:.0f} MB, unique (USS) "
+                         f"{report['uss_mb']:.0f} MB, {report['shared_mb']:.0f} MB shared copy-on-write "
+                         f"({report['uss_mb'] / report['workers']:.0f} MB unique per worker)")
+
+    def _check_memory(self):
+        for worker in self.workers.values():
+            if not worker.ready or worker.retiring_since is not None or worker.recycle_reason is not None:
+                continue
+            if worker.baseline_mb is not None and worker.baseline_mb > self.max_memory_mb:
+                continue  # a replacement would be over the limit too
+            rss = read_process_rss_mb(worker.pid)
+            if rss is not None and rss > self.max_memory_mb:
+                logging.warning(f"Worker {worker.pid} RSS {rss:.0f} MB exceeds {self.max_memory_mb} MB; recycling")
+                worker.recycle_reason = "memory"
+
+    def _retire(self, worker: Worker):
+        """Ask a worker to stop accepting connections and finish in-flight requests"""
+        worker.retiring_since = time.time()
+        self.recycled[worker.recycle_reason or "reload"] += 1
+        try:
+            os.kill(worker.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _roll(self):
+        now = time.time()
+        for worker in self.workers.values():
+            if worker.retiring_since is not None and now - worker.retiring_since > self.drain_timeout + 5:
+                logging.warning(f"Worker {worker.pid} did not drain in time; killing it")
+                try:
+                    os.kill(worker.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        if self.replacing is not None:
+            old, new = (self.workers.get(pid) for pid in self.replacing)
+            if new is not None and new.ready:
+                if old is not None:
+                    self._retire(old)
+                self.replacing = None
+            return
+        if now < self.respawn_at:
+            return
+        serving = [w for w in self.workers.values() if w.retiring_since is None]
+        if len(serving) < self.target:
+            self.spawn()
+            return
+        due = [w for w in serving if w.recycle_reason is not None]
+        if due and len(serving) == self.target:
+            old = min(due, key=lambda w: w.started_at)
+            self.replacing = (old.pid, self.spawn().pid)
+
+    def recycle_all(self):
+        """Rolling restart of every worker, e.g. on SIGHUP"""
+        for worker in self.workers.values():
+            if worker.retiring_since is None and worker.recycle_reason is None:
+                worker.recycle_reason = "reload"
+
+    def run(self):
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, "stopping", True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, "stopping", True))
+        signal.signal(signal.SIGHUP, lambda *_: self.recycle_all())
+        for _ in range(self.target):
+            self.spawn()
+        while not self.stopping:
+            self._reap()
+            self._read_messages()
+            self._report_sharing()
+            self._check_memory()
+            if not self.stopping:
+                self._roll()
+        self.shutdown()
+
+    def shutdown(self):
+        """Drain every worker, then kill any that outlive the drain timeout"""
+        logging.info("Shutting down workers...")
+        for worker in self.workers.values():
+            if worker.retiring_since is None:
+                worker.retiring_since = time.time()
+                try:
+                    os.kill(worker.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+        deadline = time.time() + self.drain_timeout + 5
+        while self.workers and time.time() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self._reap()
+        self.sock.close()
+        logging.info(f"Supervisor stopped; recycled workers: {self.recycled}")
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run Ketha AI Agent with pre-forked, self-recycling workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=PERFORMANCE_CONFIG["workers"])
+    parser.add_argument("--max-memory", type=float, default=get_dashboard_config()["max_memory_limit"],
+                        help="recycle a worker whose RSS exceeds this many MB")
+    parser.add_argument("--max-requests", type=int, default=PERFORMANCE_CONFIG["worker_max_requests"],
+                        help="recycle a worker after this many requests (0 disables)")
+    parser.add_argument("--max-requests-jitter", type=int, default=PERFORMANCE_CONFIG["worker_max_requests_jitter"])
+    parser.add_argument("--drain-timeout", type=float, default=PERFORMANCE_CONFIG["worker_drain_timeout"])
+    parser.add_argument("--no-preload-models", action="store_true", help="import the app but load models lazily")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(process)d] %(message)s")
+    if not hasattr(os, "fork"):
+        sys.exit("launcher.py needs os.fork(); run uvicorn main:app directly on this platform")
+    # Workers inherit the mapping and each claims a slot in it for fleet-wide admin metrics
+    from shared_metrics import create_fleet_file, shared_metrics
+    metrics_path = create_fleet_file()
+    shared_metrics.open(metrics_path)
+    app = preload(load_models=not args.no_preload_models)
+    # Outside a memory cgroup each worker can only see its own RSS, so it budgets its share
+    from memory_governor import memory_governor
+    memory_governor.workers = args.workers
+    sock = bind_socket(args.host, args.port)
+    logging.info(f"Serving on {args.host}:{args.port} with {args.workers} workers "
+                 f"(recycle above {args.max_memory} MB or after {args.max_requests or 'unlimited'} requests)")
+    Supervisor(
+        app, sock,
+        workers=args.workers,
+        max_memory_mb=args.max_memory,
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter,
+        drain_timeout=args.drain_timeout,
+        check_interval=PERFORMANCE_CONFIG["worker_check_interval"],
+        uvicorn_options={'log_level': "info", 'access_log': True}
+    ).run()
+    shared_metrics.close()
+    os.remove(metrics_path)
+
+
+if __name__ == "__main__":
+    main()
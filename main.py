@@ -1,17 +1,36 @@
 from fastapi import FastAPI, HTTPException, Request, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from models import AIRequest, AIResponse
 from memory_utils import memory_cleanup, log_memory_usage, force_cleanup, get_detailed_memory_info
 from admin_dashboard import admin_metrics
-from enhanced_dashboard import create_enhanced_dashboard_html
+from enhanced_dashboard import dashboard_assets, StaticAsset
 from performance_monitor import performance_monitor, optimization_analyzer
+from deadline import Deadline, DeadlineExceeded, deadline_scope, cancellation_stats
+from tracing import tracer, span
+from histograms import latency_registry
+from metrics_rollup import rollup_store
+from metrics_store import metrics_store
+from system_sampler import system_sampler
+from shared_metrics import shared_metrics
+from history_manager import history_manager
+from session_store import session_store
+from result_cache import RENDERERS as RESULT_RENDERERS, result_cache
+from result_export import EXPORT_FORMATS, export_available, export_stats
+from result_pages import PageUnavailable, ResultTooLarge, decode_cursor, encode_cursor, result_pager
+from database import stream_query
+from gc_manager import gc_manager
+from memory_governor import memory_governor, MemoryBudgetExceeded
+from dashboard_stream import create_broadcaster
+import metrics_exporter
+from dashboard_config import PERFORMANCE_CONFIG, EXPORT_CONFIG, OPTIMIZATION_CONFIG
 import traceback
 import logging
 import re
 import time
 import json
-from typing import List, Dict, Any
+import asyncio
+from typing import List, Dict, Any, Optional
 import gc
 from dotenv import load_dotenv
 import os
@@ -28,7 +47,7 @@ logger = logging.getLogger(__name__)
 
 # Try to import AI utilities with error handling
 try:
-    from ai_utils import handle_db_query, handle_general_query, needs_db_query, is_generic_response
+    from ai_utils import handle_db_query, handle_general_query, needs_db_query, is_generic_response, warm_caches
     AI_ENABLED = True
     logger.info("AI utilities loaded successfully")
 except Exception as e:
@@ -48,6 +67,9 @@ except Exception as e:
     def is_generic_response(response):
         return True
 
+    def warm_caches(heavy_hitters):
+        return []
+
 app = FastAPI(title="Ketha AI Agent", description="SQL Agent with Admin Dashboard")
 
 @app.on_event("startup")
@@ -55,16 +77,66 @@ async def startup_event():
     """Startup event handler"""
     logger.info("Starting Ketha AI Agent...")
     logger.info(f"AI Services: {'Enabled' if AI_ENABLED else 'Disabled - Check AWS credentials and database'}")
+    # Memory history follows the sampler's ticks, so idle periods leave no gaps
+    system_sampler.on_sample(lambda snapshot: admin_metrics.log_memory(snapshot['rss_mb']))
+    system_sampler.start()
+    shared_metrics.start()
+    session_store.start()
+    metrics_exporter.start_snapshot_writer()
+    try:
+        metrics_store.start()
+    except Exception as e:
+        logger.warning(f"Durable metrics store unavailable, history will not survive restarts: {e}")
+    performance_monitor.start_snapshotter()
+    asyncio.create_task(warm_caches_periodically())
+    if OPTIMIZATION_CONFIG["enable_gc_optimization"]:
+        gc_manager.start()
+        if not gc_manager.frozen_objects:
+            # Not preloaded by launcher.py: warm up here, then freeze the warm heap
+            asyncio.create_task(warm_up_and_freeze())
     logger.info("Server startup completed successfully")
 
+async def warm_up_and_freeze():
+    """
+    Load the models and schema caches that requests would otherwise load
+    lazily, then freeze them out of garbage collection, as launcher.preload
+    does before forking. Runs off the event loop so startup is not delayed.
+    """
+    if AI_ENABLED:
+        try:
+            warmed = await asyncio.to_thread(warm_caches, [{'route': "database"}, {'route': "bedrock"}])
+            logger.info(f"Warmed up: {', '.join(warmed) or 'nothing'}")
+        except Exception as e:
+            logger.warning(f"Warm-up failed, models will load on first use: {e}")
+    await asyncio.to_thread(gc_manager.freeze)
+
 @app.on_event("shutdown") 
 async def shutdown_event():
     """Shutdown event handler"""
     logger.info("Ketha AI Agent is shutting down...")
     # Clean up resources
+    metrics_store.stop()
+    system_sampler.stop()
+    shared_metrics.stop()
+    session_store.stop()
+    gc_manager.stop()
     gc.collect()
     logger.info("Shutdown completed")
 
+async def warm_caches_periodically():
+    """Pre-load the caches the current top query patterns depend on, off the request path"""
+    while True:
+        await asyncio.sleep(PERFORMANCE_CONFIG["cache_warm_interval"])
+        heavy_hitters = performance_monitor.heavy_hitters()
+        if not heavy_hitters:
+            continue
+        try:
+            warmed = await asyncio.to_thread(warm_caches, heavy_hitters)
+            if warmed:
+                logger.info(f"Warmed caches for top query patterns: {', '.join(warmed)}")
+        except Exception as e:
+            logger.warning(f"Cache warming failed: {e}")
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -74,35 +146,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Use a memory-efficient session store
-class LimitedSessionStore:
-    def __init__(self, max_users=100, max_history_per_user=10):
-        self.store = {}
-        self.max_users = max_users
-        self.max_history_per_user = max_history_per_user
-    
-    def get_session(self, user_id):
-        if user_id not in self.store:
-            if len(self.store) >= self.max_users:
-                # Remove oldest user session
-                oldest_user = next(iter(self.store))
-                del self.store[oldest_user]
-                gc.collect()
-            self.store[user_id] = []
-        return self.store[user_id]
-    
-    def add_to_session(self, user_id, entry):
-        session = self.get_session(user_id)
-        session.append(entry)
-        # Keep only recent history
-        if len(session) > self.max_history_per_user:
-            session[:] = session[-self.max_history_per_user:]
-    
-    def clear_session(self, user_id):
-        if user_id in self.store:
-            self.store[user_id] = []
+metrics_exporter.register_gauge("ketha_sessions", "Conversation sessions held in memory", lambda: len(session_store))
+metrics_exporter.register_gauge("ketha_session_bytes", "Bytes of conversation history held in memory",
+                                lambda: session_store.total_bytes)
+shared_metrics.register_gauge("sessions", lambda: len(session_store))
+shared_metrics.register_gauge("active_users", performance_monitor.user_activity.active_count)
+shared_metrics.register_gauge("peak_concurrent", lambda: performance_monitor.peak_concurrent_users)
+shared_metrics.register_gauge("rss_mb", lambda: system_sampler.snapshot()['rss_mb'])
+shared_metrics.register_gauge("peak_memory_mb", lambda: admin_metrics.peak_memory)
+metrics_exporter.register_gauge("ketha_open_fds", "Open file descriptors per worker",
+                                lambda: system_sampler.snapshot()['open_fds'] or 0, metrics_exporter.MERGE_PER_WORKER)
+metrics_exporter.register_gauge("ketha_memory_reserved_megabytes", "Memory reserved by running request stages",
+                                lambda: memory_governor.reserved / 1024 / 1024, metrics_exporter.MERGE_PER_WORKER)
+metrics_exporter.register_gauge("ketha_memory_uss_megabytes", "Memory unique to this worker (not shared after fork)",
+                                lambda: system_sampler.snapshot()['uss_mb'] or 0, metrics_exporter.MERGE_PER_WORKER)
+metrics_exporter.register_gauge("ketha_cpu_percent", "Process CPU use over the last sample interval",
+                                lambda: system_sampler.snapshot()['cpu_percent'], metrics_exporter.MERGE_PER_WORKER)
+
+async def run_cancellable(http_request: Request, deadline: Deadline, func, *args, **kwargs):
+    """
+    Run blocking work in a worker thread under the request deadline.
+    If the client disconnects or the deadline passes first, the deadline is
+    cancelled (which cancels running SQL) and DeadlineExceeded is raised.
+    """
+    def run_in_scope():
+        with deadline_scope(deadline):
+            return func(*args, **kwargs)
 
-session_store = LimitedSessionStore()
+    task = asyncio.ensure_future(asyncio.to_thread(run_in_scope))
+    # The thread may finish after we gave up on it; retrieve its outcome so it is not reported as lost
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    poll_interval = PERFORMANCE_CONFIG["disconnect_poll_interval"]
+
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=max(min(poll_interval, deadline.remaining()), 0.01))
+        if task in done:
+            return task.result()
+        if deadline.expired():
+            reason = deadline.reason or "deadline_exceeded"
+        elif await http_request.is_disconnected():
+            reason = "client_disconnected"
+        else:
+            continue
+        # Cancellation hooks talk to the database, so keep them off the event loop
+        await asyncio.to_thread(deadline.cancel, reason)
+        raise DeadlineExceeded(reason)
 
 # Health check endpoint to ensure service stays alive
 @app.get("/health")
@@ -179,40 +267,44 @@ async def root():
 
 @app.post("/query", response_model=AIResponse)
 @memory_cleanup
-async def query_ai(request: AIRequest):
+async def query_ai(request: AIRequest, http_request: Request):
     start_time = time.time()
+    deadline = Deadline(PERFORMANCE_CONFIG["request_deadline"])
+    trace = tracer.start_trace(user_id=str(request.user_id))
     log_memory_usage("before query")
     logging.info(f"Received request: user_id={request.user_id}, query={request.query}, chiller_id={request.chiller_id}")
-    user_session = session_store.get_session(request.user_id)
+    # The session may be read from SQLite, which must not block the event loop
+    user_session = await asyncio.to_thread(session_store.get_session, request.user_id)
     
-    route_type = "database" if needs_db_query(request.query) else "bedrock"
+    with span("needs_db_query"):
+        route_type = "database" if needs_db_query(request.query) else "bedrock"
     success = True
     db_execution_time = 0
     bedrock_execution_time = 0
     
     # Log user activity
     performance_monitor.log_user_session(str(request.user_id), "query_start")
-    performance_monitor.log_query_pattern(request.query)
+    performance_monitor.log_query_pattern(request.query, route_type)
     
     try:
-        # Use history from request if provided, else fallback to session
-        history = request.history if request.history else user_session[-4:] if len(user_session) > 0 else []
+        # Use history from request if provided, else fallback to session; build_prompt fits it to the token budget
+        history = request.history if request.history else list(user_session)
         
-        if needs_db_query(request.query):
+        if route_type == "database":
             db_start = time.time()
-            response = handle_db_query(request.query, chiller_id=request.chiller_id, history=history)
+            response = await run_cancellable(
+                http_request, deadline, handle_db_query, request.query, chiller_id=request.chiller_id, history=history,
+                columnar=request.columnar, formats=request.formats, user_id=request.user_id
+            )
             db_execution_time = time.time() - db_start
             
             # Log database performance
             performance_monitor.log_db_performance(request.query, db_execution_time, True)
             
-            logging.info(f"AI DB Response: {response}")
-            session_store.add_to_session(request.user_id, {"user": request.query, "ai": response.get("final_answer") or response.get("text", "")})
+            logging.info(f"AI DB Response: {response.get('text', '')} ({len(response.get('data') or response.get('rows') or [])} rows)")
+            await asyncio.to_thread(session_store.add_to_session, request.user_id, {"user": request.query, "ai": response.get("final_answer") or response.get("text", "")})
             log_memory_usage("after DB query")
             
-            # Log memory after processing
-            admin_metrics.log_memory()
-            
             result = {
                 "text": response.get("final_answer") or response.get("text") or "Here are your results:",
                 "isReport": response.get("isReport", True),
@@ -221,24 +313,29 @@ async def query_ai(request: AIRequest):
             }
         else:
             bedrock_start = time.time()
-            ai_text = handle_general_query(request.query, history=history)
+            ai_text = await run_cancellable(http_request, deadline, handle_general_query, request.query, history=history)
             bedrock_execution_time = time.time() - bedrock_start
             
             # Log Bedrock performance
             performance_monitor.log_bedrock_performance(request.query, bedrock_execution_time, True)
             
             logging.info(f"AI General Response: {ai_text}")
-            if is_generic_response(ai_text):
+            with span("is_generic_response"):
+                is_generic = is_generic_response(ai_text)
+            if is_generic:
                 logging.info("General response was generic, falling back to DB.")
                 
                 db_start = time.time()
-                response = handle_db_query(request.query, chiller_id=request.chiller_id, history=history)
+                response = await run_cancellable(
+                    http_request, deadline, handle_db_query, request.query, chiller_id=request.chiller_id, history=history,
+                    columnar=request.columnar, formats=request.formats, user_id=request.user_id
+                )
                 db_execution_time = time.time() - db_start
                 
                 # Log fallback database performance
                 performance_monitor.log_db_performance(request.query, db_execution_time, True)
                 
-                session_store.add_to_session(request.user_id, {"user": request.query, "ai": response.get("final_answer") or response.get("text", "")})
+                await asyncio.to_thread(session_store.add_to_session, request.user_id, {"user": request.query, "ai": response.get("final_answer") or response.get("text", "")})
                 log_memory_usage("after fallback DB query")
                 route_type = "database"  # Update route type for fallback
                 result = {
@@ -248,22 +345,47 @@ async def query_ai(request: AIRequest):
                     **response
                 }
             else:
-                session_store.add_to_session(request.user_id, {"user": request.query, "ai": ai_text})
+                await asyncio.to_thread(session_store.add_to_session, request.user_id, {"user": request.query, "ai": ai_text})
                 log_memory_usage("after general query")
                 result = {
                     "text": ai_text,
                     "isReport": False
                 }
-            
-            # Log memory after processing
-            admin_metrics.log_memory()
         
         response_time = time.time() - start_time
-        admin_metrics.log_query(str(request.user_id), request.query, route_type, response_time, success)
+        trace.attributes['route'] = route_type
+        admin_metrics.log_query(str(request.user_id), request.query, route_type, response_time, success, trace.request_id)
         performance_monitor.log_user_session(str(request.user_id), "query_success")
         
+        result["request_id"] = trace.request_id
         return result
         
+    except DeadlineExceeded as e:
+        response_time = time.time() - start_time
+        performance_monitor.log_error_pattern(str(e))
+        trace.attributes.update({'route': route_type, 'cancelled': e.reason})
+        admin_metrics.log_query(str(request.user_id), request.query, route_type, response_time, False, trace.request_id)
+        performance_monitor.log_user_session(str(request.user_id), "query_cancelled")
+        logging.warning(f"Query for user_id={request.user_id} cancelled after {response_time:.2f}s: {e.reason}")
+        return {
+            "text": "Your request took too long to process and was cancelled. Please try a more specific question.",
+            "isReport": False,
+            "request_id": trace.request_id
+        }
+        
+    except MemoryBudgetExceeded as e:
+        response_time = time.time() - start_time
+        performance_monitor.log_error_pattern(str(e))
+        trace.attributes.update({'route': route_type, 'error': type(e).__name__})
+        admin_metrics.log_query(str(request.user_id), request.query, route_type, response_time, False, trace.request_id)
+        performance_monitor.log_user_session(str(request.user_id), "query_rejected")
+        logging.warning(f"Query for user_id={request.user_id} rejected: {e}")
+        return {
+            "text": "The service is busy processing other large requests. Please try again in a moment.",
+            "isReport": False,
+            "request_id": trace.request_id
+        }
+        
     except Exception as e:
         success = False
         response_time = time.time() - start_time
@@ -275,7 +397,8 @@ async def query_ai(request: AIRequest):
         else:
             performance_monitor.log_bedrock_performance(request.query, bedrock_execution_time, False)
         
-        admin_metrics.log_query(str(request.user_id), request.query, route_type, response_time, success)
+        trace.attributes.update({'route': route_type, 'error': type(e).__name__})
+        admin_metrics.log_query(str(request.user_id), request.query, route_type, response_time, success, trace.request_id)
         performance_monitor.log_user_session(str(request.user_id), "query_error")
         
         error_trace = traceback.format_exc()
@@ -283,9 +406,81 @@ async def query_ai(request: AIRequest):
         force_cleanup()  # Force cleanup on error
         return {
             "text": f"Error processing your query: {str(e)}",
-            "isReport": False
+            "isReport": False,
+            "request_id": trace.request_id
         }
 
+@app.get("/results/{result_id}.{extension}")
+async def get_result(result_id: str, extension: str, token: str, user_id: Optional[int] = None):
+    """Render a recent /query result as CSV, markdown or JSON on demand, for its user and result_token"""
+    if extension not in RESULT_RENDERERS:
+        raise HTTPException(status_code=404, detail="Unknown result format")
+    entry = await asyncio.to_thread(result_cache.get, result_id, token, user_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    media_type, render = RESULT_RENDERERS[extension]
+    body = await asyncio.to_thread(render, entry.result)
+    return Response(body, media_type=media_type,
+                    headers={"Content-Disposition": f'inline; filename="result-{result_id}.{extension}"'})
+
+@app.get("/results/{result_id}/export")
+async def export_result(result_id: str, token: str, user_id: Optional[int] = None, format: str = "csv"):
+    """
+    Stream the full result of a recent /query (not just the rows in its
+    response) as gzip CSV, Parquet or Arrow IPC, re-running its SQL on a
+    server-side cursor; for its user and result_token only
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown export format, use one of: {', '.join(EXPORT_FORMATS)}")
+    if not export_available(format):
+        raise HTTPException(status_code=501, detail=f"{format} export needs pyarrow, which is not installed")
+    entry = await asyncio.to_thread(result_cache.get, result_id, token, user_id)
+    if entry is None or not entry.query:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    media_type, extension, _, _ = EXPORT_FORMATS[format]
+    chunks = stream_query(entry.query, PERFORMANCE_CONFIG["export_chunk_rows"])
+    # A sync generator: Starlette pulls it in a worker thread, one encoded chunk at a time
+    return StreamingResponse(export_stats.track(chunks, format), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="result-{result_id}.{extension}"'})
+
+@app.get("/query/{result_id}/rows")
+async def get_result_rows(result_id: str, cursor: str, token: str, user_id: Optional[int] = None,
+                          columnar: bool = False):
+    """
+    The page of a /query result that cursor points at, with the cursor for
+    the page after it. Pages are read from a spill of the result's SQL, so
+    the client can walk a large report without anyone holding all of it.
+    That spill is a second execution: without an ORDER BY over a unique key
+    its rows may not continue page 0 exactly.
+    """
+    try:
+        cursor_result_id, page = decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if cursor_result_id != result_id:
+        raise HTTPException(status_code=400, detail="Cursor belongs to another result")
+    entry = await asyncio.to_thread(result_cache.get, result_id, token, user_id)
+    if entry is None or not entry.query:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    try:
+        rows, last = await asyncio.to_thread(result_pager.read_page, result_id, entry.query, page, entry.owner)
+    except PermissionError:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    except ResultTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except PageUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    if rows is None:
+        raise HTTPException(status_code=404, detail="Cursor is past the end of the result")
+    return {
+        "result_id": result_id,
+        "columns": rows.describe(),
+        "data": [] if columnar else rows.to_records(),
+        "rows": rows.to_rows() if columnar else [],
+        "offset": page * result_pager.page_rows,
+        "next_cursor": None if last else encode_cursor(result_id, page + 1)
+    }
+
 @app.post("/clear_conversation")
 async def clear_conversation(payload: dict = Body(...)):
     user_id = payload.get("user_id")
@@ -335,37 +530,86 @@ async def manual_cleanup():
     except Exception as e:
         return {"status": "cleanup failed", "error": str(e)}
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus text exposition of all agent metrics"""
+    body = await asyncio.to_thread(metrics_exporter.render_metrics)
+    return PlainTextResponse(body, media_type=metrics_exporter.CONTENT_TYPE)
+
 # Admin Dashboard Endpoints
+def asset_response(request: Request, asset: StaticAsset, cache_control: str) -> Response:
+    """Serve a dashboard asset in the best encoding the client accepts, or 304 if it is cached"""
+    encoding, body = asset.negotiate(request.headers.get("accept-encoding"))
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding", "ETag": asset.etag(encoding)}
+    if asset.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=asset.media_type, headers=headers)
+
 @app.get("/admin", response_class=HTMLResponse)
-async def admin_dashboard():
-    """Serve the enhanced admin dashboard HTML"""
-    return create_enhanced_dashboard_html()
+async def admin_dashboard(request: Request):
+    """Serve the admin dashboard shell; it is revalidated on every load"""
+    return asset_response(request, dashboard_assets.shell, "no-cache")
+
+@app.get("/admin/static/{filename}")
+async def admin_static(filename: str, request: Request):
+    """Content-hashed dashboard assets, cacheable for a year"""
+    asset = dashboard_assets.get(filename)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return asset_response(request, asset, "public, max-age=31536000, immutable")
+
+def build_admin_metrics(include_history: bool = True) -> Dict[str, Any]:
+    """Admin metrics shared by /admin/metrics and /admin/stream"""
+    stats = admin_metrics.get_stats(session_store)
+    metrics = {
+        "stats": stats,
+        "user_activity": admin_metrics.user_activity.top_users(),
+        "system_info": get_detailed_memory_info(),
+        "session_count": stats['active_users'],
+        "workers": shared_metrics.read()['per_worker'],
+        "cancellations": cancellation_stats.get_stats(),
+        "gc": gc_manager.get_stats(),
+        "sessions": session_store.get_stats(),
+        "history": history_manager.get_stats(),
+        "results": result_cache.get_stats(),
+        "exports": export_stats.get_stats(),
+        "pages": result_pager.get_stats(),
+        "memory_budget": memory_governor.get_stats(),
+        "latency": latency_registry.summary("route"),
+        "recommendations": generate_optimization_recommendations(stats)
+    }
+    if include_history:
+        metrics["memory_history"] = admin_metrics.get_memory_history()
+        metrics["query_history"] = admin_metrics.get_query_history()
+    return metrics
 
 @app.get("/admin/metrics")
-async def get_admin_metrics():
-    """Get comprehensive admin metrics for the dashboard"""
+async def get_admin_metrics(window: int = None, resolution: int = None):
+    """
+    Get comprehensive admin metrics for the dashboard.
+    Pass window (seconds) and optionally resolution (1, 60 or 3600 seconds)
+    to include rolled-up memory, latency, request and error history. Windows
+    reaching back before this process started are read from the durable store.
+    """
     try:
-        # Update memory metrics
-        admin_metrics.log_memory()
-        
-        stats = admin_metrics.get_stats(session_store)
-        
-        return {
-            "stats": stats,
-            "memory_history": list(admin_metrics.memory_history),
-            "query_history": list(admin_metrics.query_history),
-            "user_activity": dict(admin_metrics.user_activity),
-            "system_info": get_detailed_memory_info(),
-            "session_count": len(session_store.store),
-            "recommendations": generate_optimization_recommendations(stats)
-        }
+        metrics = build_admin_metrics()
+        if metrics_store.running:
+            metrics["lifetime"] = await asyncio.to_thread(metrics_store.lifetime_stats)
+        if window:
+            uptime = time.time() - admin_metrics.start_time.timestamp()
+            if window > uptime and metrics_store.running:
+                metrics["rollups"] = await asyncio.to_thread(metrics_store.query_series, window, resolution)
+            else:
+                metrics["rollups"] = rollup_store.query(window, resolution)
+        return metrics
     except Exception as e:
         logging.error(f"Error getting admin metrics: {e}")
         return {"error": str(e)}
 
-@app.get("/admin/performance")
-async def get_performance_metrics():
-    """Get detailed performance metrics"""
+def build_performance_metrics() -> Dict[str, Any]:
+    """Performance metrics shared by /admin/performance and /admin/stream"""
     try:
         performance_data = performance_monitor.get_performance_summary()
         memory_stats = get_detailed_memory_info()
@@ -426,6 +670,49 @@ async def get_performance_metrics():
             "optimizations": []
         }
 
+@app.get("/admin/performance")
+async def get_performance_metrics():
+    """Get detailed performance metrics"""
+    return build_performance_metrics()
+
+def build_dashboard_state() -> Dict[str, Dict[str, Any]]:
+    """Aggregates pushed over /admin/stream; histories travel as events instead"""
+    metrics = build_admin_metrics(include_history=False)
+    if metrics_store.running:
+        metrics["lifetime"] = metrics_store.lifetime_stats()
+    return {"metrics": metrics, "performance": build_performance_metrics()}
+
+dashboard_broadcaster = create_broadcaster(build_dashboard_state, admin_metrics.events_since)
+
+@app.get("/admin/stream")
+async def admin_stream(request: Request, cursor: int = None, interval: float = None):
+    """
+    Server-Sent Events feed for the dashboard: a snapshot, then only new
+    events and changed aggregates. Resume with ?cursor= or Last-Event-ID;
+    interval may slow updates down but never below the server tick.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if cursor is None and last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id)
+    return StreamingResponse(
+        dashboard_broadcaster.subscribe(cursor, interval, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/admin/traces")
+async def get_recent_traces(limit: int = 50):
+    """List the most recent request traces, newest first"""
+    return {"traces": tracer.recent_traces(limit)}
+
+@app.get("/admin/traces/{request_id}")
+async def get_trace(request_id: str):
+    """Get every span recorded for one request, for the latency waterfall"""
+    trace = tracer.get_trace(request_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found or already evicted")
+    return trace
+
 @app.get("/admin/export")
 async def export_metrics():
     """Export metrics as JSON for external analysis"""
@@ -437,6 +724,10 @@ async def export_metrics():
             "export_timestamp": time.time(),
             "admin_metrics": admin_data,
             "performance_metrics": performance_data,
+            "history": rollup_store.query(24 * 3600, 60, max_points=EXPORT_CONFIG["max_export_history"]),
+            "durable_history": await asyncio.to_thread(
+                metrics_store.query_series, PERFORMANCE_CONFIG["metrics_retention_days"] * 86400, 3600
+            ) if metrics_store.running else None,
             "system_info": {
                 "memory_limit": "512MB",
                 "optimization_level": "production",
@@ -0,0 +1,252 @@
+"""
+Memory Governor for Ketha AI Agent
+Keeps requests inside the container's memory limit. Expensive stages
+reserve their estimated cost before they start; when the budget is spent
+they wait for other requests to release memory, then run on fewer rows,
+and are rejected only if even that does not fit. Estimates come from a
+per-stage cost model calibrated with sampled tracemalloc measurements.
+"""
+
+import logging
+import random
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from dashboard_config import PERFORMANCE_CONFIG
+from deadline import get_current_deadline
+from system_sampler import system_sampler
+from tracing import get_current_trace, span
+
+MB = 1024 * 1024
+
+# Starting cost model per stage: fixed bytes plus bytes per result cell
+DEFAULT_STAGE_COSTS = {
+    "format_results": (2 * MB, 400),  # DataFrame, markdown and CSV copies of the rows
+    "analysis": (1 * MB, 200),  # DataFrame for analysis and the chart config
+}
+
+# Estimates are padded, as calibration samples see the average case
+SAFETY_FACTOR = 1.5
+
+
+class MemoryBudgetExceeded(Exception):
+    """Raised when a stage cannot get even its minimum memory reservation"""
+
+    def __init__(self, stage: str, needed_mb: float, available_mb: float):
+        self.stage = stage
+        self.needed_mb = needed_mb
+        self.available_mb = available_mb
+        super().__init__(f"Memory budget exhausted for {stage}: needs {needed_mb:.1f} MB, "
+                         f"{available_mb:.1f} MB available")
+
+
+class StageCostModel:
+    """Fixed plus per-cell cost of one stage, refined by calibration samples"""
+
+    def __init__(self, base_bytes: float, bytes_per_cell: float):
+        self.base_bytes = base_bytes
+        self.bytes_per_cell = bytes_per_cell
+        self.samples = 0
+        self.max_observed = 0
+
+    def estimate(self, rows: int, columns: int) -> float:
+        return (self.base_bytes + self.bytes_per_cell * rows * max(columns, 1)) * SAFETY_FACTOR
+
+    def observe(self, measured_bytes: int, rows: int, columns: int):
+        """Fold one tracemalloc peak into the per-cell cost (exponentially weighted)"""
+        self.samples += 1
+        self.max_observed = max(self.max_observed, measured_bytes)
+        cells = rows * max(columns, 1)
+        if cells == 0:
+            return
+        per_cell = max(measured_bytes - self.base_bytes, 0) / cells
+        weight = 1.0 if self.samples == 1 else 0.2
+        self.bytes_per_cell += weight * (per_cell - self.bytes_per_cell)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'base_mb': round(self.base_bytes / MB, 2),
+            'bytes_per_cell': round(self.bytes_per_cell, 1),
+            'samples': self.samples,
+            'max_observed_mb': round(self.max_observed / MB, 2)
+        }
+
+
+class Grant:
+    """A reservation held for the duration of one stage"""
+
+    __slots__ = ("stage", "rows", "requested_rows", "reserved_bytes", "degraded")
+
+    def __init__(self, stage: str, rows: int, requested_rows: int, reserved_bytes: float):
+        self.stage = stage
+        self.rows = rows
+        self.requested_rows = requested_rows
+        self.reserved_bytes = reserved_bytes
+        self.degraded = rows < requested_rows
+
+
+class MemoryGovernor:
+    """
+    The budget is limit_mb minus headroom_mb minus current usage (from the
+    system sampler) minus outstanding reservations. Inside a memory cgroup
+    usage is the whole container's working set, so every worker budgets
+    against what all of them use, and limit_mb is capped by the cgroup's
+    limit. Elsewhere only this process's RSS is visible, so each of the
+    `workers` processes budgets against its share of the limit. Usage
+    already includes memory that running stages have allocated, so this
+    double counts them and errs towards admitting less. A stage that does not fit waits up to
+    queue_timeout seconds (bounded by the request deadline), then runs on as
+    many rows as fit, down to min_rows.
+    """
+
+    def __init__(self, limit_mb: float = 512, headroom_mb: float = 64, queue_timeout: float = 5.0,
+                 min_rows: int = 50, calibration_rate: float = 0.0, workers: int = 1,
+                 memory_source: str = "auto"):
+        self.limit_bytes = limit_mb * MB
+        self.workers = workers  # set by launcher.py before it forks
+        self.memory_source = memory_source  # "auto" (cgroup when available) or "process"
+        self.headroom_bytes = headroom_mb * MB
+        self.queue_timeout = queue_timeout
+        self.min_rows = min_rows
+        self.calibration_rate = calibration_rate
+        self.models = {stage: StageCostModel(*cost) for stage, cost in DEFAULT_STAGE_COSTS.items()}
+        self.reserved = 0.0
+        self.peak_reserved = 0.0
+        self.active = 0
+        self.waiting = 0
+        self.stats = {'granted': 0, 'waited': 0, 'degraded': 0, 'rejected': 0, 'calibrations': 0}
+        self.condition = threading.Condition()
+        self._calibrating = threading.Lock()
+
+    def available_bytes(self) -> float:
+        snapshot = system_sampler.snapshot()
+        container_mb = snapshot.get('cgroup_used_mb') if self.memory_source == "auto" else None
+        if container_mb is not None:
+            limit = self.limit_bytes
+            if snapshot.get('cgroup_limit_mb'):
+                limit = min(limit, snapshot['cgroup_limit_mb'] * MB)
+            return limit - self.headroom_bytes - container_mb * MB - self.reserved
+        share = (self.limit_bytes - self.headroom_bytes) / max(self.workers, 1)
+        return share - snapshot['rss_mb'] * MB - self.reserved
+
+    def model(self, stage: str) -> StageCostModel:
+        model = self.models.get(stage)
+        if model is None:
+            cost = DEFAULT_STAGE_COSTS.get(stage, DEFAULT_STAGE_COSTS["format_results"])
+            model = self.models.setdefault(stage, StageCostModel(*cost))
+        return model
+
+    def _rows_that_fit(self, model: StageCostModel, rows: int, columns: int, available: float) -> int:
+        if model.estimate(rows, columns) <= available:
+            return rows
+        per_row = model.bytes_per_cell * max(columns, 1) * SAFETY_FACTOR
+        spare = available - model.base_bytes * SAFETY_FACTOR
+        return max(min(int(spare // per_row) if per_row else rows, rows), 0)
+
+    def acquire(self, stage: str, rows: int, columns: int) -> Grant:
+        """Reserve budget for a stage, waiting and then degrading if it does not fit"""
+        model = self.model(stage)
+        needed = model.estimate(rows, columns)
+        deadline = get_current_deadline()
+        timeout = self.queue_timeout if deadline is None else min(self.queue_timeout, deadline.remaining())
+        with self.condition:
+            if self.available_bytes() < needed:
+                self.stats['waited'] += 1
+                self.waiting += 1
+                try:
+                    with span("memory_wait", stage=stage, needed_mb=round(needed / MB, 2)):
+                        self.condition.wait_for(lambda: self.available_bytes() >= needed, timeout=timeout)
+                finally:
+                    self.waiting -= 1
+            available = self.available_bytes()
+            granted_rows = self._rows_that_fit(model, rows, columns, available)
+            if granted_rows < min(rows, self.min_rows):
+                self.stats['rejected'] += 1
+                raise MemoryBudgetExceeded(stage, model.estimate(min(rows, self.min_rows), columns) / MB,
+                                           max(available, 0) / MB)
+            reserved = model.estimate(granted_rows, columns)
+            self.reserved += reserved
+            self.peak_reserved = max(self.peak_reserved, self.reserved)
+            self.active += 1
+            self.stats['granted'] += 1
+            grant = Grant(stage, granted_rows, rows, reserved)
+            if grant.degraded:
+                self.stats['degraded'] += 1
+                logging.warning(f"Memory budget low: {stage} limited to {granted_rows} of {rows} rows")
+        return grant
+
+    def release(self, grant: Grant):
+        with self.condition:
+            self.reserved -= grant.reserved_bytes
+            self.active -= 1
+            self.condition.notify_all()
+
+    @contextmanager
+    def reserve(self, stage: str, rows: int, columns: int):
+        """
+        Hold a reservation around one stage. Yields the Grant; callers must
+        process only grant.rows rows. A sampled fraction of stages is
+        measured with tracemalloc to calibrate the cost model, and the
+        request's trace records its reservations and measured peaks.
+        """
+        grant = self.acquire(stage, rows, columns)
+        trace = get_current_trace()
+        memory = None
+        if trace is not None:
+            memory = trace.attributes.setdefault('memory', {'reserved_mb': 0.0, 'peak_reserved_mb': 0.0,
+                                                            'measured_peak_mb': None, 'degraded': False})
+            memory['reserved_mb'] += grant.reserved_bytes / MB
+            memory['peak_reserved_mb'] = round(max(memory['peak_reserved_mb'], memory['reserved_mb']), 2)
+            memory['degraded'] = memory['degraded'] or grant.degraded
+        calibrating = self.calibration_rate > 0 and random.random() < self.calibration_rate \
+            and self._calibrating.acquire(blocking=False)
+        started_tracing = False
+        baseline = 0
+        try:
+            if calibrating:
+                started_tracing = not tracemalloc.is_tracing()
+                if started_tracing:
+                    tracemalloc.start()
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+            yield grant
+        finally:
+            if calibrating:
+                # Peak covers every thread's allocations while tracing; sampling keeps that noise rare
+                measured = tracemalloc.get_traced_memory()[1] - baseline
+                if started_tracing:
+                    tracemalloc.stop()
+                self._calibrating.release()
+                self.model(stage).observe(measured, grant.rows, columns)
+                self.stats['calibrations'] += 1
+                if memory is not None:
+                    memory['measured_peak_mb'] = round(max(memory['measured_peak_mb'] or 0, measured / MB), 2)
+            if memory is not None:
+                memory['reserved_mb'] -= grant.reserved_bytes / MB
+            self.release(grant)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.condition:
+            return {
+                'limit_mb': round(self.limit_bytes / MB, 1),
+                'headroom_mb': round(self.headroom_bytes / MB, 1),
+                'reserved_mb': round(self.reserved / MB, 2),
+                'peak_reserved_mb': round(self.peak_reserved / MB, 2),
+                'available_mb': round(self.available_bytes() / MB, 2),
+                'active_reservations': self.active,
+                'waiting': self.waiting,
+                **self.stats,
+                'models': {stage: model.to_dict() for stage, model in self.models.items()}
+            }
+
+
+# Global memory governor instance
+memory_governor = MemoryGovernor(
+    limit_mb=PERFORMANCE_CONFIG["memory_limit_mb"],
+    headroom_mb=PERFORMANCE_CONFIG["memory_headroom_mb"],
+    queue_timeout=PERFORMANCE_CONFIG["memory_queue_timeout"],
+    min_rows=PERFORMANCE_CONFIG["memory_min_rows"],
+    calibration_rate=PERFORMANCE_CONFIG["memory_calibration_rate"]
+)
@@ -7,87 +7,93 @@ import logging
 import sys
 import asyncio
 from functools import wraps
-
-try:
-    import psutil
-    PSUTIL_AVAILABLE = True
-except ImportError:
-    PSUTIL_AVAILABLE = False
-    logging.warning("psutil not available - using fallback memory monitoring")
+from tracing import span
+from system_sampler import system_sampler
+from gc_manager import gc_manager
+from dashboard_config import OPTIMIZATION_CONFIG
 
 def memory_cleanup(func):
-    """Decorator to force garbage collection after function execution"""
+    """
+    Decorator marking a request for the GC manager, which collects under
+    memory pressure or when idle. With enable_gc_optimization off it forces
+    a full collection after every call instead.
+    """
+    if not OPTIMIZATION_CONFIG["enable_gc_optimization"]:
+        return _collect_after(func)
     if asyncio.iscoroutinefunction(func):
         @wraps(func)
         async def async_wrapper(*args, **kwargs):
+            gc_manager.request_started()
             try:
-                result = await func(*args, **kwargs)
-                gc.collect()
-                return result
-            except Exception as e:
-                gc.collect()
-                raise e
+                return await func(*args, **kwargs)
+            finally:
+                gc_manager.request_finished()
         return async_wrapper
     else:
         @wraps(func)
         def sync_wrapper(*args, **kwargs):
+            gc_manager.request_started()
             try:
-                result = func(*args, **kwargs)
-                gc.collect()
-                return result
-            except Exception as e:
-                gc.collect()
-                raise e
+                return func(*args, **kwargs)
+            finally:
+                gc_manager.request_finished()
+        return sync_wrapper
+
+def _collect_after(func):
+    """Force garbage collection after every call"""
+    if asyncio.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                with span("memory_cleanup"):
+                    gc.collect()
+        return async_wrapper
+    else:
+        @wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with span("memory_cleanup"):
+                    gc.collect()
         return sync_wrapper
 
 def get_memory_usage():
-    """Get current memory usage in MB with accurate psutil monitoring"""
-    if PSUTIL_AVAILABLE:
-        try:
-            process = psutil.Process(os.getpid())
-            memory_info = process.memory_info()
-            return memory_info.rss / 1024 / 1024  # Convert bytes to MB
-        except Exception as e:
-            logging.warning(f"Failed to get psutil memory info: {e}")
-    
-    # Fallback: estimate using gc stats
-    return len(gc.get_objects()) * 0.001  # Rough estimate
+    """Current RSS in MB from the latest system sample"""
+    return system_sampler.snapshot()['rss_mb']
 
 def get_detailed_memory_info():
-    """Get detailed memory information if psutil is available"""
-    if not PSUTIL_AVAILABLE:
-        return {"error": "psutil not available"}
-    
-    try:
-        process = psutil.Process(os.getpid())
-        memory_info = process.memory_info()
-        memory_percent = process.memory_percent()
-        
-        return {
-            "rss_mb": memory_info.rss / 1024 / 1024,  # Resident Set Size
-            "vms_mb": memory_info.vms / 1024 / 1024,  # Virtual Memory Size
-            "percent": memory_percent,
-            "available_mb": psutil.virtual_memory().available / 1024 / 1024,
-            "total_mb": psutil.virtual_memory().total / 1024 / 1024
-        }
-    except Exception as e:
-        return {"error": str(e)}
+    """Detailed memory information from the latest system sample"""
+    snapshot = system_sampler.snapshot()
+    return {
+        "rss_mb": snapshot['rss_mb'],  # Resident Set Size
+        "used_mb": snapshot['used_mb'],
+        "vms_mb": snapshot['vms_mb'],  # Virtual Memory Size
+        "uss_mb": snapshot['uss_mb'],  # Unique Set Size: not shared with other workers
+        "pss_mb": snapshot['pss_mb'],  # Proportional Set Size
+        "percent": snapshot['percent'],
+        "available_mb": snapshot['available_mb'],
+        "total_mb": snapshot['total_mb'],
+        "cpu_percent": snapshot['cpu_percent'],
+        "open_fds": snapshot['open_fds'],
+        "gc_collections": snapshot['gc_collections'],
+        "sampled_at": snapshot['timestamp']
+    }
 
 def log_memory_usage(operation_name="", detailed=False):
     """Log current memory usage with optional detailed information"""
     try:
         memory_mb = get_memory_usage()
         
-        if detailed and PSUTIL_AVAILABLE:
+        if detailed:
             info = get_detailed_memory_info()
-            if "error" not in info:
-                logging.info(
-                    f"Memory usage {operation_name}: {memory_mb:.2f} MB "
-                    f"(RSS: {info['rss_mb']:.2f} MB, VMS: {info['vms_mb']:.2f} MB, "
-                    f"Process: {info['percent']:.1f}%)"
-                )
-            else:
-                logging.info(f"Memory usage {operation_name}: {memory_mb:.2f} MB")
+            logging.info(
+                f"Memory usage {operation_name}: {memory_mb:.2f} MB "
+                f"(RSS: {info['rss_mb']:.2f} MB, VMS: {info['vms_mb']:.2f} MB, "
+                f"Process: {info['percent']:.1f}%)"
+            )
         else:
             logging.info(f"Memory usage {operation_name}: {memory_mb:.2f} MB")
         
@@ -102,9 +108,10 @@ def log_memory_usage(operation_name="", detailed=False):
 
 def force_cleanup():
     """Force garbage collection and cleanup with detailed logging"""
-    before_mb = get_memory_usage()
+    # Sample directly: the published snapshot may predate the collection
+    before_mb = system_sampler.sample()['rss_mb']
     gc.collect()
-    after_mb = get_memory_usage()
+    after_mb = system_sampler.sample()['rss_mb']
     freed_mb = before_mb - after_mb
     
     if freed_mb > 0:
@@ -0,0 +1,351 @@
+"""
+Prometheus Exporter for Ketha AI Agent
+Renders counters, gauges and histograms in the Prometheus text format from
+state the monitors already aggregate, so a scrape never rebuilds history.
+With several workers, each one publishes its samples to a shared directory
+and the scraped worker merges them.
+"""
+
+import fcntl
+import glob
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from admin_dashboard import admin_metrics
+from dashboard_config import PERFORMANCE_CONFIG
+from deadline import cancellation_stats
+from histograms import latency_registry
+from memory_utils import get_memory_usage
+from performance_monitor import performance_monitor
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency bucket bounds in seconds
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+# How samples from different workers combine: summed, or kept apart by a pid label
+MERGE_SUM = "sum"
+MERGE_PER_WORKER = "per_worker"
+
+MULTIPROC_DIR = os.getenv("KETHA_METRICS_DIR") or os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Extra gauges owned by other modules: name -> (help, merge, callable)
+_registered_gauges = {}
+
+
+class MetricFamily:
+    def __init__(self, name: str, metric_type: str, help_text: str, merge: str = MERGE_SUM):
+        self.name = name
+        self.type = metric_type
+        self.help = help_text
+        self.merge = merge
+        self.samples: List[Tuple[str, Dict[str, str], float]] = []
+
+    def add(self, value: float, suffix: str = "", **labels):
+        self.samples.append((self.name + suffix, labels, float(value)))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name, 'type': self.type, 'help': self.help,
+            'merge': self.merge, 'samples': self.samples
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MetricFamily":
+        family = cls(data['name'], data['type'], data['help'], data['merge'])
+        family.samples = [(name, labels, value) for name, labels, value in data['samples']]
+        return family
+
+
+def _add_histogram(family: MetricFamily, histogram, **labels):
+    for bound, count in zip(LATENCY_BUCKETS, histogram.cumulative_counts(LATENCY_BUCKETS)):
+        family.add(count, "_bucket", le=_format_value(bound), **labels)
+    family.add(histogram.count, "_bucket", le="+Inf", **labels)
+    family.add(histogram.sum, "_sum", **labels)
+    family.add(histogram.count, "_count", **labels)
+
+
+def register_gauge(name: str, help_text: str, read, merge: str = MERGE_SUM):
+    """Expose read() as a gauge on every scrape"""
+    _registered_gauges[name] = (help_text, merge, read)
+
+
+def collect_local() -> List[MetricFamily]:
+    """Samples for this process only"""
+    families = []
+
+    queries = MetricFamily("ketha_queries_total", "counter", "Queries handled, by route")
+    queries.add(admin_metrics.db_queries, route="database")
+    queries.add(admin_metrics.bedrock_queries, route="bedrock")
+    families.append(queries)
+
+    errors = MetricFamily("ketha_query_errors_total", "counter", "Queries that failed or were cancelled")
+    errors.add(admin_metrics.error_count)
+    families.append(errors)
+
+    error_patterns = MetricFamily("ketha_errors_total", "counter", "Errors by classified type")
+    for error_type, count in dict(performance_monitor.error_patterns).items():
+        error_patterns.add(count, error_type=error_type)
+    families.append(error_patterns)
+
+    cancellations = cancellation_stats.get_stats()
+    cancelled = MetricFamily("ketha_cancelled_requests_total", "counter", "Requests cancelled, by reason")
+    for reason, count in cancellations['cancelled_by_reason'].items():
+        cancelled.add(count, reason=reason)
+    families.append(cancelled)
+    statements = MetricFamily("ketha_cancelled_statements_total", "counter", "SQL statements cancelled with pg_cancel_backend")
+    statements.add(cancellations['cancelled_statements'])
+    families.append(statements)
+    reclaimed = MetricFamily("ketha_cancellation_reclaimed_seconds_total", "counter", "Time given back by cancelling work")
+    reclaimed.add(cancellations['reclaimed_request_seconds'], kind="request")
+    reclaimed.add(cancellations['reclaimed_statement_seconds'], kind="statement")
+    families.append(reclaimed)
+
+    memory = MetricFamily("ketha_memory_rss_megabytes", "gauge", "Resident memory per worker", MERGE_PER_WORKER)
+    memory.add(get_memory_usage())
+    families.append(memory)
+    peak = MetricFamily("ketha_memory_peak_megabytes", "gauge", "Peak observed resident memory per worker", MERGE_PER_WORKER)
+    peak.add(admin_metrics.peak_memory)
+    families.append(peak)
+    uptime = MetricFamily("ketha_uptime_seconds", "gauge", "Seconds since the worker started", MERGE_PER_WORKER)
+    uptime.add(time.time() - admin_metrics.start_time.timestamp())
+    families.append(uptime)
+
+    for name, (help_text, merge, read) in list(_registered_gauges.items()):
+        gauge = MetricFamily(name, "gauge", help_text, merge)
+        try:
+            gauge.add(read())
+        except Exception as e:
+            logging.warning(f"Could not read gauge {name}: {e}")
+            continue
+        families.append(gauge)
+
+    peak_users = MetricFamily("ketha_peak_concurrent_users", "gauge", "Peak concurrent users seen by a worker", MERGE_PER_WORKER)
+    peak_users.add(performance_monitor.peak_concurrent_users)
+    families.append(peak_users)
+
+    families.extend(_collect_pool_stats())
+    families.extend(_collect_cache_stats())
+
+    for metric, name, help_text, label in (
+        ("route", "ketha_request_duration_seconds", "End-to-end /query latency", "route"),
+        ("handler", "ketha_handler_duration_seconds", "Database and Bedrock handler latency", "handler"),
+        ("stage", "ketha_stage_duration_seconds", "Latency of traced request stages", "stage"),
+        ("gc", "ketha_gc_pause_seconds", "Garbage collection pauses", "generation"),
+    ):
+        family = MetricFamily(name, "histogram", help_text)
+        for value in latency_registry.labels(metric):
+            if metric == "route" and value == "all":
+                continue
+            _add_histogram(family, latency_registry.get(metric, value).total, **{label: value})
+        families.append(family)
+
+    return families
+
+
+def _collect_pool_stats() -> List[MetricFamily]:
+    """Connection pool gauges, only once the engine has actually been created"""
+    database = sys.modules.get("database")
+    if database is None or not database.get_db_engine.cache_info().currsize:
+        return []
+    try:
+        pool = database.get_db_engine().pool
+        family = MetricFamily("ketha_db_pool_connections", "gauge", "Database pool connections by state")
+        family.add(pool.checkedout(), state="checked_out")
+        family.add(pool.checkedin(), state="idle")
+        family.add(pool.overflow(), state="overflow")
+        size = MetricFamily("ketha_db_pool_size", "gauge", "Configured database pool size")
+        size.add(pool.size())
+        return [family, size]
+    except Exception as e:
+        logging.warning(f"Could not read pool stats: {e}")
+        return []
+
+
+def _collect_cache_stats() -> List[MetricFamily]:
+    """Hit/miss counters for the lru_cache'd schema helpers that are loaded"""
+    cached = []
+    for module_name, function_names in (
+        ("sql_agent", ("get_schema_summary", "get_valid_tables_and_columns", "get_join_guides")),
+        ("ai_utils", ("get_schema_words",)),
+    ):
+        module = sys.modules.get(module_name)
+        if module is None:
+            continue
+        for function_name in function_names:
+            function = getattr(module, function_name, None)
+            if function is not None and hasattr(function, "cache_info"):
+                cached.append((function_name, function.cache_info()))
+    if not cached:
+        return []
+    family = MetricFamily("ketha_cache_requests_total", "counter", "Cache lookups by cache and result")
+    for name, info in cached:
+        family.add(info.hits, cache=name, result="hit")
+        family.add(info.misses, cache=name, result="miss")
+    return [family]
+
+
+def _worker_file(pid: int) -> str:
+    return os.path.join(MULTIPROC_DIR, f"worker-{pid}.json")
+
+
+def write_worker_snapshot():
+    """Publish this worker's samples for the other workers to merge"""
+    if not MULTIPROC_DIR:
+        return
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    payload = {'pid': os.getpid(), 'families': [family.to_dict() for family in collect_local()]}
+    fd, tmp_path = tempfile.mkstemp(dir=MULTIPROC_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, _worker_file(os.getpid()))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _read_snapshot(path: str):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning(f"Skipping unreadable metrics snapshot {path}: {e}")
+        return None
+
+
+def _merge(payloads: List[Tuple[Dict[str, Any], bool]]) -> List[MetricFamily]:
+    """
+    Sum snapshots' samples; per-worker gauges keep a pid label. Gauges of
+    exited workers are dropped, summed ones included: they describe state
+    that left with the worker, unlike counters and histograms.
+    """
+    merged: Dict[str, MetricFamily] = {}
+    totals: Dict[str, Dict[Tuple, float]] = {}
+    for payload, alive in payloads:
+        for data in payload['families']:
+            family = MetricFamily.from_dict(data)
+            if family.type == "gauge" and not alive:
+                continue
+            target = merged.setdefault(family.name, MetricFamily(family.name, family.type, family.help, family.merge))
+            sums = totals.setdefault(family.name, {})
+            for name, labels, value in family.samples:
+                if family.merge == MERGE_PER_WORKER:
+                    labels = dict(labels, pid=str(payload['pid']))
+                key = (name, tuple(sorted(labels.items())))
+                sums[key] = sums.get(key, 0.0) + value
+
+    for family_name, sums in totals.items():
+        merged[family_name].samples = [(name, dict(labels), value) for (name, labels), value in sums.items()]
+    return list(merged.values())
+
+
+def _retire_worker(path: str):
+    """
+    Fold an exited worker's counters and histograms into retired.json and
+    delete its snapshot, so recycled workers neither pile up nor make totals
+    go back; its gauges are left out
+    """
+    retired_path = os.path.join(MULTIPROC_DIR, "retired.json")
+    with open(os.path.join(MULTIPROC_DIR, "retire.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        payload = _read_snapshot(path)
+        if payload is None:
+            return  # Another worker folded it first
+        retired = _read_snapshot(retired_path) or {'pid': 0, 'families': []}
+        families = _merge([(retired, False), (payload, False)])
+        fd, tmp_path = tempfile.mkstemp(dir=MULTIPROC_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({'pid': 0, 'families': [family.to_dict() for family in families]}, f)
+        os.replace(tmp_path, retired_path)
+        os.remove(path)
+
+
+def collect_all() -> List[MetricFamily]:
+    """Samples for every worker sharing the metrics directory, merged"""
+    if not MULTIPROC_DIR:
+        return collect_local()
+    write_worker_snapshot()
+
+    payloads = []
+    for path in glob.glob(os.path.join(MULTIPROC_DIR, "worker-*.json")):
+        payload = _read_snapshot(path)
+        if payload is None:
+            continue
+        if _pid_alive(payload['pid']):
+            payloads.append((payload, True))
+            continue
+        try:
+            _retire_worker(path)
+        except OSError as e:
+            logging.warning(f"Could not retire metrics snapshot {path}: {e}")
+            payloads.append((payload, False))
+    retired = _read_snapshot(os.path.join(MULTIPROC_DIR, "retired.json"))
+    if retired is not None:
+        payloads.append((retired, False))
+    return _merge(payloads)
+
+
+def _format_value(value: float) -> str:
+    # One NaN or infinite gauge must not break the whole scrape
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_metrics() -> str:
+    """The full exposition body for a /metrics scrape"""
+    lines = []
+    for family in collect_all():
+        lines.append(f"# HELP {family.name} {family.help}")
+        lines.append(f"# TYPE {family.name} {family.type}")
+        for name, labels, value in family.samples:
+            if labels:
+                label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+            else:
+                lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def start_snapshot_writer():
+    """Keep this worker's snapshot fresh so scrapes served by other workers see it"""
+    if not MULTIPROC_DIR:
+        return None
+    interval = PERFORMANCE_CONFIG["metrics_flush_interval"]
+
+    def run():
+        while True:
+            try:
+                write_worker_snapshot()
+            except Exception as e:
+                logging.warning(f"Failed to write metrics snapshot: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="metrics-snapshot-writer", daemon=True)
+    thread.start()
+    logging.info(f"Publishing worker metrics to {MULTIPROC_DIR} every {interval}s")
+    return thread
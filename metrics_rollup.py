@@ -0,0 +1,263 @@
+"""
+Metric Rollups for Ketha AI Agent
+Per-second buckets compacted into per-minute and per-hour buckets, so the
+dashboard keeps days of memory, latency, traffic and error history in a
+few hundred KB
+"""
+
+import math
+import threading
+import time
+from array import array
+from typing import Any, Callable, Dict, List, Optional
+
+from histograms import LogHistogram
+
+# (bucket width in seconds, buckets kept)
+SECOND_TIER = (1, 120)        # 2 minutes, enough to build the open minute
+MINUTE_TIER = (60, 1440)      # 24 hours
+HOUR_TIER = (3600, 24 * 14)   # 14 days
+TIERS = {width: size for width, size in (SECOND_TIER, MINUTE_TIER, HOUR_TIER)}
+
+RESOLUTIONS = (1, 60, 3600)
+
+# Coarser than the live latency histograms: rollups trade precision for history
+ROLLUP_RELATIVE_ERROR = 0.1
+
+_EMPTY = float("nan")
+
+
+class RollupTier:
+    """
+    A ring of buckets kept as parallel typed arrays (epoch, count, sum, min,
+    max) rather than objects, plus an optional histogram per bucket packed
+    into bytes as int32 pairs [index, count, index, count, ...]. Values are
+    stored as float32, which is plenty for memory and latency dashboards.
+    """
+
+    def __init__(self, width: int, size: int, with_histogram: bool):
+        self.width = width
+        self.size = size
+        self.epochs = array('q', [-1]) * size
+        self.counts = array('i', [0]) * size
+        self.sums = array('f', [0.0]) * size
+        self.mins = array('f', [_EMPTY]) * size
+        self.maxs = array('f', [_EMPTY]) * size
+        self.histograms = [None] * size if with_histogram else None
+
+    def slot(self, epoch: int) -> int:
+        return epoch % self.size
+
+    def holds(self, epoch: int) -> bool:
+        return self.epochs[self.slot(epoch)] == epoch
+
+    def reset(self, epoch: int) -> int:
+        i = self.slot(epoch)
+        self.epochs[i] = epoch
+        self.counts[i] = 0
+        self.sums[i] = 0.0
+        self.mins[i] = _EMPTY
+        self.maxs[i] = _EMPTY
+        if self.histograms is not None:
+            self.histograms[i] = None
+        return i
+
+    def add(self, i: int, count: int, total: float, low: float, high: float, histogram: Optional[Dict[int, int]] = None):
+        self.counts[i] += count
+        self.sums[i] += total
+        if math.isnan(self.mins[i]) or low < self.mins[i]:
+            self.mins[i] = low
+        if math.isnan(self.maxs[i]) or high > self.maxs[i]:
+            self.maxs[i] = high
+        if histogram and self.histograms is not None:
+            self.histograms[i] = _pack(_unpack(self.histograms[i], histogram))
+
+
+def _unpack(packed, into: Optional[Dict[int, int]] = None) -> Dict[int, int]:
+    buckets = dict(into) if into else {}
+    if packed is not None:
+        pairs = array('i')
+        pairs.frombytes(packed)
+        for j in range(0, len(pairs), 2):
+            buckets[pairs[j]] = buckets.get(pairs[j], 0) + pairs[j + 1]
+    return buckets
+
+
+def _pack(buckets: Dict[int, int]) -> bytes:
+    pairs = array('i')
+    for index in sorted(buckets):
+        pairs.extend((index, buckets[index]))
+    return pairs.tobytes()
+
+
+class _Accumulator:
+    """Scratch totals used while compacting or building a still-open bucket"""
+
+    __slots__ = ("count", "sum", "min", "max", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = _EMPTY
+        self.max = _EMPTY
+        self.histogram = {}
+
+    def _add(self, count: int, total: float, low: float, high: float):
+        self.count += count
+        self.sum += total
+        if math.isnan(self.min) or low < self.min:
+            self.min = low
+        if math.isnan(self.max) or high > self.max:
+            self.max = high
+
+    def absorb(self, tier: RollupTier, epoch: int):
+        if not tier.holds(epoch):
+            return
+        i = tier.slot(epoch)
+        if not tier.counts[i]:
+            return
+        self._add(tier.counts[i], tier.sums[i], tier.mins[i], tier.maxs[i])
+        if tier.histograms is not None:
+            self.histogram = _unpack(tier.histograms[i], self.histogram)
+
+    def merge(self, other: "_Accumulator"):
+        if not other.count:
+            return
+        self._add(other.count, other.sum, other.min, other.max)
+        for index, count in other.histogram.items():
+            self.histogram[index] = self.histogram.get(index, 0) + count
+
+    def to_point(self, epoch: int, width: int, with_histogram: bool) -> Dict[str, Any]:
+        point = {
+            'timestamp': epoch * width,
+            'count': self.count,
+            'sum': self.sum,
+            'avg': self.sum / self.count if self.count else 0.0,
+            'min': self.min,
+            'max': self.max,
+            'rate': self.count / width
+        }
+        if with_histogram and self.histogram:
+            histogram = LogHistogram(ROLLUP_RELATIVE_ERROR)
+            histogram.buckets = self.histogram
+            histogram.count, histogram.sum, histogram.min, histogram.max = self.count, self.sum, self.min, self.max
+            point['p50'], point['p95'], point['p99'] = histogram.percentiles([0.5, 0.95, 0.99])
+        return point
+
+
+class RollupSeries:
+    """
+    One metric's history. Samples land in the per-second ring; when a minute
+    (or hour) closes, its seconds (or minutes) are compacted into one bucket
+    of the next tier.
+    """
+
+    def __init__(self, with_histogram: bool = False):
+        self.with_histogram = with_histogram
+        self.tiers = {width: RollupTier(width, size, with_histogram) for width, size in TIERS.items()}
+        self.bucketer = LogHistogram(ROLLUP_RELATIVE_ERROR)
+        self.open_minute = None
+        self.open_hour = None
+
+    def _accumulate(self, width: int, epoch: int) -> _Accumulator:
+        """Totals for one bucket of `width` built from the tier below it"""
+        below = 1 if width == 60 else 60
+        accumulator = _Accumulator()
+        for child in range(epoch * (width // below), (epoch + 1) * (width // below)):
+            accumulator.absorb(self.tiers[below], child)
+        return accumulator
+
+    def _close(self, width: int, epoch: int):
+        accumulator = self._accumulate(width, epoch)
+        tier = self.tiers[width]
+        i = tier.reset(epoch)
+        if accumulator.count:
+            tier.add(i, accumulator.count, accumulator.sum, accumulator.min, accumulator.max, accumulator.histogram)
+
+    def compact(self, now: float):
+        """Close any finished minute and hour into their tier"""
+        minute, hour = int(now // 60), int(now // 3600)
+        if self.open_minute is not None and self.open_minute < minute:
+            self._close(60, self.open_minute)
+        if self.open_hour is not None and self.open_hour < hour:
+            self._close(3600, self.open_hour)
+        self.open_minute, self.open_hour = minute, hour
+
+    def record(self, value: float, now: float):
+        self.compact(now)
+        second = int(now)
+        tier = self.tiers[1]
+        i = tier.slot(second) if tier.holds(second) else tier.reset(second)
+        histogram = {self.bucketer.bucket_index(value): 1} if self.with_histogram else None
+        tier.add(i, 1, value, value, value, histogram)
+
+    def _point(self, width: int, epoch: int) -> Optional[Dict[str, Any]]:
+        if width == 60 and epoch == self.open_minute:
+            accumulator = self._accumulate(60, epoch)
+        elif width == 3600 and epoch == self.open_hour:
+            # Closed minutes of this hour plus the minute still being filled
+            accumulator = self._accumulate(3600, epoch)
+            accumulator.merge(self._accumulate(60, self.open_minute))
+        else:
+            accumulator = _Accumulator()
+            accumulator.absorb(self.tiers[width], epoch)
+        if not accumulator.count:
+            return None
+        return accumulator.to_point(epoch, width, self.with_histogram)
+
+    def query(self, window: int, resolution: int, now: float) -> List[Dict[str, Any]]:
+        self.compact(now)
+        last = int(now // resolution)
+        first = max(int((now - window) // resolution) + 1, last - TIERS[resolution] + 1)
+        points = []
+        for epoch in range(first, last + 1):
+            point = self._point(resolution, epoch)
+            if point is not None:
+                points.append(point)
+        return points
+
+
+class RollupStore:
+    """Named rollup series for memory, latency, requests and errors"""
+
+    SERIES = {
+        "memory_mb": False,
+        "latency": True,
+        "requests": False,
+        "errors": False,
+    }
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self.series = {name: RollupSeries(with_histogram) for name, with_histogram in self.SERIES.items()}
+        self.lock = threading.Lock()
+
+    def record(self, name: str, value: float = 1.0):
+        with self.lock:
+            self.series[name].record(value, self.clock())
+
+    @staticmethod
+    def pick_resolution(window: int, resolution: Optional[int] = None, max_points: int = 1440) -> int:
+        """Honour a requested resolution, else the finest one that fits max_points"""
+        if resolution in RESOLUTIONS:
+            return resolution
+        for candidate in RESOLUTIONS:
+            if window / candidate <= max_points and window <= candidate * TIERS[candidate]:
+                return candidate
+        return RESOLUTIONS[-1]
+
+    def query(self, window: int, resolution: Optional[int] = None, names: Optional[List[str]] = None,
+              max_points: int = 1440) -> Dict[str, Any]:
+        resolution = self.pick_resolution(window, resolution, max_points)
+        now = self.clock()
+        with self.lock:
+            series = {
+                name: self.series[name].query(window, resolution, now)[-max_points:]
+                for name in (names or self.series)
+                if name in self.series
+            }
+        return {'window': window, 'resolution': resolution, 'series': series}
+
+
+# Global rollup store instance
+rollup_store = RollupStore()
@@ -0,0 +1,327 @@
+"""
+Durable Metrics Store for Ketha AI Agent
+Append-only, write-behind sink to a local SQLite database in WAL mode.
+Samples are queued in memory and written in batches by a background thread,
+so request handling never touches the disk and history survives restarts.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from dashboard_config import PERFORMANCE_CONFIG
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queries (
+    ts REAL NOT NULL,
+    request_id TEXT,
+    user_id TEXT,
+    route TEXT,
+    response_time REAL,
+    success INTEGER
+);
+CREATE INDEX IF NOT EXISTS queries_ts ON queries (ts);
+CREATE TABLE IF NOT EXISTS samples (
+    ts REAL NOT NULL,
+    name TEXT NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS samples_name_ts ON samples (name, ts);
+CREATE TABLE IF NOT EXISTS hourly (
+    hour INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL,
+    max REAL,
+    PRIMARY KEY (hour, name)
+);
+CREATE TABLE IF NOT EXISTS processes (
+    pid INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    stopped_at REAL,
+    PRIMARY KEY (pid, started_at)
+);
+CREATE TABLE IF NOT EXISTS totals (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+# Running totals kept by the write-behind batch, so lifetime stats never scan the raw tables
+SEED_TOTALS = """
+INSERT OR IGNORE INTO totals (name, value)
+SELECT 'requests', (SELECT COUNT(*) FROM queries)
+    + (SELECT COALESCE(SUM(count), 0) FROM hourly WHERE name = 'requests')
+UNION ALL
+SELECT 'errors', (SELECT COALESCE(SUM(CASE WHEN success THEN 0 ELSE 1 END), 0) FROM queries)
+    + (SELECT COALESCE(SUM(count), 0) FROM hourly WHERE name = 'errors')
+"""
+
+# Raw query rows are exposed as these series, matching the in-memory rollups
+QUERY_SERIES = {
+    "latency": "response_time",
+    "requests": "1.0",
+    "errors": "CASE WHEN success THEN NULL ELSE 1.0 END",
+}
+
+COMPACTION_INTERVAL = 3600  # seconds between retention/compaction passes
+
+
+class MetricsStore:
+    """
+    Write-behind SQLite metrics sink. record_*() only appends to a bounded
+    queue; a writer thread flushes the queue in one transaction every
+    flush_interval seconds and periodically rolls raw rows older than
+    raw_retention_days into hourly aggregates, which are kept for
+    retention_days. Reads open their own connection, which WAL lets run
+    alongside the writer.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 2.0, max_pending: int = 10000,
+                 raw_retention_days: float = 2, retention_days: float = 30):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.raw_retention = raw_retention_days * 86400
+        self.retention = retention_days * 86400
+        self.pending = deque(maxlen=max_pending)
+        self.dropped = 0
+        self.written = 0
+        self.running = False
+        self.started_at = None
+        self.last_compaction = 0.0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def start(self):
+        """Create the schema, register this process and start the writer thread"""
+        if self.running:
+            return self.thread
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.started_at = time.time()
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+            # A store written before totals existed is counted once, here
+            connection.execute(SEED_TOTALS)
+            connection.execute(
+                "INSERT INTO processes (pid, started_at, last_seen) VALUES (?, ?, ?)",
+                (os.getpid(), self.started_at, self.started_at)
+            )
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="metrics-store-writer", daemon=True)
+        self.thread.start()
+        logging.info(f"Persisting metrics to {self.path}")
+        return self.thread
+
+    def stop(self):
+        """Flush what is queued and mark this process as cleanly stopped"""
+        if not self.running:
+            return
+        self.running = False
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout=10)
+        with self._connect() as connection:
+            self._flush(connection)
+            now = time.time()
+            connection.execute(
+                "UPDATE processes SET last_seen = ?, stopped_at = ? WHERE pid = ? AND started_at = ?",
+                (now, now, os.getpid(), self.started_at)
+            )
+
+    def _enqueue(self, item):
+        if not self.running:
+            return
+        with self.lock:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(item)
+
+    def record_query(self, user_id: str, route: str, response_time: float, success: bool,
+                     request_id: Optional[str] = None):
+        self._enqueue(("query", (time.time(), request_id, user_id, route, response_time, int(success))))
+
+    def record_sample(self, name: str, value: float):
+        self._enqueue(("sample", (time.time(), name, value)))
+
+    def _run(self):
+        connection = self._connect()
+        try:
+            while self.running:
+                self.wake.wait(self.flush_interval)
+                try:
+                    self._flush(connection)
+                    if time.time() - self.last_compaction >= COMPACTION_INTERVAL:
+                        self.compact(connection)
+                except sqlite3.Error as e:
+                    logging.warning(f"Failed to write metrics to {self.path}: {e}")
+        finally:
+            connection.close()
+
+    def _flush(self, connection: sqlite3.Connection):
+        with self.lock:
+            batch = list(self.pending)
+            self.pending.clear()
+        queries = [row for kind, row in batch if kind == "query"]
+        samples = [row for kind, row in batch if kind == "sample"]
+        with connection:
+            if queries:
+                connection.executemany("INSERT INTO queries VALUES (?, ?, ?, ?, ?, ?)", queries)
+                errors = sum(1 for row in queries if not row[5])
+                connection.executemany(
+                    "INSERT INTO totals (name, value) VALUES (?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+                    [("requests", len(queries)), ("errors", errors)]
+                )
+            if samples:
+                connection.executemany("INSERT INTO samples VALUES (?, ?, ?)", samples)
+            if self.started_at is not None:
+                connection.execute(
+                    "UPDATE processes SET last_seen = ? WHERE pid = ? AND started_at = ?",
+                    (time.time(), os.getpid(), self.started_at)
+                )
+        self.written += len(batch)
+
+    def compact(self, connection: Optional[sqlite3.Connection] = None, now: Optional[float] = None):
+        """Roll raw rows past raw retention into hourly aggregates and drop expired data"""
+        now = now or time.time()
+        own_connection = connection is None
+        connection = connection or self._connect()
+        cutoff = (int(now - self.raw_retention) // 3600) * 3600  # whole hours only
+        upsert = """
+            INSERT INTO hourly (hour, name, count, sum, min, max) {select}
+            ON CONFLICT (hour, name) DO UPDATE SET
+                count = count + excluded.count, sum = sum + excluded.sum,
+                min = MIN(min, excluded.min), max = MAX(max, excluded.max)
+        """
+        try:
+            with connection:
+                for name, expression in QUERY_SERIES.items():
+                    connection.execute(upsert.format(select=f"""
+                        SELECT CAST(ts / 3600 AS INTEGER), '{name}', COUNT(v), SUM(v), MIN(v), MAX(v)
+                        FROM (SELECT ts, {expression} AS v FROM queries WHERE ts < ?)
+                        WHERE v IS NOT NULL GROUP BY 1
+                    """), (cutoff,))
+                connection.execute(upsert.format(select="""
+                    SELECT CAST(ts / 3600 AS INTEGER), name, COUNT(value), SUM(value), MIN(value), MAX(value)
+                    FROM samples WHERE ts < ? GROUP BY 1, 2
+                """), (cutoff,))
+                connection.execute("DELETE FROM queries WHERE ts < ?", (cutoff,))
+                connection.execute("DELETE FROM samples WHERE ts < ?", (cutoff,))
+                connection.execute("DELETE FROM hourly WHERE hour < ?", (int((now - self.retention) // 3600),))
+                connection.execute("DELETE FROM processes WHERE last_seen < ?", (now - self.retention,))
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.last_compaction = now
+        finally:
+            if own_connection:
+                connection.close()
+
+    def query_series(self, window: int, resolution: Optional[int] = None,
+                     names: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Persisted history in the same shape as rollup_store.query(). Raw rows
+        serve any resolution of a minute or more; older data is hourly only.
+        """
+        resolution = max(resolution or (60 if window <= 86400 else 3600), 60)
+        now = time.time()
+        since = now - window
+        names = names or list(QUERY_SERIES) + ["memory_mb"]
+        series = {}
+        with self._connect() as connection:
+            for name in names:
+                if name in QUERY_SERIES:
+                    raw = f"SELECT ts, {QUERY_SERIES[name]} AS v FROM queries WHERE ts >= ?"
+                    params = (since,)
+                else:
+                    raw = "SELECT ts, value AS v FROM samples WHERE name = ? AND ts >= ?"
+                    params = (name, since)
+                rows = connection.execute(f"""
+                    SELECT CAST(ts / ? AS INTEGER) * ?, ?, COUNT(v), SUM(v), MIN(v), MAX(v)
+                    FROM ({raw}) WHERE v IS NOT NULL GROUP BY 1
+                    UNION ALL
+                    SELECT hour * 3600, 3600, count, sum, min, max FROM hourly
+                    WHERE name = ? AND hour * 3600 >= ?
+                    ORDER BY 1
+                """, (resolution, resolution, resolution) + params + (name, since - 3600)).fetchall()
+                series[name] = self._points(rows, resolution)
+        return {'window': window, 'resolution': resolution, 'series': series}
+
+    @staticmethod
+    def _points(rows, resolution: int) -> List[Dict[str, Any]]:
+        """Merge raw and hourly rows into points; an hourly row's rate is spread over its hour"""
+        points = {}
+        for timestamp, width, count, total, low, high in rows:
+            key = int(timestamp // resolution * resolution)
+            point = points.get(key)
+            if point is None:
+                points[key] = {'timestamp': key, 'count': count, 'sum': total, 'min': low, 'max': high, 'width': width}
+            else:
+                point['count'] += count
+                point['sum'] += total
+                point['min'] = min(point['min'], low)
+                point['max'] = max(point['max'], high)
+                point['width'] = max(point['width'], width)
+        result = []
+        for key in sorted(points):
+            point = points[key]
+            width = point.pop('width')
+            point['avg'] = point['sum'] / point['count'] if point['count'] else 0.0
+            point['rate'] = point['count'] / width
+            result.append(point)
+        return result
+
+    @staticmethod
+    def _covered_seconds(intervals) -> float:
+        """Seconds during which at least one process was up; concurrent workers count once"""
+        covered, end = 0.0, None
+        for started_at, last_seen in intervals:
+            if end is None or started_at > end:
+                covered += last_seen - started_at
+                end = last_seen
+            elif last_seen > end:
+                covered += last_seen - end
+                end = last_seen
+        return covered
+
+    def lifetime_stats(self) -> Dict[str, Any]:
+        """Totals across every process that has written to this store"""
+        with self._connect() as connection:
+            # One row per worker start, dropped after the retention period: a small table
+            intervals = connection.execute(
+                "SELECT started_at, last_seen FROM processes ORDER BY started_at"
+            ).fetchall()
+            totals = dict(connection.execute("SELECT name, value FROM totals").fetchall())
+        total_queries = int(totals.get('requests') or 0)
+        errors = int(totals.get('errors') or 0)
+        return {
+            'process_starts': len(intervals),
+            'first_started_at': intervals[0][0] if intervals else None,
+            'total_uptime_hours': round(self._covered_seconds(intervals) / 3600, 2),
+            'total_queries': total_queries,
+            'error_rate': round(errors / max(total_queries, 1) * 100, 2),
+            'pending_writes': len(self.pending),
+            'dropped_writes': self.dropped
+        }
+
+
+# Global metrics store instance
+metrics_store = MetricsStore(
+    os.getenv("KETHA_METRICS_DB", PERFORMANCE_CONFIG["metrics_store_path"]),
+    flush_interval=PERFORMANCE_CONFIG["metrics_write_interval"],
+    raw_retention_days=PERFORMANCE_CONFIG["metrics_raw_retention_days"],
+    retention_days=PERFORMANCE_CONFIG["metrics_retention_days"]
+)
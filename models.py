@@ -6,6 +6,8 @@ class AIRequest(BaseModel):
     query: str
     chiller_id: Optional[int] = None
     history: Optional[List[Dict[str, Any]]] = None  # Add this line
+    columnar: bool = False  # rows as value lists under `rows` instead of dicts under `data`
+    formats: Optional[List[str]] = None  # renderings to include: "markdown", "csv", "json"; the rest via /results/{result_id}
 
 class AIResponse(BaseModel):
     text: str
@@ -14,7 +16,13 @@ class AIResponse(BaseModel):
     isChart: bool = False
     chartConfig: Optional[dict] = Field(default_factory=dict)
     data: list = Field(default_factory=list)
+    columns: list = Field(default_factory=list)  # [{"name", "type"}] for the rows in data or rows
+    rows: list = Field(default_factory=list)  # row value lists, in columns order, when the request asked for columnar
     analysis: dict = Field(default_factory=dict)
     formats: dict = Field(default_factory=dict)
+    result_id: Optional[str] = None  # fetch /results/{result_id}.csv, .md or .json for a few minutes
+    result_token: Optional[str] = None  # ?token= for those fetches, together with the request's user_id
+    next_cursor: Optional[str] = None  # GET /query/{result_id}/rows?cursor= for the next page of a longer result
+    request_id: Optional[str] = None
 
 
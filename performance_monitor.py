@@ -11,60 +11,143 @@ import threading
 import time
 from collections import defaultdict, deque
 import logging
+import re
+from histograms import latency_registry
+from metrics_store import metrics_store
+from activity_tracker import create_activity_tracker
+from sketches import SpaceSaving, HyperLogLog
+from shared_metrics import shared_metrics
+from dashboard_config import PERFORMANCE_CONFIG
+
+_MONTHS = r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+_DAY = r"\d{1,2}(?:st|nd|rd|th)?"
+_FINGERPRINT_RULES = [
+    (re.compile(r"(['\"]).*?\1"), " <str> "),
+    (re.compile(r"\b\d{4}[-/.]\d{1,2}[-/.]\d{1,2}\b|\b\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}\b"), " <date> "),
+    (re.compile(rf"\b(?:{_DAY}\s+{_MONTHS}\b(?:,?\s+\d{{4}})?|{_MONTHS}\s+(?:{_DAY}\b(?:,?\s+\d{{4}})?|\d{{4}}))", re.IGNORECASE), " <date> "),
+    (re.compile(r"\b(?:january|february|march|april|june|july|august|september|october|november|december)\b", re.IGNORECASE), " <date> "),
+    # Capitalised words that do not start a sentence are taken to be names
+    (re.compile(r"(?<=[\w,;:)]\s)[A-Z][a-zA-Z'\-]+(?:\s+[A-Z][a-zA-Z'\-]+)*"), " <name> "),
+    (re.compile(r"\b\d+(?:[.,]\d+)*\b"), " <num> "),
+]
+_FINGERPRINT_PUNCTUATION = re.compile(r"[^\w<>\s]+")
+
+
+def fingerprint_query(query: str, max_words: int = 16) -> str:
+    """
+    Normalise a question so near-duplicate phrasings share one pattern:
+    quoted strings, dates, names and numbers become placeholders and
+    case, punctuation and spacing are dropped
+    """
+    text = query.strip()
+    for pattern, placeholder in _FINGERPRINT_RULES:
+        text = pattern.sub(placeholder, text)
+    words = _FINGERPRINT_PUNCTUATION.sub(" ", text.lower()).split()
+    return " ".join(words[:max_words])
+
+class RollingCounts:
+    """
+    Totals, successes and per-type counts for the last hour in 60 one-minute
+    slots. Updated on write, so a summary sums 60 slots instead of filtering
+    raw events. Callers hold the monitor lock.
+    """
+
+    SLOT_SECONDS = 60
+    SLOTS = 60
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        # [epoch, total, successes, {query_type: count}]
+        self.slots = [[-1, 0, 0, {}] for _ in range(self.SLOTS)]
+
+    def record(self, success: bool, query_type: Optional[str] = None):
+        epoch = int(self.clock() // self.SLOT_SECONDS)
+        slot = self.slots[epoch % self.SLOTS]
+        if slot[0] != epoch:
+            slot[:] = [epoch, 0, 0, {}]
+        slot[1] += 1
+        slot[2] += 1 if success else 0
+        if query_type is not None:
+            slot[3][query_type] = slot[3].get(query_type, 0) + 1
+
+    def totals(self):
+        """(total, successes, query type counts) over the last hour"""
+        oldest = int(self.clock() // self.SLOT_SECONDS) - self.SLOTS + 1
+        total, successes, types = 0, 0, defaultdict(int)
+        for epoch, count, succeeded, slot_types in self.slots:
+            if epoch >= oldest:
+                total += count
+                successes += succeeded
+                for query_type, type_count in slot_types.items():
+                    types[query_type] += type_count
+        return total, successes, dict(types)
+
 
 class PerformanceMonitor:
-    def __init__(self):
-        self.db_query_times = deque(maxlen=100)
-        self.bedrock_query_times = deque(maxlen=100)
-        self.memory_snapshots = deque(maxlen=200)
-        self.user_sessions = defaultdict(list)
-        self.query_patterns = defaultdict(int)
+    def __init__(self, shared=None):
+        # Fleet-wide handler latencies shared by every worker; None keeps them per process
+        self.shared = shared
+        self.db_counts = RollingCounts()
+        self.bedrock_counts = RollingCounts()
+        self.user_activity = create_activity_tracker()
+        self.query_patterns = SpaceSaving(PERFORMANCE_CONFIG["pattern_sketch_capacity"])
+        self.unique_patterns = HyperLogLog()
+        self.unique_users = HyperLogLog()
         self.error_patterns = defaultdict(int)
-        self.peak_concurrent_users = 0
         self.lock = threading.Lock()
+        # Latest published summary, replaced wholesale and never mutated
+        self._snapshot = None
+        self._snapshot_thread = None
         
     def log_db_performance(self, query: str, execution_time: float, success: bool):
         """Log database query performance"""
+        latency_registry.record("handler", "database", execution_time)
+        metrics_store.record_sample("database_latency", execution_time)
+        if self.shared is not None:
+            self.shared.record_handler("database", execution_time, success)
+        query_type = self._classify_query(query)
         with self.lock:
-            self.db_query_times.append({
-                'timestamp': datetime.now(),
-                'execution_time': execution_time,
-                'success': success,
-                'query_type': self._classify_query(query)
-            })
+            self.db_counts.record(success, query_type)
     
     def log_bedrock_performance(self, query: str, execution_time: float, success: bool):
         """Log Bedrock API performance"""
+        latency_registry.record("handler", "bedrock", execution_time)
+        metrics_store.record_sample("bedrock_latency", execution_time)
+        if self.shared is not None:
+            self.shared.record_handler("bedrock", execution_time, success)
         with self.lock:
-            self.bedrock_query_times.append({
-                'timestamp': datetime.now(),
-                'execution_time': execution_time,
-                'success': success
-            })
+            self.bedrock_counts.record(success)
     
     def log_user_session(self, user_id: str, action: str):
         """Log user session activity"""
+        self.user_activity.touch(user_id, action)
         with self.lock:
-            self.user_sessions[user_id].append({
-                'timestamp': datetime.now(),
-                'action': action
-            })
-            
-            # Track concurrent users
-            active_users = len([uid for uid, sessions in self.user_sessions.items() 
-                              if sessions and (datetime.now() - sessions[-1]['timestamp']).seconds < 300])
-            if active_users > self.peak_concurrent_users:
-                self.peak_concurrent_users = active_users
+            self.unique_users.add(user_id)
+
+    @property
+    def peak_concurrent_users(self) -> int:
+        return self.user_activity.peak_active
     
-    def log_query_pattern(self, query: str):
-        """Analyze and log query patterns"""
+    def log_query_pattern(self, query: str, route: Optional[str] = None):
+        """Count the query's fingerprint, remembering the route it last took"""
         pattern = self._extract_pattern(query)
         with self.lock:
-            self.query_patterns[pattern] += 1
+            self.query_patterns.add(pattern, route)
+            self.unique_patterns.add(pattern)
+
+    def heavy_hitters(self, limit: int = None) -> List[Dict[str, Any]]:
+        """Most frequent query patterns with their count error bound and last route"""
+        with self.lock:
+            top = self.query_patterns.top(limit or PERFORMANCE_CONFIG["top_patterns"])
+        return [
+            {'pattern': hit['item'], 'count': hit['count'], 'error': hit['error'], 'route': hit['payload']}
+            for hit in top
+        ]
     
     def log_error_pattern(self, error: str):
         """Log error patterns for analysis"""
         error_type = self._classify_error(error)
+        metrics_store.record_sample(error_type, 1)
         with self.lock:
             self.error_patterns[error_type] += 1
     
@@ -85,63 +168,111 @@ class PerformanceMonitor:
     
     def _extract_pattern(self, query: str) -> str:
         """Extract query pattern for analysis"""
-        words = query.lower().split()[:5]  # First 5 words
-        return ' '.join(words)
+        return fingerprint_query(query)
     
     def _classify_error(self, error: str) -> str:
         """Classify error type"""
         error_lower = error.lower()
-        if 'database' in error_lower or 'sql' in error_lower:
+        # First: a DeadlineExceeded names the stage it hit, e.g. "during sql execution"
+        if 'timeout' in error_lower or 'deadline' in error_lower or 'cancelled' in error_lower:
+            return 'timeout_error'
+        elif 'database' in error_lower or 'sql' in error_lower:
             return 'database_error'
         elif 'bedrock' in error_lower or 'aws' in error_lower:
             return 'bedrock_error'
         elif 'memory' in error_lower or 'out of memory' in error_lower:
             return 'memory_error'
-        elif 'timeout' in error_lower:
-            return 'timeout_error'
         else:
             return 'other_error'
     
     def get_performance_summary(self) -> Dict[str, Any]:
-        """Get comprehensive performance summary"""
+        """
+        Get comprehensive performance summary. Returns the snapshot last
+        published by the snapshotter, so readers never take the lock the
+        request path writes under; treat it as read-only.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self._snapshot = self.build_summary()
+        return snapshot
+
+    def build_summary(self) -> Dict[str, Any]:
+        """Compute a fresh summary from the running aggregates"""
         with self.lock:
-            now = datetime.now()
-            
-            # DB Performance
-            recent_db_queries = [q for q in self.db_query_times if (now - q['timestamp']).seconds < 3600]
-            db_avg_time = sum(q['execution_time'] for q in recent_db_queries) / max(len(recent_db_queries), 1)
-            db_success_rate = sum(1 for q in recent_db_queries if q['success']) / max(len(recent_db_queries), 1) * 100
-            
-            # Bedrock Performance
-            recent_bedrock_queries = [q for q in self.bedrock_query_times if (now - q['timestamp']).seconds < 3600]
-            bedrock_avg_time = sum(q['execution_time'] for q in recent_bedrock_queries) / max(len(recent_bedrock_queries), 1)
-            bedrock_success_rate = sum(1 for q in recent_bedrock_queries if q['success']) / max(len(recent_bedrock_queries), 1) * 100
-            
-            # User Activity
-            active_users_count = len([uid for uid, sessions in self.user_sessions.items() 
-                                    if sessions and (now - sessions[-1]['timestamp']).seconds < 300])
-            
-            return {
-                'database_performance': {
-                    'avg_response_time': db_avg_time,
-                    'success_rate': db_success_rate,
-                    'total_queries': len(recent_db_queries),
-                    'query_types': dict(defaultdict(int, {qtype: sum(1 for q in recent_db_queries if q['query_type'] == qtype) 
-                                                        for qtype in set(q['query_type'] for q in recent_db_queries)}))
-                },
-                'bedrock_performance': {
-                    'avg_response_time': bedrock_avg_time,
-                    'success_rate': bedrock_success_rate,
-                    'total_queries': len(recent_bedrock_queries)
-                },
-                'user_activity': {
-                    'active_users': active_users_count,
-                    'peak_concurrent': self.peak_concurrent_users,
-                    'total_unique_users': len(self.user_sessions)
-                },
-                'query_patterns': dict(sorted(self.query_patterns.items(), key=lambda x: x[1], reverse=True)[:10]),
-                'error_patterns': dict(self.error_patterns)
-            }
+            db_total, db_successes, query_types = self.db_counts.totals()
+            bedrock_total, bedrock_successes, _ = self.bedrock_counts.totals()
+            query_patterns = {hit['item']: hit['count'] for hit in self.query_patterns.top(PERFORMANCE_CONFIG["top_patterns"])}
+            error_patterns = dict(self.error_patterns)
+
+        db_latency = self._latency_summary("database")
+        bedrock_latency = self._latency_summary("bedrock")
+        active_users = self.user_activity.active_count()
+        peak_concurrent = self.peak_concurrent_users
+        unique_users = self.unique_users.count()
+        if self.shared is not None:
+            # Every worker's handler calls over the last hour, not just this one's
+            fleet = self.shared.read()
+            db_recent, db_errors = self.shared.window("database", 3600)
+            bedrock_recent, bedrock_errors = self.shared.window("bedrock", 3600)
+            db_latency, bedrock_latency = db_recent.summary(), bedrock_recent.summary()
+            db_total, db_successes = db_recent.count, db_recent.count - db_errors
+            bedrock_total, bedrock_successes = bedrock_recent.count, bedrock_recent.count - bedrock_errors
+            active_users = int(fleet['gauges']['active_users'])
+            peak_concurrent = int(fleet['gauges']['peak_concurrent'])
+            unique_users = fleet['unique_users']
+        return {
+            'database_performance': {
+                'avg_response_time': db_latency['avg'],
+                'p50_response_time': db_latency['p50'],
+                'p95_response_time': db_latency['p95'],
+                'p99_response_time': db_latency['p99'],
+                'success_rate': db_successes / max(db_total, 1) * 100,
+                'total_queries': db_total,
+                'query_types': query_types
+            },
+            'bedrock_performance': {
+                'avg_response_time': bedrock_latency['avg'],
+                'p50_response_time': bedrock_latency['p50'],
+                'p95_response_time': bedrock_latency['p95'],
+                'p99_response_time': bedrock_latency['p99'],
+                'success_rate': bedrock_successes / max(bedrock_total, 1) * 100,
+                'total_queries': bedrock_total
+            },
+            'user_activity': {
+                'active_users': active_users,
+                'peak_concurrent': peak_concurrent,
+                'total_unique_users': unique_users
+            },
+            'query_patterns': query_patterns,
+            'unique_patterns': self.unique_patterns.count(),
+            'error_patterns': error_patterns,
+            'stage_latency': latency_registry.summary("stage"),
+            'generated_at': time.time()
+        }
+
+    def start_snapshotter(self, interval: float = None):
+        """Publish a fresh summary every interval seconds from a background thread"""
+        if self._snapshot_thread is not None:
+            return self._snapshot_thread
+        interval = interval or PERFORMANCE_CONFIG["summary_snapshot_interval"]
+
+        def run():
+            while True:
+                try:
+                    self._snapshot = self.build_summary()
+                except Exception as e:
+                    logging.warning(f"Failed to build performance summary: {e}")
+                time.sleep(interval)
+
+        self._snapshot_thread = threading.Thread(target=run, name="performance-snapshotter", daemon=True)
+        self._snapshot_thread.start()
+        return self._snapshot_thread
+    
+    @staticmethod
+    def _latency_summary(handler: str) -> Dict[str, float]:
+        """Last-hour latency percentiles for a handler, from its streaming histogram"""
+        recent = latency_registry.window("handler", handler, 3600)
+        return recent.summary() if recent else {'avg': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
 
 class OptimizationAnalyzer:
     """Analyzes system performance and suggests optimizations"""
@@ -258,5 +389,5 @@ class OptimizationAnalyzer:
         return optimizations
 
 # Global performance monitor instance
-performance_monitor = PerformanceMonitor()
+performance_monitor = PerformanceMonitor(shared=shared_metrics)
 optimization_analyzer = OptimizationAnalyzer()
@@ -0,0 +1,243 @@
+"""
+Result Cache for Ketha AI Agent
+Keeps recent query results for a few minutes so clients can fetch other
+renderings (/results/{id}.csv, .md, .json) when they need them, instead of
+every response carrying all of them. The newest results stay in memory;
+each one is also spilled to a file in a directory shared by the workers on
+the host, so a follow-up request that lands on another worker finds it.
+A result is only handed out with the random token issued when it was stored
+and to the user it was stored for.
+"""
+
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import stat
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from columnar import ColumnarResult
+from dashboard_config import OPTIMIZATION_CONFIG
+
+# Result ids come from request ids (hex); anything else never reaches the filesystem
+RESULT_ID = re.compile(r"^[0-9a-f]{8,64}$")
+
+
+def prepare_spill_dir(path: str):
+    """
+    Create path private to this user, or check that an existing one is: a
+    real directory owned by us that nobody else can write to. Raises
+    PermissionError otherwise, since anyone who can write there can plant
+    results for the workers to serve.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.geteuid():
+        raise PermissionError(f"{path} is not a directory owned by this user")
+    if info.st_mode & 0o077:
+        # makedirs leaves an existing directory's mode alone; tighten it, as its owner
+        os.chmod(path, 0o700)
+
+
+def _render_json(result: ColumnarResult) -> str:
+    return json.dumps({"columns": result.describe(), "rows": result.to_rows()}, default=str)
+
+
+# /results/{id}.<extension> -> (media type, renderer)
+RENDERERS = {
+    "csv": ("text/csv; charset=utf-8", ColumnarResult.to_csv),
+    "md": ("text/markdown; charset=utf-8", ColumnarResult.to_markdown),
+    "json": ("application/json", _render_json),
+}
+
+
+class CachedResult:
+    __slots__ = ("result_id", "result", "query", "created_at", "token", "owner", "bytes")
+
+    def __init__(self, result_id: str, result: ColumnarResult, query: Optional[str], created_at: float,
+                 token: str, owner: Optional[str] = None):
+        self.result_id = result_id
+        self.result = result
+        self.query = query
+        self.created_at = created_at
+        self.token = token  # only ever returned to the requester, never logged or traced
+        self.owner = owner
+        self.bytes = result.approx_bytes
+
+    def allows(self, token: Optional[str], user_id=None) -> bool:
+        """True for the token this result was issued with, from the user it was stored for"""
+        if not token or not hmac.compare_digest(str(token), self.token):
+            return False
+        return self.owner is None or (user_id is not None and str(user_id) == self.owner)
+
+
+class ResultCache:
+    """
+    LRU of results bounded by count and bytes, every entry expiring ttl
+    seconds after it was stored. Spill files are written atomically in the
+    pickle-free format of ColumnarResult.to_bytes() and swept once they
+    expire. A lookup with the wrong token or user counts as a miss.
+    """
+
+    def __init__(self, max_results: int = 100, max_bytes: int = 32 * 1024 * 1024, ttl: float = 600,
+                 spill_dir: Optional[str] = None, clock: Callable[[], float] = time.time):
+        self.max_results = max_results
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.clock = clock
+        self.results: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self.total_bytes = 0
+        self.last_sweep = clock()
+        self.stats = {'stored': 0, 'hits': 0, 'spill_hits': 0, 'misses': 0, 'denied': 0, 'expired': 0,
+                      'evicted': 0, 'spill_errors': 0}
+        self.lock = threading.Lock()
+        if spill_dir:
+            prepare_spill_dir(spill_dir)
+
+    def _path(self, result_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{result_id}.npz")
+
+    def _drop(self, result_id: str) -> Optional[CachedResult]:
+        entry = self.results.pop(result_id, None)
+        if entry is not None:
+            self.total_bytes -= entry.bytes
+        return entry
+
+    def put(self, result_id: str, result: ColumnarResult, query: Optional[str] = None, owner=None) -> CachedResult:
+        """Store result for owner; the returned entry's token is what get() will ask for"""
+        if not RESULT_ID.match(result_id):
+            raise ValueError(f"Invalid result id: {result_id!r}")
+        entry = CachedResult(result_id, result, query, self.clock(), secrets.token_urlsafe(24),
+                             None if owner is None else str(owner))
+        with self.lock:
+            self._drop(result_id)
+            self.results[result_id] = entry
+            self.total_bytes += entry.bytes
+            self.stats['stored'] += 1
+            while len(self.results) > 1 and (len(self.results) > self.max_results or self.total_bytes > self.max_bytes):
+                self._drop(next(iter(self.results)))
+                self.stats['evicted'] += 1
+        if self.spill_dir:
+            self._spill(entry)
+        if self.clock() - self.last_sweep > self.ttl / 2:
+            self.sweep()
+        return entry
+
+    def _spill(self, entry: CachedResult):
+        path = self._path(entry.result_id)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        try:
+            payload = entry.result.to_bytes(query=entry.query, created_at=entry.created_at, token=entry.token,
+                                            owner=entry.owner)
+            with os.fdopen(os.open(temporary, os.O_CREAT | os.O_TRUNC | os.O_WRONLY, 0o600), "wb") as handle:
+                handle.write(payload)
+            # The sweep expires files by mtime, so it follows the cache clock
+            os.utime(temporary, (entry.created_at, entry.created_at))
+            os.replace(temporary, path)
+        except OSError as e:
+            with self.lock:
+                self.stats['spill_errors'] += 1
+            logging.warning(f"Could not spill result {entry.result_id}: {e}")
+
+    def _load(self, result_id: str) -> Optional[CachedResult]:
+        try:
+            with open(self._path(result_id), "rb") as handle:
+                result, meta = ColumnarResult.from_bytes(handle.read())
+            return CachedResult(result_id, result, meta["query"], meta["created_at"], meta["token"], meta["owner"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def get(self, result_id: str, token: Optional[str], user_id=None) -> Optional[CachedResult]:
+        """
+        The cached result, from memory or this host's spill files, or None
+        once expired or if token and user_id are not the ones it was stored with
+        """
+        if not RESULT_ID.match(result_id):
+            return None
+        now = self.clock()
+        with self.lock:
+            entry = self.results.get(result_id)
+            if entry is not None and now - entry.created_at > self.ttl:
+                self._drop(result_id)
+                self.stats['expired'] += 1
+                entry = None
+            elif entry is not None:
+                if not entry.allows(token, user_id):
+                    self.stats['denied'] += 1
+                    return None
+                self.results.move_to_end(result_id)
+                self.stats['hits'] += 1
+                return entry
+        entry = self._load(result_id) if self.spill_dir else None
+        with self.lock:
+            if entry is None or now - entry.created_at > self.ttl:
+                self.stats['misses'] += 1
+                return None
+            if not entry.allows(token, user_id):
+                self.stats['denied'] += 1
+                return None
+            self.stats['spill_hits'] += 1
+        return entry
+
+    def sweep(self) -> int:
+        """Drop expired results from memory and the spill directory"""
+        now = self.clock()
+        self.last_sweep = now
+        with self.lock:
+            expired = [key for key, entry in self.results.items() if now - entry.created_at > self.ttl]
+            for key in expired:
+                self._drop(key)
+            self.stats['expired'] += len(expired)
+        removed = len(expired)
+        if self.spill_dir:
+            try:
+                names = os.listdir(self.spill_dir)
+            except OSError:
+                names = []
+            for name in names:
+                path = os.path.join(self.spill_dir, name)
+                try:
+                    if now - os.path.getmtime(path) > self.ttl:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+            stats['results'] = len(self.results)
+            stats['bytes'] = self.total_bytes
+        return stats
+
+
+def create_result_cache() -> ResultCache:
+    spill_dir = os.getenv("KETHA_RESULT_CACHE_DIR", OPTIMIZATION_CONFIG["result_cache_dir"])
+    try:
+        return ResultCache(
+            max_results=OPTIMIZATION_CONFIG["result_cache_size"],
+            max_bytes=OPTIMIZATION_CONFIG["result_cache_bytes"],
+            ttl=OPTIMIZATION_CONFIG["result_cache_ttl"],
+            spill_dir=spill_dir or None
+        )
+    except OSError as e:
+        logging.warning(f"Result spill directory unavailable, results are per worker: {e}")
+        return ResultCache(
+            max_results=OPTIMIZATION_CONFIG["result_cache_size"],
+            max_bytes=OPTIMIZATION_CONFIG["result_cache_bytes"],
+            ttl=OPTIMIZATION_CONFIG["result_cache_ttl"]
+        )
+
+
+# Global result cache instance
+result_cache = create_result_cache()
@@ -0,0 +1,155 @@
+"""
+Result Export for Ketha AI Agent
+Streams a stored query's full result as gzip CSV, Parquet or Arrow IPC.
+The SQL is re-run on a server-side cursor and each chunk of rows is encoded
+and sent before the next one is fetched, so an export's memory does not
+depend on how many rows it has.
+"""
+
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from columnar import ARROW_AVAILABLE, ColumnarResult
+
+if ARROW_AVAILABLE:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+
+class _ChunkSink:
+    """File-like target for pyarrow writers; take() hands over what was written since the last call"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def encode_csv_gzip(chunks: Iterable[ColumnarResult]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    header = True
+    for chunk in chunks:
+        text = chunk.to_csv(header=header)
+        header = False
+        compressed = compressor.compress(text.encode("utf-8"))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+# Parquet and Arrow streams fix their schema with the first chunk, so integer columns are
+# written as float64 there: a later chunk with values past int64 then still fits
+def encode_parquet(chunks: Iterable[ColumnarResult]) -> Iterator[bytes]:
+    """One row group per chunk; the footer is written when the chunks run out"""
+    sink, writer, schema = _ChunkSink(), None, None
+    for chunk in chunks:
+        table = chunk.to_arrow(schema, widen_integers=True)
+        if writer is None:
+            schema = table.schema
+            writer = pq.ParquetWriter(sink, schema, compression="snappy")
+        writer.write_table(table)
+        data = sink.take()
+        if data:
+            yield data
+    if writer is not None:
+        writer.close()
+        yield sink.take()
+
+
+def encode_arrow(chunks: Iterable[ColumnarResult]) -> Iterator[bytes]:
+    """Arrow IPC stream format, one record batch per chunk"""
+    sink, writer, schema = _ChunkSink(), None, None
+    for chunk in chunks:
+        table = chunk.to_arrow(schema, widen_integers=True)
+        if writer is None:
+            schema = table.schema
+            writer = pa.ipc.new_stream(sink, schema)
+        writer.write_table(table)
+        data = sink.take()
+        if data:
+            yield data
+    if writer is not None:
+        writer.close()
+        yield sink.take()
+
+
+# format -> (media type, file extension, encoder, needs pyarrow)
+EXPORT_FORMATS: Dict[str, Tuple[str, str, Callable[[Iterable[ColumnarResult]], Iterator[bytes]], bool]] = {
+    "csv": ("application/gzip", "csv.gz", encode_csv_gzip, False),
+    "parquet": ("application/vnd.apache.parquet", "parquet", encode_parquet, True),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows", encode_arrow, True),
+}
+
+
+def export_available(format_name: str) -> bool:
+    return format_name in EXPORT_FORMATS and (ARROW_AVAILABLE or not EXPORT_FORMATS[format_name][3])
+
+
+class ExportStats:
+    """Counts exports, and the rows and bytes they streamed"""
+
+    def __init__(self):
+        self.stats = {'started': 0, 'completed': 0, 'aborted': 0, 'rows': 0, 'bytes': 0, 'seconds': 0.0}
+        self.lock = threading.Lock()
+
+    def track(self, chunks: Iterable[ColumnarResult], format_name: str) -> Iterator[bytes]:
+        """Encode chunks in format_name, counting rows and bytes as they stream"""
+        encoder = EXPORT_FORMATS[format_name][2]
+        rows = [0]
+
+        def counted():
+            for chunk in chunks:
+                rows[0] += len(chunk)
+                yield chunk
+
+        with self.lock:
+            self.stats['started'] += 1
+        started, sent, completed = time.monotonic(), 0, False
+        try:
+            for data in encoder(counted()):
+                sent += len(data)
+                yield data
+            completed = True
+        finally:
+            # A disconnected client ends the export here: close the cursor now, not when collected
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+            with self.lock:
+                self.stats['completed' if completed else 'aborted'] += 1
+                self.stats['rows'] += rows[0]
+                self.stats['bytes'] += sent
+                self.stats['seconds'] += time.monotonic() - started
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+        stats['seconds'] = round(stats['seconds'], 3)
+        stats['formats'] = [name for name in EXPORT_FORMATS if export_available(name)]
+        return stats
+
+
+# Global export stats instance
+export_stats = ExportStats()
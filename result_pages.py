@@ -0,0 +1,312 @@
+"""
+Result Pages for Ketha AI Agent
+Pages through DB answers that have more rows than a /query response holds.
+The response carries the first page and a continuation token; later pages
+come from GET /query/{result_id}/rows?cursor=. The first request for a later
+page re-runs the result's SQL on a server-side cursor and spills its rows,
+one page per frame, to a file shared by the workers on the host. Every page
+is read from that file as soon as its frame is written, so no request waits
+for the whole result and no worker holds more than a page or two of it.
+
+Page 0 comes from the agent's own run of the SQL and later pages from that
+second execution. Unless the SQL has an ORDER BY over a unique key, the
+database may return rows in another order the second time, so rows of page 0
+can repeat on later pages or be missing from them. Later pages are
+consistent with each other, since they all come from the same spill.
+"""
+
+import base64
+import binascii
+import logging
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from columnar import ColumnarResult
+from dashboard_config import OPTIMIZATION_CONFIG, PERFORMANCE_CONFIG
+from result_cache import prepare_spill_dir
+
+RESULT_ID = re.compile(r"^[0-9a-f]{8,64}$")
+
+# Frame header: payload length (-1 marks a failed spill) and flags
+_HEADER = struct.Struct(">qB")
+_LAST = 1
+_TOO_LARGE = 2  # on a failed frame: the result will never fit, so it is not spilled again
+_FAILED = -1
+
+
+class PageUnavailable(Exception):
+    """A page could not be produced: the spill failed, stalled, is still too far behind or could not start yet"""
+
+
+class ResultTooLarge(PageUnavailable):
+    """The result is larger than max_bytes; only an export can deliver it"""
+
+
+def encode_cursor(result_id: str, page: int) -> str:
+    """Opaque continuation token for page (0 is the page in the /query response)"""
+    return base64.urlsafe_b64encode(f"{result_id}:{page}".encode("ascii")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[str, int]:
+    """(result_id, page) from a continuation token, raising ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("ascii")
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Malformed cursor")
+    result_id, _, page = raw.partition(":")
+    if not RESULT_ID.match(result_id) or not page.isdigit() or int(page) < 1:
+        raise ValueError("Malformed cursor")
+    return result_id, int(page)
+
+
+def _lookahead(chunks: Iterable[ColumnarResult]) -> Iterator[Tuple[ColumnarResult, bool]]:
+    """(chunk, is_last) pairs, holding one chunk back to know which is last"""
+    iterator = iter(chunks)
+    previous = next(iterator, None)
+    while previous is not None:
+        current = next(iterator, None)
+        yield previous, current is None
+        previous = current
+
+
+class ResultPager:
+    """
+    Spills results to page files of page_rows-row frames and reads pages back.
+    One worker claims a result's file (O_EXCL) and fills it from a background
+    thread; readers on any worker wait up to wait_timeout for their frame.
+    Each worker runs at most max_writers spills at once. A file whose spill
+    failed, or that stops growing for stall_timeout before its last frame,
+    is abandoned, and the next request starts a fresh spill; only a result
+    too large to page stays failed until it is swept. An empty result still
+    gets one empty last frame. Frames are ColumnarResult.to_bytes()
+    archives (no pickle) that record the owner of the result, and a page is
+    only returned to that owner.
+    """
+
+    def __init__(self, spill_dir: str, stream: Optional[Callable[..., Iterable[ColumnarResult]]] = None,
+                 page_rows: int = 1000, max_bytes: int = 512 * 1024 * 1024, ttl: float = 600,
+                 wait_timeout: float = 30, stall_timeout: float = 60, poll_interval: float = 0.05,
+                 max_writers: int = 4, clock: Callable[[], float] = time.time):
+        self.spill_dir = spill_dir
+        self.stream = stream
+        self.page_rows = page_rows
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.stall_timeout = stall_timeout
+        self.poll_interval = poll_interval
+        self.max_writers = max_writers
+        self.clock = clock
+        self.last_sweep = clock()
+        self.writers: Dict[str, threading.Thread] = {}
+        self.stats = {'spills': 0, 'completed': 0, 'failed': 0, 'abandoned': 0, 'throttled': 0, 'denied': 0,
+                      'pages': 0, 'rows': 0, 'bytes': 0, 'waits': 0, 'wait_seconds': 0.0}
+        self.lock = threading.Lock()
+        prepare_spill_dir(spill_dir)
+
+    def _path(self, result_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{result_id}.pages")
+
+    def _claim(self, result_id: str, query: str, owner: Optional[str]) -> bool:
+        """
+        Start spilling result_id unless some worker already has; True if
+        this call started it. Raises PageUnavailable when this worker is
+        already running max_writers spills.
+        """
+        path = self._path(result_id)
+        with self.lock:
+            if os.path.exists(path):
+                return False
+            if len(self.writers) >= self.max_writers:
+                self.stats['throttled'] += 1
+                raise PageUnavailable("Too many results are being paged; retry shortly")
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+            except FileExistsError:
+                return False
+            writer = threading.Thread(target=self._spill, args=(result_id, query, owner, fd),
+                                      name=f"result-spill-{result_id[:8]}", daemon=True)
+            self.stats['spills'] += 1
+            self.writers[result_id] = writer
+        writer.start()
+        if self.clock() - self.last_sweep > self.ttl / 2:
+            self.sweep()
+        return True
+
+    def _spill(self, result_id: str, query: str, owner: Optional[str], fd: int):
+        written, completed = 0, False
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                try:
+                    stream = self.stream
+                    if stream is None:
+                        from database import stream_query as stream
+                    chunks = stream(query, self.page_rows)
+                    frames = 0
+                    try:
+                        for chunk, last in _lookahead(chunks):
+                            payload = chunk.to_bytes(owner=owner)
+                            if written + len(payload) > self.max_bytes:
+                                raise ResultTooLarge("Result is too large to page; export it instead")
+                            handle.write(_HEADER.pack(len(payload), _LAST if last else 0))
+                            handle.write(payload)
+                            # Readers in other workers see each frame as soon as it is flushed
+                            handle.flush()
+                            written += _HEADER.size + len(payload)
+                            frames += 1
+                            with self.lock:
+                                self.stats['rows'] += len(chunk)
+                                self.stats['bytes'] += _HEADER.size + len(payload)
+                    finally:
+                        close = getattr(chunks, "close", None)
+                        if close is not None:
+                            close()
+                    if not frames:
+                        # Readers would otherwise wait on an empty file until it counts as stalled
+                        payload = ColumnarResult.empty().to_bytes(owner=owner)
+                        handle.write(_HEADER.pack(len(payload), _LAST))
+                        handle.write(payload)
+                        handle.flush()
+                    completed = True
+                except Exception as e:
+                    # The reason stays in the log; readers only learn whether a retry can help
+                    logging.warning(f"Could not spill result {result_id}: {e}")
+                    handle.write(_HEADER.pack(_FAILED, _TOO_LARGE if isinstance(e, ResultTooLarge) else 0))
+                    handle.flush()
+        except OSError as e:
+            logging.warning(f"Could not write spill file for result {result_id}: {e}")
+        finally:
+            with self.lock:
+                self.stats['completed' if completed else 'failed'] += 1
+                self.writers.pop(result_id, None)
+
+    def _abandon(self, result_id: str, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        with self.lock:
+            self.stats['abandoned'] += 1
+
+    def read_page(self, result_id: str, query: str, page: int,
+                  owner=None) -> Tuple[Optional[ColumnarResult], bool]:
+        """
+        (rows, is_last) for page of result_id, spilling it first if needed;
+        (None, True) once page is past the end of the result. Raises
+        PermissionError if the spill was made for another owner.
+        """
+        if not RESULT_ID.match(result_id):
+            raise ValueError(f"Invalid result id: {result_id!r}")
+        owner = None if owner is None else str(owner)
+        path = self._path(result_id)
+        self._claim(result_id, query, owner)
+        started = time.monotonic()
+        waited = False
+        try:
+            while True:
+                try:
+                    handle = open(path, "rb")
+                except FileNotFoundError:
+                    # Abandoned by a stalled writer since we looked; spill it again
+                    self._claim(result_id, query, owner)
+                    continue
+                with handle:
+                    frame, position = 0, 0
+                    while True:
+                        size = os.fstat(handle.fileno()).st_size
+                        header = handle.read(_HEADER.size) if size - position >= _HEADER.size else b""
+                        length, flags = _HEADER.unpack(header) if header else (None, 0)
+                        if length == _FAILED:
+                            if flags & _TOO_LARGE:
+                                raise ResultTooLarge("Result is too large to page; export it instead")
+                            # Let the next request spill it again rather than fail until the sweep
+                            self._abandon(result_id, path)
+                            raise PageUnavailable("Could not fetch this page; retry shortly")
+                        if length is not None and size - position - _HEADER.size >= length:
+                            if frame == page:
+                                try:
+                                    rows, meta = ColumnarResult.from_bytes(handle.read(length))
+                                except ValueError as e:
+                                    raise PageUnavailable(f"Page file is damaged: {e}")
+                                if meta.get("owner") != owner:
+                                    with self.lock:
+                                        self.stats['denied'] += 1
+                                    raise PermissionError(f"Result {result_id} belongs to another user")
+                                with self.lock:
+                                    self.stats['pages'] += 1
+                                return rows, bool(flags & _LAST)
+                            if flags & _LAST:
+                                return None, True
+                            handle.seek(length, os.SEEK_CUR)
+                            position += _HEADER.size + length
+                            frame += 1
+                            continue
+                        # The frame we need is not fully written yet
+                        if time.monotonic() - started > self.wait_timeout:
+                            raise PageUnavailable("Page is still being fetched; retry shortly")
+                        if self.clock() - os.path.getmtime(path) > self.stall_timeout:
+                            logging.warning(f"Spill of result {result_id} stalled; starting it again")
+                            self._abandon(result_id, path)
+                            break
+                        waited = True
+                        time.sleep(self.poll_interval)
+                        handle.seek(position)
+        finally:
+            if waited:
+                with self.lock:
+                    self.stats['waits'] += 1
+                    self.stats['wait_seconds'] += time.monotonic() - started
+
+    def sweep(self) -> int:
+        """Remove page files older than ttl"""
+        now = self.clock()
+        self.last_sweep = now
+        removed = 0
+        try:
+            names = os.listdir(self.spill_dir)
+        except OSError:
+            return 0
+        for name in names:
+            path = os.path.join(self.spill_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+            stats['spilling'] = len(self.writers)
+        stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+        stats['page_rows'] = self.page_rows
+        return stats
+
+
+def create_result_pager() -> ResultPager:
+    spill_dir = os.getenv("KETHA_RESULT_PAGE_DIR", OPTIMIZATION_CONFIG["result_page_dir"])
+    settings = dict(
+        page_rows=PERFORMANCE_CONFIG["result_page_rows"],
+        max_bytes=OPTIMIZATION_CONFIG["result_page_bytes"],
+        ttl=OPTIMIZATION_CONFIG["result_cache_ttl"],
+        wait_timeout=PERFORMANCE_CONFIG["statement_timeout"],
+        stall_timeout=PERFORMANCE_CONFIG["statement_timeout"] * 2,
+        max_writers=OPTIMIZATION_CONFIG["result_page_writers"]
+    )
+    try:
+        return ResultPager(spill_dir, **settings)
+    except OSError as e:
+        # Each worker then spills the results it is asked to page on its own
+        logging.warning(f"Result page directory unavailable, pages are per worker: {e}")
+        return ResultPager(tempfile.mkdtemp(prefix="ketha-pages-"), **settings)
+
+
+# Global result pager instance
+result_pager = create_result_pager()
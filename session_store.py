@@ -0,0 +1,511 @@
+"""
+Session Store for Ketha AI Agent
+Conversation history per user, bounded by users, turns and bytes: least
+recently used sessions are evicted first, idle sessions expire after a TTL,
+and a background janitor sweeps expired sessions between requests. An
+optional durable tier (SQLite) sits behind the in-memory front, so history
+survives restarts and follows a user across workers.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from dashboard_config import OPTIMIZATION_CONFIG
+
+TRUNCATION_MARKER = " ... [truncated]"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id TEXT PRIMARY KEY,
+    history TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access);
+"""
+
+
+def entry_bytes(entry: Dict[str, Any]) -> int:
+    """Approximate memory held by one history turn: the dict and its strings"""
+    size = sys.getsizeof(entry)
+    for key, value in entry.items():
+        size += sys.getsizeof(key) + sys.getsizeof(value)
+    return size
+
+
+class Session:
+    __slots__ = ("entries", "bytes", "last_access", "updated_at")
+
+    def __init__(self, now: float, entries: Optional[List[Dict[str, Any]]] = None, updated_at: float = 0.0):
+        self.entries: List[Dict[str, Any]] = entries or []
+        self.bytes = sum(entry_bytes(entry) for entry in self.entries)
+        self.last_access = now
+        self.updated_at = updated_at  # when the history last changed, in any worker
+
+
+class SQLiteSessionBackend:
+    """
+    Durable tier in a local SQLite database in WAL mode, shared by every
+    worker on the host. Each thread gets its own connection; reads are single
+    primary-key lookups, writes arrive in batches from the write-behind thread.
+    """
+
+    shared = True  # other processes may write, so cached sessions are revalidated
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        # Open it now so a bad path fails here, where the store falls back to memory-only
+        self._connection()
+
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use (and again after fork)"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or getattr(self._local, "pid", None) != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def version(self, user_id: str) -> Optional[float]:
+        """updated_at of the stored session, or None if there is none"""
+        row = self._connection().execute(
+            "SELECT updated_at FROM sessions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def load(self, user_id: str, since: float) -> Optional[Tuple[List[Dict[str, Any]], float]]:
+        """(history, updated_at) if the session was used after `since`"""
+        row = self._connection().execute(
+            "SELECT history, updated_at FROM sessions WHERE user_id = ? AND last_access >= ?", (user_id, since)
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def save_many(self, sessions: Iterable[Tuple[str, List[Dict[str, Any]], float, float]]):
+        """Upsert (user_id, history, updated_at, last_access) rows in one transaction"""
+        with self._connection() as connection:
+            connection.executemany(
+                """INSERT INTO sessions (user_id, history, updated_at, last_access) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (user_id) DO UPDATE SET history = excluded.history,
+                   updated_at = excluded.updated_at, last_access = MAX(last_access, excluded.last_access)
+                   WHERE excluded.updated_at >= sessions.updated_at""",
+                [(user_id, json.dumps(history), updated_at, last_access)
+                 for user_id, history, updated_at, last_access in sessions]
+            )
+
+    def delete_many(self, user_ids: Iterable[str]):
+        with self._connection() as connection:
+            connection.executemany("DELETE FROM sessions WHERE user_id = ?", [(user_id,) for user_id in user_ids])
+
+    def expire(self, before: float) -> int:
+        with self._connection() as connection:
+            return connection.execute("DELETE FROM sessions WHERE last_access < ?", (before,)).rowcount
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+def create_session_backend(kind: str, path: str) -> Optional[SQLiteSessionBackend]:
+    """The durable tier named by session_backend: "sqlite", or "memory" for none"""
+    if kind == "memory":
+        return None
+    if kind == "sqlite":
+        return SQLiteSessionBackend(path)
+    raise ValueError(f"Unknown session backend {kind!r}; expected 'sqlite' or 'memory'")
+
+
+class SessionStripe:
+    """
+    One partition of the in-memory front, with its own lock. `sessions` is
+    an OrderedDict kept in last-access order, so the least recently used
+    session is always at the front: a lookup moves the user to the end, and
+    LRU eviction and TTL expiry pop from the front, all in amortised O(1).
+    """
+
+    def __init__(self):
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.bytes = 0
+        self.peak_bytes = 0
+        self.evictions = {'lru': 0, 'ttl': 0, 'bytes': 0}
+        self.trimmed_turns = 0
+        self.clipped_turns = 0
+        self.hits = 0
+        self.loads = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def remove(self, user_id: str) -> Optional[Session]:
+        session = self.sessions.pop(user_id, None)
+        if session is not None:
+            self.bytes -= session.bytes
+        return session
+
+    def drop(self, user_id: str, reason: str):
+        self.remove(user_id)
+        self.evictions[reason] += 1
+
+    def expire(self, cutoff: float) -> int:
+        expired = 0
+        while self.sessions:
+            user_id, session = next(iter(self.sessions.items()))
+            if session.last_access >= cutoff:
+                break
+            self.drop(user_id, "ttl")
+            expired += 1
+        return expired
+
+
+class SessionStore:
+    """
+    Users are spread over `stripes` partitions by a hash of their id, so
+    requests for different users rarely wait on the same lock. Each stripe
+    keeps an equal share of max_users and max_total_bytes; each session
+    keeps at most max_history turns and max_user_bytes. A turn too large for
+    the per-user budget on its own is clipped rather than dropped.
+
+    With a backend, memory is a cache in front of the durable tier: misses
+    read through, and changes are queued and written behind in batches every
+    write_interval seconds (coalesced per user). Evicting a session from
+    memory keeps its durable copy; expiry after idle_ttl removes both. A
+    cached session is checked against the backend's version on each lookup,
+    so a user moving between workers sees their latest history once the
+    other worker has flushed.
+    """
+
+    def __init__(self, max_users: int = 100, max_history: int = 10, idle_ttl: float = 1800,
+                 max_user_bytes: int = 64 * 1024, max_total_bytes: int = 16 * 1024 * 1024,
+                 cleanup_interval: float = 3600, stripes: int = 1, backend=None,
+                 write_interval: float = 0.5, clock: Callable[[], float] = time.time):
+        self.max_users = max_users
+        self.max_history = max_history
+        self.idle_ttl = idle_ttl
+        self.max_user_bytes = max_user_bytes
+        self.max_total_bytes = max_total_bytes
+        self.cleanup_interval = cleanup_interval
+        self.stripes = [SessionStripe() for _ in range(max(stripes, 1))]
+        self.stripe_users = max(max_users // len(self.stripes), 1)
+        self.stripe_bytes = max_total_bytes // len(self.stripes)
+        self.backend = backend
+        self.write_interval = write_interval
+        self.clock = clock
+        # user_id -> (history copy, updated_at, last_access), or None for a delete; latest change wins
+        self.pending: Dict[str, Optional[Tuple[List[Dict[str, Any]], float, float]]] = {}
+        self.pending_lock = threading.Lock()
+        self.written = 0
+        self.write_errors = 0
+        self.wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._writer = None
+
+    def __len__(self) -> int:
+        return sum(len(stripe.sessions) for stripe in self.stripes)
+
+    @property
+    def store(self) -> Dict[str, Session]:
+        """Sessions held in memory; in LRU order when there is a single stripe"""
+        if len(self.stripes) == 1:
+            return self.stripes[0].sessions
+        return {user_id: session for stripe in self.stripes for user_id, session in list(stripe.sessions.items())}
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(stripe.bytes for stripe in self.stripes)
+
+    @property
+    def evictions(self) -> Dict[str, int]:
+        return {reason: sum(stripe.evictions[reason] for stripe in self.stripes) for reason in ('lru', 'ttl', 'bytes')}
+
+    @property
+    def trimmed_turns(self) -> int:
+        return sum(stripe.trimmed_turns for stripe in self.stripes)
+
+    @property
+    def clipped_turns(self) -> int:
+        return sum(stripe.clipped_turns for stripe in self.stripes)
+
+    def _stripe(self, user_id) -> SessionStripe:
+        # crc32 rather than hash(): stable across processes and PYTHONHASHSEED
+        return self.stripes[zlib.crc32(str(user_id).encode("utf-8")) % len(self.stripes)]
+
+    def _load(self, user_id: str, now: float) -> Optional[Session]:
+        if self.backend is None:
+            return None
+        try:
+            loaded = self.backend.load(str(user_id), now - self.idle_ttl)
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(f"Could not load session for {user_id}: {e}")
+            return None
+        return Session(now, *loaded) if loaded else None
+
+    def _stored_version(self, user_id) -> Optional[float]:
+        """
+        The durable copy's updated_at if another worker may have written it.
+        Read before the stripe lock is taken, so the lookup never holds it.
+        """
+        if self.backend is None or not self.backend.shared:
+            return None
+        with self.pending_lock:
+            if str(user_id) in self.pending:
+                return None  # our own change has not been flushed yet and is the newest
+        try:
+            return self.backend.version(str(user_id))
+        except (sqlite3.Error, OSError):
+            return None
+
+    def _touch(self, stripe: SessionStripe, user_id, now: float, version: Optional[float] = None) -> Session:
+        session = stripe.sessions.get(user_id)
+        if session is not None and session.last_access < now - self.idle_ttl:
+            stripe.drop(user_id, "ttl")
+            session = None
+        if session is not None and version is not None and version > session.updated_at:
+            # Another worker has written a newer history for this user
+            stripe.remove(user_id)
+            session = None
+        if session is None:
+            session = self._load(user_id, now)
+            if session is None:
+                stripe.misses += 1
+                session = Session(now)
+            else:
+                stripe.loads += 1
+            while len(stripe.sessions) >= self.stripe_users:
+                stripe.drop(next(iter(stripe.sessions)), "lru")
+            stripe.sessions[user_id] = session
+            stripe.bytes += session.bytes
+        else:
+            stripe.hits += 1
+            stripe.sessions.move_to_end(user_id)
+        session.last_access = now
+        return session
+
+    def _clip(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Shorten the longest strings of a turn until it fits the per-user budget"""
+        clipped = dict(entry)
+        while entry_bytes(clipped) > self.max_user_bytes:
+            key = max((k for k, v in clipped.items() if isinstance(v, str)), key=lambda k: len(clipped[k]), default=None)
+            if key is None or len(clipped[key]) <= len(TRUNCATION_MARKER):
+                break
+            excess = entry_bytes(clipped) - self.max_user_bytes
+            keep = max(len(clipped[key]) - excess - len(TRUNCATION_MARKER) * 4, 0)
+            clipped[key] = clipped[key][:keep] + TRUNCATION_MARKER
+        return clipped
+
+    def _queue(self, user_id, change):
+        if self.backend is None:
+            return
+        with self.pending_lock:
+            self.pending[str(user_id)] = change
+
+    def get_session(self, user_id) -> List[Dict[str, Any]]:
+        """
+        The user's history, oldest turn first. Treat it as read-only. With a
+        backend this may read SQLite; async callers run it in a thread.
+        """
+        version = self._stored_version(user_id)
+        stripe = self._stripe(user_id)
+        with stripe.lock:
+            return self._touch(stripe, user_id, self.clock(), version).entries
+
+    def add_to_session(self, user_id, entry: Dict[str, Any]):
+        """Append a turn, trimming the oldest turns past the turn and byte budgets"""
+        size = entry_bytes(entry)
+        clipped = size > self.max_user_bytes
+        if clipped:
+            entry = self._clip(entry)
+            size = entry_bytes(entry)
+        version = self._stored_version(user_id)
+        stripe = self._stripe(user_id)
+        now = self.clock()
+        with stripe.lock:
+            stripe.clipped_turns += 1 if clipped else 0
+            session = self._touch(stripe, user_id, now, version)
+            session.entries.append(entry)
+            session.bytes += size
+            stripe.bytes += size
+            while len(session.entries) > self.max_history or (session.bytes > self.max_user_bytes and len(session.entries) > 1):
+                removed = entry_bytes(session.entries.pop(0))
+                session.bytes -= removed
+                stripe.bytes -= removed
+                stripe.trimmed_turns += 1
+            session.updated_at = max(now, session.updated_at + 1e-6)
+            self._queue(user_id, (list(session.entries), session.updated_at, now))
+            # Over the byte budget: evict whole sessions, least recently used first
+            while stripe.bytes > self.stripe_bytes and len(stripe.sessions) > 1:
+                stripe.drop(next(iter(stripe.sessions)), "bytes")
+            stripe.peak_bytes = max(stripe.peak_bytes, stripe.bytes)
+
+    def clear_session(self, user_id):
+        stripe = self._stripe(user_id)
+        with stripe.lock:
+            session = stripe.remove(user_id)
+            # An empty history with a newer version rather than a delete: other workers see the
+            # newer version and drop their copy, and older writes of the old turns are refused
+            updated_at = max(self.clock(), session.updated_at + 1e-6 if session is not None else 0.0)
+            self._queue(user_id, ([], updated_at, updated_at))
+
+    def cleanup(self) -> int:
+        """Drop every session idle for longer than idle_ttl; returns how many were held in memory"""
+        cutoff = self.clock() - self.idle_ttl
+        expired = 0
+        for stripe in self.stripes:
+            with stripe.lock:
+                expired += stripe.expire(cutoff)
+        if self.backend is not None:
+            try:
+                self.backend.expire(cutoff)
+            except (sqlite3.Error, OSError) as e:
+                logging.warning(f"Could not expire durable sessions: {e}")
+        return expired
+
+    def flush(self) -> int:
+        """Write queued changes to the backend in one batch; returns how many"""
+        if self.backend is None:
+            return 0
+        with self.pending_lock:
+            batch, self.pending = self.pending, {}
+        if not batch:
+            return 0
+        saves = [(user_id, *change) for user_id, change in batch.items() if change is not None]
+        deletes = [user_id for user_id, change in batch.items() if change is None]
+        try:
+            if saves:
+                self.backend.save_many(saves)
+            if deletes:
+                self.backend.delete_many(deletes)
+        except (sqlite3.Error, OSError) as e:
+            self.write_errors += 1
+            logging.warning(f"Could not write {len(batch)} sessions: {e}")
+            with self.pending_lock:
+                for user_id, change in batch.items():
+                    self.pending.setdefault(user_id, change)  # keep anything newer queued since
+            return 0
+        self.written += len(batch)
+        return len(batch)
+
+    def start(self, interval: float = None):
+        """Run cleanup() every interval seconds, and the write-behind thread if there is a backend"""
+        if self._thread is not None:
+            return self._thread
+        self.cleanup_interval = interval or self.cleanup_interval
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.cleanup_interval):
+                try:
+                    expired = self.cleanup()
+                    if expired:
+                        logging.info(f"Session janitor expired {expired} idle sessions")
+                except Exception as e:
+                    logging.warning(f"Session cleanup failed: {e}")
+
+        def write_behind():
+            while not self._stop.is_set():
+                self.wake.wait(self.write_interval)
+                self.wake.clear()
+                try:
+                    self.flush()
+                except Exception as e:
+                    logging.warning(f"Session write-behind failed: {e}")
+
+        self._thread = threading.Thread(target=run, name="session-janitor", daemon=True)
+        self._thread.start()
+        if self.backend is not None:
+            self._writer = threading.Thread(target=write_behind, name="session-writer", daemon=True)
+            self._writer.start()
+        return self._thread
+
+    def stop(self):
+        """Stop the background threads and write out anything still queued"""
+        self._stop.set()
+        self.wake.set()
+        for thread in (self._thread, self._writer):
+            if thread is not None:
+                thread.join(timeout=2)
+        self._thread = None
+        self._writer = None
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        totals = {'hits': 0, 'loads': 0, 'misses': 0, 'trimmed_turns': 0, 'clipped_turns': 0, 'peak_bytes': 0}
+        evictions = {'lru': 0, 'ttl': 0, 'bytes': 0}
+        sessions = turns = total_bytes = 0
+        for stripe in self.stripes:
+            with stripe.lock:
+                sessions += len(stripe.sessions)
+                turns += sum(len(session.entries) for session in stripe.sessions.values())
+                total_bytes += stripe.bytes
+                for key in totals:
+                    totals[key] += getattr(stripe, key)
+                for reason, count in stripe.evictions.items():
+                    evictions[reason] += count
+        lookups = totals['hits'] + totals['loads'] + totals['misses']
+        stats = {
+            'sessions': sessions,
+            'max_sessions': self.max_users,
+            'bytes': total_bytes,
+            'peak_bytes': totals['peak_bytes'],
+            'max_bytes': self.max_total_bytes,
+            'turns': turns,
+            'stripes': len(self.stripes),
+            'evictions': evictions,
+            'trimmed_turns': totals['trimmed_turns'],
+            'clipped_turns': totals['clipped_turns'],
+            'hit_rate': round(totals['hits'] / lookups * 100, 2) if lookups else 0.0
+        }
+        if self.backend is not None:
+            stats['durable'] = {
+                'backend': type(self.backend).__name__,
+                'loaded': totals['loads'],
+                'pending_writes': len(self.pending),
+                'written': self.written,
+                'write_errors': self.write_errors
+            }
+        return stats
+
+
+def create_session_store() -> SessionStore:
+    """A store configured from OPTIMIZATION_CONFIG; the durable tier is opened if it can be"""
+    backend = None
+    try:
+        backend = create_session_backend(
+            OPTIMIZATION_CONFIG["session_backend"],
+            os.getenv("KETHA_SESSION_DB", OPTIMIZATION_CONFIG["session_store_path"])
+        )
+    except (sqlite3.Error, OSError) as e:
+        logging.warning(f"Durable session store unavailable, sessions are memory-only: {e}")
+    return SessionStore(
+        max_users=OPTIMIZATION_CONFIG["session_max_users"],
+        max_history=OPTIMIZATION_CONFIG["session_max_history"],
+        idle_ttl=OPTIMIZATION_CONFIG["session_idle_ttl"],
+        max_user_bytes=OPTIMIZATION_CONFIG["session_max_user_bytes"],
+        max_total_bytes=OPTIMIZATION_CONFIG["session_max_total_bytes"],
+        cleanup_interval=OPTIMIZATION_CONFIG["session_cleanup_interval"],
+        stripes=OPTIMIZATION_CONFIG["session_lock_stripes"],
+        backend=backend,
+        write_interval=OPTIMIZATION_CONFIG["session_write_interval"]
+    )
+
+
+# Global session store instance
+session_store = create_session_store()
@@ -0,0 +1,356 @@
+"""
+Shared Metrics for Ketha AI Agent
+Fleet-wide counters, gauges, latency histograms and a unique-user sketch in
+a memory-mapped file of fixed layout. Each worker process owns one slot and
+is its only writer, so the request path takes no cross-process lock and
+does no IPC; readers aggregate every slot at read time.
+"""
+
+import fcntl
+import logging
+import math
+import mmap
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from dashboard_config import PERFORMANCE_CONFIG
+from histograms import LogHistogram
+from sketches import HyperLogLog
+
+MAGIC = b"KETHAMET"
+VERSION = 1
+
+# Cumulative per slot; a recycled worker's counts stay in its slot for its successor to add to
+COUNTERS = ("queries", "db_queries", "bedrock_queries", "errors")
+QUERIES, DB_QUERIES, BEDROCK_QUERIES, ERRORS_COUNTER = range(len(COUNTERS))
+# Current per worker, combined over live workers only
+GAUGES = {"sessions": "sum", "active_users": "sum", "peak_concurrent": "max",
+          "rss_mb": "sum", "peak_memory_mb": "max"}
+HISTOGRAMS = ("route", "database", "bedrock")
+
+# Histograms keep the last hour in a ring of five-minute windows, each one a
+# LogHistogram's buckets laid out densely between MIN_LATENCY and MAX_LATENCY
+RELATIVE_ERROR = 0.02
+MIN_LATENCY = 1e-4
+MAX_LATENCY = 3600.0
+WINDOW_SECONDS = 300
+WINDOWS = 12
+_reference = LogHistogram(RELATIVE_ERROR, MIN_LATENCY)
+FIRST_BUCKET = _reference.bucket_index(MIN_LATENCY)
+BUCKETS = _reference.bucket_index(MAX_LATENCY) - FIRST_BUCKET + 1
+EPOCH, COUNT, SUM, ERRORS, MIN, MAX = range(6)  # fields ahead of the buckets in each window
+WINDOW_FIELDS = 6
+
+HLL_PRECISION = 12
+
+SLOT_DTYPE = np.dtype([
+    ('pid', np.int64),
+    ('claimed_at', np.float64),
+    ('counters', np.float64, (len(COUNTERS),)),
+    ('gauges', np.float64, (len(GAUGES),)),
+    ('histograms', np.float64, (len(HISTOGRAMS), WINDOWS, WINDOW_FIELDS + BUCKETS)),
+    ('users', np.uint8, (1 << HLL_PRECISION,)),
+])
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'), ('version', np.int64), ('slot_bytes', np.int64),
+    ('slots', np.int64), ('created_at', np.float64),
+])
+HEADER_BYTES = 64
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+class SharedMetrics:
+    """
+    Slots are claimed once per process: at first use, and again in a forked
+    child (os.register_at_fork), taking a free slot or one whose worker has
+    exited. Claiming takes a file lock; recording takes only this process's
+    own lock, which guards against its threads, not other workers. Without a
+    file (tests, a single uvicorn process) the map is anonymous and private.
+    """
+
+    def __init__(self, path: Optional[str] = None, slots: int = 16):
+        self.path = path
+        self.slot_count = slots
+        self.lock = threading.Lock()
+        self._gauge_readers: Dict[str, Callable[[], float]] = {}
+        self._map = None
+        self._fd = None
+        self._slot = None
+        self._users = None
+        self._pid = None
+        self._thread = None
+        self._stop = threading.Event()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self.lock = threading.Lock()
+        self._slot = None
+        self._users = None
+        self._pid = None
+        self._thread = None
+        if self._map is not None and self.path is None:
+            self._map = None  # an anonymous map is private to the parent
+
+    def open(self, path: Optional[str] = None, slots: Optional[int] = None):
+        """Map the metrics file at path, creating or resetting it if its layout differs"""
+        self.close()
+        self.path = path if path is not None else self.path
+        self.slot_count = slots or self.slot_count
+        size = HEADER_BYTES + SLOT_DTYPE.itemsize * self.slot_count
+        if self.path is None:
+            self._map = mmap.mmap(-1, size)
+            self._init_header()
+            return self
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            current = os.fstat(self._fd).st_size
+            if current >= HEADER_BYTES:
+                header = np.frombuffer(os.pread(self._fd, HEADER_DTYPE.itemsize, 0), dtype=HEADER_DTYPE)[0]
+                if header['magic'] == MAGIC and header['version'] == VERSION \
+                        and header['slot_bytes'] == SLOT_DTYPE.itemsize:
+                    self.slot_count = int(header['slots'])
+                    size = HEADER_BYTES + SLOT_DTYPE.itemsize * self.slot_count
+                else:
+                    logging.warning(f"Resetting shared metrics file {self.path}: layout changed")
+                    current = 0
+            if current < size:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)  # sparse: untouched slots cost nothing
+            self._map = mmap.mmap(self._fd, size)
+            if current < size:
+                self._init_header()
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        return self
+
+    def _init_header(self):
+        header = self.header
+        header['magic'] = MAGIC
+        header['version'] = VERSION
+        header['slot_bytes'] = SLOT_DTYPE.itemsize
+        header['slots'] = self.slot_count
+        header['created_at'] = time.time()
+
+    @property
+    def header(self) -> np.ndarray:
+        return np.ndarray((), dtype=HEADER_DTYPE, buffer=self._map)
+
+    @property
+    def slots(self) -> np.ndarray:
+        if self._map is None:
+            self.open()
+        return np.ndarray((self.slot_count,), dtype=SLOT_DTYPE, buffer=self._map, offset=HEADER_BYTES)
+
+    def close(self):
+        self._slot = None
+        self._users = None
+        self._pid = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # a reader still holds a view; the map closes when it is released
+        self._map = None
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = None
+
+    def _claim(self):
+        """Take a free slot, or the oldest one whose worker has exited"""
+        slots = self.slots
+        if self._fd is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            free = [i for i in range(self.slot_count) if slots[i]['pid'] == 0]
+            if not free:
+                free = sorted((i for i in range(self.slot_count) if not _pid_alive(int(slots[i]['pid']))),
+                              key=lambda i: slots[i]['claimed_at'])
+            if not free:
+                logging.warning("No free shared metrics slot; this worker's metrics stay private")
+                self.path = None
+                self.open()
+                return self._claim()
+            slot = slots[free[0]]
+            slot['gauges'] = 0.0
+            slot['claimed_at'] = time.time()
+            slot['pid'] = os.getpid()
+        finally:
+            if self._fd is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        self._slot = slot
+        self._users = HyperLogLog(HLL_PRECISION)
+        self._users.registers = slot['users']  # writes go straight to the shared registers
+        self._pid = os.getpid()
+
+    def _own_slot(self):
+        if self._slot is None:
+            self._claim()
+        return self._slot
+
+    def _record_latency(self, slot, histogram: int, seconds: float, success: bool, now: float):
+        epoch = int(now // WINDOW_SECONDS)
+        window = slot['histograms'][histogram, epoch % WINDOWS]
+        if window[EPOCH] != epoch or window[COUNT] == 0:
+            window[:] = 0.0
+            window[EPOCH] = epoch
+            window[MIN] = window[MAX] = seconds
+        index = min(max(_reference.bucket_index(seconds) - FIRST_BUCKET, 0), BUCKETS - 1)
+        window[WINDOW_FIELDS + index] += 1
+        window[COUNT] += 1
+        window[SUM] += seconds
+        window[ERRORS] += 0 if success else 1
+        window[MIN] = min(window[MIN], seconds)
+        window[MAX] = max(window[MAX], seconds)
+
+    def record_query(self, user_id: str, route: str, response_time: float, success: bool):
+        """Count one /query request for the fleet"""
+        now = time.time()
+        with self.lock:
+            slot = self._own_slot()
+            counters = slot['counters']
+            counters[QUERIES] += 1
+            counters[DB_QUERIES if route == 'database' else BEDROCK_QUERIES] += 1
+            if not success:
+                counters[ERRORS_COUNTER] += 1
+            self._record_latency(slot, 0, response_time, success, now)
+            self._users.add(user_id)
+
+    def record_handler(self, handler: str, seconds: float, success: bool):
+        """Time one database or Bedrock handler call for the fleet"""
+        now = time.time()
+        with self.lock:
+            self._record_latency(self._own_slot(), HISTOGRAMS.index(handler), seconds, success, now)
+
+    def register_gauge(self, name: str, read: Callable[[], float]):
+        """Publish read() as this worker's value of a gauge declared in GAUGES"""
+        if name not in GAUGES:
+            raise ValueError(f"Unknown shared gauge {name}; the file layout declares {list(GAUGES)}")
+        self._gauge_readers[name] = read
+
+    def publish_gauges(self):
+        values = {}
+        for name, read in list(self._gauge_readers.items()):
+            try:
+                values[name] = float(read())
+            except Exception as e:
+                logging.warning(f"Could not read shared gauge {name}: {e}")
+        with self.lock:
+            gauges = self._own_slot()['gauges']
+            for name, value in values.items():
+                gauges[list(GAUGES).index(name)] = value
+
+    def _live(self, slots: np.ndarray) -> np.ndarray:
+        pids = slots['pid']
+        return np.array([pid != 0 and (pid == self._pid or _pid_alive(int(pid))) for pid in pids], dtype=bool)
+
+    def window(self, name: str, seconds: int = 3600, now: Optional[float] = None) -> Tuple[LogHistogram, int]:
+        """Fleet histogram of roughly the last `seconds` seconds, and the errors among its samples"""
+        now = now or time.time()
+        current = int(now // WINDOW_SECONDS)
+        oldest = current - min(math.ceil(seconds / WINDOW_SECONDS), WINDOWS) + 1
+        slots = self.slots
+        windows = slots['histograms'][slots['pid'] != 0, HISTOGRAMS.index(name)]
+        windows = windows.reshape(-1, WINDOW_FIELDS + BUCKETS)
+        windows = windows[(windows[:, EPOCH] >= oldest) & (windows[:, EPOCH] <= current) & (windows[:, COUNT] > 0)]
+        histogram = LogHistogram(RELATIVE_ERROR, MIN_LATENCY)
+        if not len(windows):
+            return histogram, 0
+        counts = windows[:, WINDOW_FIELDS:].sum(axis=0)
+        histogram.buckets = {FIRST_BUCKET + int(i): int(counts[i]) for i in np.flatnonzero(counts)}
+        histogram.count = int(windows[:, COUNT].sum())
+        histogram.sum = float(windows[:, SUM].sum())
+        histogram.min = float(windows[:, MIN].min())
+        histogram.max = float(windows[:, MAX].max())
+        return histogram, int(windows[:, ERRORS].sum())
+
+    def read(self) -> Dict[str, Any]:
+        """
+        Fleet totals: counters and unique users over every slot ever used,
+        gauges over live workers only. Gauges are the values each worker last
+        published; reading never calls the gauge readers, which take locks
+        the request path writes under.
+        """
+        slots = self.slots
+        used = slots['pid'] != 0
+        live = self._live(slots)
+        counters = slots['counters'][used].sum(axis=0) if used.any() else np.zeros(len(COUNTERS))
+        gauges = {}
+        for i, (name, merge) in enumerate(GAUGES.items()):
+            values = slots['gauges'][live, i]
+            gauges[name] = float(values.max() if merge == "max" else values.sum()) if len(values) else 0.0
+        users = HyperLogLog(HLL_PRECISION)
+        if used.any():
+            users.registers = bytearray(np.maximum.reduce(slots['users'][used]).tobytes())
+        return {
+            'started_at': float(self.header['created_at']),
+            'workers': int(live.sum()),
+            'counters': {name: int(counters[i]) for i, name in enumerate(COUNTERS)},
+            'gauges': gauges,
+            'unique_users': users.count(),
+            'per_worker': [
+                {'pid': int(slots[i]['pid']), 'queries': int(slots[i]['counters'][QUERIES]),
+                 **{name: float(slots[i]['gauges'][j]) for j, name in enumerate(GAUGES)}}
+                for i in np.flatnonzero(live)
+            ]
+        }
+
+    def start(self, interval: float = None):
+        """Publish this worker's gauges every interval seconds from a background thread"""
+        if self._thread is not None:
+            return self._thread
+        interval = interval or PERFORMANCE_CONFIG["metrics_flush_interval"]
+        self._stop.clear()
+        # Readers see this worker's gauges from the start, not one interval later
+        self.publish_gauges()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.publish_gauges()
+                except Exception as e:
+                    logging.warning(f"Failed to publish shared gauges: {e}")
+
+        self._thread = threading.Thread(target=run, name="shared-metrics-gauges", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self._thread = None
+
+
+def default_path() -> Optional[str]:
+    """The metrics file named by KETHA_SHARED_METRICS, if any"""
+    return os.getenv("KETHA_SHARED_METRICS") or None
+
+
+def create_fleet_file(directory: Optional[str] = None) -> str:
+    """A fresh metrics file path for one launcher run, exported to its workers"""
+    directory = directory or os.getenv("KETHA_METRICS_DIR") or tempfile.gettempdir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"ketha-metrics-{os.getpid()}.mmap")
+    if os.path.exists(path):
+        os.remove(path)
+    os.environ["KETHA_SHARED_METRICS"] = path
+    return path
+
+
+# Global shared metrics instance
+shared_metrics = SharedMetrics(default_path(), PERFORMANCE_CONFIG["shared_metrics_slots"])
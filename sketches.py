@@ -0,0 +1,150 @@
+"""
+Streaming Sketches for Ketha AI Agent
+Fixed-memory summaries for query analytics: Space-Saving top-k heavy
+hitters and HyperLogLog distinct counts
+"""
+
+import hashlib
+import math
+from typing import Any, Dict, Hashable, List, Optional
+
+
+class _Bucket:
+    """All monitored items that currently share one count"""
+
+    __slots__ = ("count", "items", "prev", "next")
+
+    def __init__(self, count: int):
+        self.count = count
+        self.items = {}
+        self.prev = None
+        self.next = None
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitters over a Stream-Summary: buckets of equal count
+    kept in a doubly linked list in ascending order. An update moves one item
+    to the neighbouring bucket, so it is O(1); a new item past capacity
+    replaces one from the minimum bucket and inherits its count as error.
+    Any item seen more than total / capacity times is guaranteed to be held,
+    and top() walks the list from the largest bucket without sorting.
+    """
+
+    def __init__(self, capacity: int = 200):
+        self.capacity = capacity
+        # item -> [bucket, error, payload]
+        self.counters: Dict[Hashable, List[Any]] = {}
+        self.head: Optional[_Bucket] = None  # smallest count
+        self.tail: Optional[_Bucket] = None  # largest count
+        self.total = 0
+
+    def _link_after(self, bucket: _Bucket, prev: Optional[_Bucket]):
+        bucket.prev = prev
+        bucket.next = prev.next if prev else self.head
+        if bucket.next:
+            bucket.next.prev = bucket
+        else:
+            self.tail = bucket
+        if prev:
+            prev.next = bucket
+        else:
+            self.head = bucket
+
+    def _unlink(self, bucket: _Bucket):
+        if bucket.prev:
+            bucket.prev.next = bucket.next
+        else:
+            self.head = bucket.next
+        if bucket.next:
+            bucket.next.prev = bucket.prev
+        else:
+            self.tail = bucket.prev
+
+    def _increment(self, item: Hashable, entry: List[Any]):
+        bucket = entry[0]
+        target = bucket.next
+        if target is None or target.count != bucket.count + 1:
+            target = _Bucket(bucket.count + 1)
+            self._link_after(target, bucket)
+        del bucket.items[item]
+        target.items[item] = None
+        entry[0] = target
+        if not bucket.items:
+            self._unlink(bucket)
+
+    def add(self, item: Hashable, payload: Any = None):
+        """Count one occurrence of item, optionally attaching the latest payload for it"""
+        self.total += 1
+        entry = self.counters.get(item)
+        if entry is not None:
+            self._increment(item, entry)
+        elif len(self.counters) < self.capacity:
+            bucket = self.head
+            if bucket is None or bucket.count != 1:
+                bucket = _Bucket(1)
+                self._link_after(bucket, None)
+            bucket.items[item] = None
+            entry = self.counters[item] = [bucket, 0, payload]
+        else:
+            # Take over the slot of an item from the minimum bucket, then count this occurrence
+            bucket = self.head
+            victim = next(iter(bucket.items))
+            del bucket.items[victim]
+            del self.counters[victim]
+            bucket.items[item] = None
+            entry = self.counters[item] = [bucket, bucket.count, payload]
+            self._increment(item, entry)
+        if payload is not None:
+            entry[2] = payload
+
+    def top(self, k: int = 20) -> List[Dict[str, Any]]:
+        """The k most frequent items, largest first, with their overestimation bound"""
+        result = []
+        bucket = self.tail
+        while bucket is not None and len(result) < k:
+            for item in reversed(bucket.items):
+                entry = self.counters[item]
+                result.append({'item': item, 'count': bucket.count, 'error': entry[1], 'payload': entry[2]})
+                if len(result) == k:
+                    break
+            bucket = bucket.prev
+        return result
+
+    def __len__(self) -> int:
+        return len(self.counters)
+
+
+class HyperLogLog:
+    """
+    Distinct-count estimator in 2**precision one-byte registers (4 KB at the
+    default precision of 12, about 1.6% standard error). Hashes are stable
+    across processes, so sketches from several workers can be merged.
+    """
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+        self.alpha = 0.7213 / (1 + 1.079 / self.size)
+
+    def add(self, value: Any):
+        digest = hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        """Fold another sketch of the same precision into this one"""
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self) -> int:
+        estimate = self.alpha * self.size * self.size / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # Linear counting is more accurate while most registers are still empty
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
@@ -1,6 +1,7 @@
-from langchain_community.utilities import SQLDatabase
 from langchain_aws import ChatBedrock
-from database import get_db_engine
+from database import get_db_engine, get_query_capture, run_query_columnar
+from dashboard_config import PERFORMANCE_CONFIG
+from deadline import DeadlineExceeded, bedrock_client_config
 from langchain.chains import create_sql_query_chain
 from langchain.tools import Tool
 from langchain.agents import AgentExecutor, create_react_agent
@@ -45,25 +46,43 @@ def validate_table_and_columns(table_name, column_names):
         return True
 import re
 
+def format_rows_for_llm(rows, max_string_length=1000):
+    """Render rows the way SQLDatabase.run does: a list of value tuples"""
+    def truncate(value):
+        if isinstance(value, str) and len(value) > max_string_length:
+            return value[:max_string_length] + "..."
+        return value
+    return str([tuple(truncate(v) for v in row) for row in rows])
+
+def format_observation(result, max_rows=None, max_chars=None, more=False):
+    """
+    What the agent sees of a result: the columns, a bounded sample of rows
+    and the row count (a lower bound when more rows follow the first page).
+    The full rows go to the caller through the query capture, never into
+    the prompt.
+    """
+    max_rows = PERFORMANCE_CONFIG["sql_observation_rows"] if max_rows is None else max_rows
+    max_chars = PERFORMANCE_CONFIG["sql_observation_chars"] if max_chars is None else max_chars
+    columns = ", ".join(result.names)
+    if not len(result):
+        return f"Query returned no rows. Columns: {columns}"
+    sample = format_rows_for_llm(result.head(max_rows).to_rows(), max_string_length=200)
+    if len(sample) > max_chars:
+        sample = sample[:max_chars] + "..."
+    observation = f"Columns: {columns}\nRows: {sample}"
+    if more:
+        observation += (f"\n(More than {len(result)} rows, first {min(max_rows, len(result))} shown. The full "
+                        f"result is shown to the user as a paged table; summarise it instead of listing rows.)")
+    elif len(result) > max_rows:
+        observation += (f"\n({len(result)} rows in total, first {max_rows} shown. The full result is shown "
+                        f"to the user as a table; summarise it instead of listing rows.)")
+    return observation
+
 def get_sql_agent():
-    engine = get_db_engine()
-    
-    # Configure SQLDatabase with optimizations for large schemas
-    try:
-        db = SQLDatabase(
-            engine, 
-            include_tables=None,  # Include all tables
-            sample_rows_in_table_info=1,  # Reduce sample rows for performance
-            max_string_length=1000  # Limit string length
-        )
-    except Exception as e:
-        logging.warning(f"Error initializing SQLDatabase with full schema: {e}")
-        # Fallback to basic initialization
-        db = SQLDatabase(engine)
-    
     llm = ChatBedrock(
         model_id="anthropic.claude-3-sonnet-20240229-v1:0",
-        model_kwargs={"temperature": 0.1, "max_tokens": 2000}
+        model_kwargs={"temperature": 0.1, "max_tokens": 2000},
+        config=bedrock_client_config()
     )
 
     schema = get_schema_summary()
@@ -129,6 +148,7 @@ CRITICAL FORMAT RULES:
 - ALWAYS validate table and column names before generating SQL
 - ALWAYS end with "Final Answer:" followed by your response
 - If a requested table/column doesn't exist, explain available options instead of generating invalid SQL
+- The query result is shown to the user as a table: summarise it in the Final Answer, do not copy its rows
 
 Begin!
 
@@ -152,8 +172,18 @@ Thought: {{agent_scratchpad}}
             if not potential_tables:
                 return "Error: No valid table names found in query. Available tables: " + ", ".join(valid_tables)
             
-            # Execute the validated query
-            return db.run(query)
+            # Execute the validated query; cancellable through the request deadline
+            # Only the first page leaves the database; later pages are fetched when asked for
+            page_rows = PERFORMANCE_CONFIG["result_page_rows"]
+            result = run_query_columnar(query, max_rows=page_rows)
+            more = len(result) > page_rows
+            result = result.head(page_rows)
+            capture = get_query_capture()
+            if capture is not None:
+                capture.record(query, result, more)
+            return format_observation(result, more=more)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             return f"SQL execution error: {str(e)}"
 
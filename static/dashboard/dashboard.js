@@ -0,0 +1,654 @@
+let charts = {};
+let currentTab = 'overview';
+let dashboardState = null;
+let historyRollups = null;
+let lastSeq = 0;
+let stream = null;
+const MAX_HISTORY = 100;
+const ADMIN_PASSWORD = 'kethaadmin12345679';
+
+function login(event) {
+    event.preventDefault();
+    const password = document.getElementById('password').value;
+    const errorMessage = document.getElementById('error-message');
+
+    if (password === ADMIN_PASSWORD) {
+        document.getElementById('login-container').style.display = 'none';
+        document.getElementById('dashboard-content').style.display = 'block';
+        sessionStorage.setItem('authenticated', 'true');
+        refreshData();
+        connectStream();
+        return false;
+    } else {
+        errorMessage.style.display = 'block';
+        document.getElementById('password').value = '';
+        return false;
+    }
+}
+
+function logout() {
+    sessionStorage.removeItem('authenticated');
+    if (stream) {
+        stream.close();
+        stream = null;
+    }
+    document.getElementById('login-container').style.display = 'flex';
+    document.getElementById('dashboard-content').style.display = 'none';
+}
+
+// Check if already authenticated
+if (sessionStorage.getItem('authenticated') === 'true') {
+    document.getElementById('login-container').style.display = 'none';
+    document.getElementById('dashboard-content').style.display = 'block';
+}
+
+function switchTab(tabName) {
+    document.querySelectorAll('.tab-content').forEach(tab => {
+        tab.classList.remove('active');
+    });
+    document.querySelectorAll('.tab').forEach(tab => {
+        tab.classList.remove('active');
+    });
+
+    document.getElementById(tabName + '-tab').classList.add('active');
+    event.target.classList.add('active');
+    currentTab = tabName;
+
+    refreshData();
+}
+
+async function fetchData() {
+    try {
+        const historyWindow = document.getElementById('history-range').value;
+        const [metricsResponse, performanceResponse] = await Promise.all([
+            fetch(historyWindow ? `/admin/metrics?window=${historyWindow}` : '/admin/metrics'),
+            fetch('/admin/performance')
+        ]);
+
+        const metrics = await metricsResponse.json();
+        const performance = await performanceResponse.json();
+
+        return { metrics, performance };
+    } catch (error) {
+        console.error('Failed to fetch data:', error);
+        return { 
+            metrics: { stats: {}, memory_history: [], query_history: [] }, 
+            performance: { performance: {}, bottlenecks: [], optimizations: [] } 
+        };
+    }
+}
+
+function updateOverviewTab(data) {
+    updateMetrics(data.metrics);
+    updateSystemChart(data.metrics);
+    updateQueryDistributionChart(data.metrics);
+}
+
+function updatePerformanceTab(data) {
+    updatePerformanceMetrics(data.performance);
+    updatePerformanceChart(data.performance);
+    updateStageLatencyTable(data.performance);
+}
+
+function updateOptimizationTab(data) {
+    updateOptimizationSuggestions(data.performance);
+}
+
+function updateActivityTab(data) {
+    updateActivityTable(data.metrics);
+}
+
+function updateMetrics(data) {
+    const metricsGrid = document.getElementById('metrics-grid');
+    const stats = data.stats || {};
+
+    const metrics = [
+        {
+            value: Math.round(stats.current_memory || 0),
+            unit: 'MB',
+            label: 'Memory Usage',
+            change: stats.current_memory > 400 ? 'High' : 'Normal',
+            changeType: stats.current_memory > 400 ? 'negative' : 'positive'
+        },
+        {
+            value: Math.round((stats.uptime_hours || 0) * 10) / 10,
+            unit: 'hrs',
+            label: 'System Uptime',
+            change: 'Online',
+            changeType: 'positive'
+        },
+        {
+            value: stats.total_queries || 0,
+            unit: '',
+            label: 'Total Queries',
+            change: '+' + (stats.queries_per_hour || 0).toFixed(1) + '/hr',
+            changeType: 'positive'
+        },
+        {
+            value: Math.round((stats.avg_response_time || 0) * 1000),
+            unit: 'ms',
+            label: 'Avg Response',
+            change: stats.avg_response_time < 2 ? 'Fast' : 'Slow',
+            changeType: stats.avg_response_time < 2 ? 'positive' : 'negative'
+        },
+        {
+            value: Math.round((stats.p99_response_time || 0) * 1000),
+            unit: 'ms',
+            label: 'p99 Response',
+            change: 'p95 ' + Math.round((stats.p95_response_time || 0) * 1000) + 'ms',
+            changeType: stats.p99_response_time < 5 ? 'positive' : 'negative'
+        },
+        {
+            value: Math.round((stats.error_rate || 0) * 10) / 10,
+            unit: '%',
+            label: 'Error Rate',
+            change: stats.error_rate < 5 ? 'Low' : 'High',
+            changeType: stats.error_rate < 5 ? 'positive' : 'negative'
+        },
+        {
+            value: stats.active_users || 0,
+            unit: '',
+            label: 'Active Users',
+            change: stats.unique_users + ' total',
+            changeType: 'neutral'
+        }
+    ];
+
+    metricsGrid.innerHTML = metrics.map(metric => `
+        <div class="metric-card">
+            <div class="metric-value">${metric.value}<span style="font-size: 1rem; opacity: 0.7; margin-left: 4px;">${metric.unit}</span></div>
+            <div class="metric-label">${metric.label}</div>
+            <div class="metric-change change-${metric.changeType}">${metric.change}</div>
+        </div>
+    `).join('');
+}
+
+function updateSystemChart(data) {
+    if (typeof Chart === 'undefined') return; // Chart.js unavailable offline; metrics still render
+    const ctx = document.getElementById('systemChart').getContext('2d');
+
+    if (charts.systemChart) {
+        charts.systemChart.destroy();
+    }
+
+    let memoryData = (data.memory_history || []).slice(-30).map(m => ({
+        label: new Date(m.timestamp).toLocaleTimeString(),
+        value: m.memory_mb
+    }));
+    if (data.rollups && data.rollups.series.memory_mb) {
+        const hourly = data.rollups.resolution >= 3600;
+        memoryData = data.rollups.series.memory_mb.map(point => ({
+            label: hourly
+                ? new Date(point.timestamp * 1000).toLocaleString()
+                : new Date(point.timestamp * 1000).toLocaleTimeString(),
+            value: point.avg
+        }));
+    }
+
+    charts.systemChart = new Chart(ctx, {
+        type: 'line',
+        data: {
+            labels: memoryData.map(m => m.label),
+            datasets: [{
+                label: 'Memory Usage (MB)',
+                data: memoryData.map(m => m.value),
+                borderColor: '#8b5cf6',
+                backgroundColor: 'rgba(139, 92, 246, 0.1)',
+                tension: 0.4,
+                fill: true,
+                pointRadius: 2,
+                borderWidth: 2
+            }, {
+                label: 'Memory Limit',
+                data: new Array(memoryData.length).fill(512),
+                borderColor: '#ef4444',
+                borderDash: [5, 5],
+                pointRadius: 0,
+                borderWidth: 1
+            }]
+        },
+        options: {
+            responsive: true,
+            plugins: {
+                legend: { 
+                    position: 'top',
+                    labels: { color: '#e2e8f0' }
+                }
+            },
+            scales: {
+                x: { 
+                    grid: { color: 'rgba(139, 92, 246, 0.1)' },
+                    ticks: { color: '#94a3b8' }
+                },
+                y: { 
+                    beginAtZero: true, 
+                    max: 600,
+                    grid: { color: 'rgba(139, 92, 246, 0.1)' },
+                    ticks: { color: '#94a3b8' }
+                }
+            }
+        }
+    });
+}
+
+function updateQueryDistributionChart(data) {
+    if (typeof Chart === 'undefined') return;
+    const ctx = document.getElementById('queryDistChart').getContext('2d');
+
+    if (charts.queryDistChart) {
+        charts.queryDistChart.destroy();
+    }
+
+    charts.queryDistChart = new Chart(ctx, {
+        type: 'doughnut',
+        data: {
+            labels: ['Database Queries', 'AI Queries'],
+            datasets: [{
+                data: [data.stats.db_queries, data.stats.bedrock_queries],
+                backgroundColor: ['#3b82f6', '#8b5cf6'],
+                borderWidth: 0
+            }]
+        },
+        options: {
+            responsive: true,
+            plugins: {
+                legend: { 
+                    position: 'bottom',
+                    labels: { color: '#e2e8f0' }
+                }
+            }
+        }
+    });
+}
+
+function updatePerformanceMetrics(data) {
+    const performanceGrid = document.getElementById('performance-grid');
+    const perf = data.performance || {};
+
+    const dbPerf = perf.database_performance || {};
+    const bedrockPerf = perf.bedrock_performance || {};
+    const userActivity = perf.user_activity || {};
+
+    performanceGrid.innerHTML = `
+        <div class="performance-card">
+            <div class="performance-title">Database Performance</div>
+            <div class="performance-stats">
+                <div class="stat-item">
+                    <div class="stat-value">${Math.round((dbPerf.avg_response_time || 0) * 1000)}ms</div>
+                    <div class="stat-label">Avg Response</div>
+                </div>
+                <div class="stat-item">
+                    <div class="stat-value">${Math.round(dbPerf.success_rate || 100)}%</div>
+                    <div class="stat-label">Success Rate</div>
+                </div>
+                <div class="stat-item">
+                    <div class="stat-value">${dbPerf.total_queries || 0}</div>
+                    <div class="stat-label">Total Queries</div>
+                </div>
+                <div class="stat-item">
+                    <div class="stat-value">${Math.round((dbPerf.p95_response_time || 0) * 1000)}ms</div>
+                    <div class="stat-label">p95 Response</div>
+                </div>
+            </div>
+        </div>
+        <div class="performance-card">
+            <div class="performance-title">AI Performance</div>
+            <div class="performance-stats">
+                <div class="stat-item">
+                    <div class="stat-value">${Math.round((bedrockPerf.avg_response_time || 0) * 1000)}ms</div>
+                    <div class="stat-label">Avg Response</div>
+                </div>
+                <div class="stat-item">
+                    <div class="stat-value">${Math.round(bedrockPerf.success_rate || 100)}%</div>
+                    <div class="stat-label">Success Rate</div>
+                </div>
+                <div class="stat-item">
+                    <div class="stat-value">${bedrockPerf.total_queries || 0}</div>
+                    <div class="stat-label">Total Queries</div>
+                </div>
+                <div class="stat-item">
+                    <div class="stat-value">${Math.round((bedrockPerf.p95_response_time || 0) * 1000)}ms</div>
+                    <div class="stat-label">p95 Response</div>
+                </div>
+            </div>
+        </div>
+        <div class="performance-card">
+            <div class="performance-title">User Metrics</div>
+            <div class="performance-stats">
+                <div class="stat-item">
+                    <div class="stat-value">${userActivity.active_users || 0}</div>
+                    <div class="stat-label">Active Users</div>
+                </div>
+                <div class="stat-item">
+                    <div class="stat-value">${userActivity.peak_concurrent || 0}</div>
+                    <div class="stat-label">Peak Concurrent</div>
+                </div>
+                <div class="stat-item">
+                    <div class="stat-value">${userActivity.total_unique_users || 0}</div>
+                    <div class="stat-label">Total Users</div>
+                </div>
+                <div class="stat-item">
+                    <div class="stat-value">Online</div>
+                    <div class="stat-label">Status</div>
+                </div>
+            </div>
+        </div>
+    `;
+}
+
+function updateStageLatencyTable(data) {
+    const tbody = document.querySelector('#stage-latency-table tbody');
+    const stages = (data.performance || {}).stage_latency || {};
+    const ms = value => Math.round((value || 0) * 1000) + 'ms';
+    tbody.innerHTML = Object.entries(stages)
+        .map(([stage, windows]) => [stage, windows['15m'] || {}])
+        .filter(([stage, window]) => window.count)
+        .sort((a, b) => b[1].p95 - a[1].p95)
+        .map(([stage, window]) => `
+            <tr>
+                <td>${stage}</td>
+                <td>${window.count}</td>
+                <td>${ms(window.p50)}</td>
+                <td>${ms(window.p95)}</td>
+                <td>${ms(window.p99)}</td>
+                <td>${ms(window.max)}</td>
+            </tr>
+        `).join('');
+}
+
+function updatePerformanceChart(data) {
+    if (typeof Chart === 'undefined') return;
+    const ctx = document.getElementById('performanceChart').getContext('2d');
+
+    if (charts.performanceChart) {
+        charts.performanceChart.destroy();
+    }
+
+    const perf = data.performance || {};
+    const queryPatterns = perf.query_patterns || {};
+
+    charts.performanceChart = new Chart(ctx, {
+        type: 'bar',
+        data: {
+            labels: Object.keys(queryPatterns).slice(0, 10),
+            datasets: [{
+                label: 'Query Frequency',
+                data: Object.values(queryPatterns).slice(0, 10),
+                backgroundColor: 'rgba(139, 92, 246, 0.6)',
+                borderColor: '#8b5cf6',
+                borderWidth: 1,
+            }]
+        },
+        options: {
+            responsive: true,
+            plugins: {
+                legend: { 
+                    position: 'top',
+                    labels: { color: '#e2e8f0' }
+                }
+            },
+            scales: {
+                x: { 
+                    grid: { color: 'rgba(139, 92, 246, 0.1)' },
+                    ticks: { color: '#94a3b8' }
+                },
+                y: { 
+                    beginAtZero: true,
+                    grid: { color: 'rgba(139, 92, 246, 0.1)' },
+                    ticks: { color: '#94a3b8' }
+                }
+            }
+        }
+    });
+}
+
+function updateOptimizationSuggestions(data) {
+    const optimizationGrid = document.getElementById('optimization-grid');
+    const optimizations = data.optimizations || [];
+    const bottlenecks = data.bottlenecks || [];
+
+    const allSuggestions = [
+        ...optimizations.map(opt => ({
+            title: opt.title || 'Optimization Suggestion',
+            desc: opt.description || 'No description available',
+            actions: opt.implementation || ['No actions specified'],
+            type: 'optimization'
+        })),
+        ...bottlenecks.map(bot => ({
+            title: bot.issue || 'Performance Issue',
+            desc: bot.description || 'No description available',
+            actions: bot.suggestions || ['No suggestions available'],
+            type: 'bottleneck'
+        }))
+    ];
+
+    if (allSuggestions.length === 0) {
+        allSuggestions.push({
+            title: 'System Operating Optimally',
+            desc: 'All performance metrics are within acceptable ranges. No immediate optimizations required.',
+            actions: ['Continue monitoring system performance', 'Maintain current configuration'],
+            type: 'status'
+        });
+    }
+
+    optimizationGrid.innerHTML = allSuggestions.map(suggestion => `
+        <div class="optimization-card">
+            <div class="optimization-title">${suggestion.title}</div>
+            <div class="optimization-desc">${suggestion.desc}</div>
+            <ul class="optimization-actions">
+                ${suggestion.actions.map(action => `<li>${action}</li>`).join('')}
+            </ul>
+        </div>
+    `).join('');
+}
+
+function updateActivityTable(data) {
+    const tbody = document.querySelector('#activity-table tbody');
+    tbody.innerHTML = data.query_history.slice(-20).reverse().map(activity => `
+        <tr>
+            <td>${new Date(activity.timestamp).toLocaleString()}</td>
+            <td>${activity.user_id}</td>
+            <td title="${activity.query}">${activity.query.length > 50 ? activity.query.substring(0, 50) + '...' : activity.query}</td>
+            <td><span class="route-badge route-${activity.route}">${activity.route}</span></td>
+            <td>${Math.round(activity.response_time * 1000)}ms</td>
+            <td><span class="status-badge status-${activity.success ? 'success' : 'error'}">${activity.success ? 'Success' : 'Error'}</span></td>
+            <td>${activity.request_id ? `<button class="trace-btn" onclick="showTrace('${activity.request_id}')">Waterfall</button>` : '-'}</td>
+        </tr>
+    `).join('');
+}
+
+function spanClass(span) {
+    if (span.attributes && span.attributes.error) return 'span-error';
+    if (span.name === 'execute_query' || span.name.startsWith('tool:')) return 'span-sql';
+    if (span.name === 'llm_step' || span.name === 'bedrock_call') return 'span-llm';
+    if (span.name === 'memory_cleanup') return 'span-gc';
+    return '';
+}
+
+async function showTrace(requestId) {
+    const panel = document.getElementById('trace-panel');
+    const waterfall = document.getElementById('trace-waterfall');
+    panel.style.display = 'block';
+
+    const response = await fetch(`/admin/traces/${requestId}`);
+    if (!response.ok) {
+        waterfall.innerHTML = '<div class="waterfall-label">Trace is no longer in the buffer.</div>';
+        return;
+    }
+    const trace = await response.json();
+    const total = Math.max(trace.duration_ms, 1);
+    const depths = {};
+    trace.spans.forEach(span => {
+        depths[span.span_id] = span.parent_id === null ? 0 : (depths[span.parent_id] || 0) + 1;
+    });
+
+    document.getElementById('trace-title').textContent =
+        `Request Waterfall: ${trace.request_id} (${Math.round(trace.duration_ms)}ms, ${trace.attributes.route || 'unknown'})`;
+    waterfall.innerHTML = trace.spans.map(span => `
+        <div class="waterfall-row">
+            <div class="waterfall-label" style="padding-left: ${depths[span.span_id] * 12}px" title="${span.name}">
+                ${span.name}${span.attributes.step ? ' #' + span.attributes.step : ''}
+            </div>
+            <div class="waterfall-track">
+                <div class="waterfall-bar ${spanClass(span)}"
+                     style="left: ${span.start_ms / total * 100}%; width: ${span.duration_ms / total * 100}%"></div>
+            </div>
+            <div class="waterfall-duration">${span.duration_ms.toFixed(1)}ms</div>
+        </div>
+    `).join('');
+}
+
+async function refreshData() {
+    const data = await fetchData();
+    historyRollups = data && data.metrics ? data.metrics.rollups || null : null;
+    renderData(data);
+}
+
+function renderData(data) {
+    if (data) {
+        switch(currentTab) {
+            case 'overview':
+                updateOverviewTab(data);
+                break;
+            case 'performance':
+                updatePerformanceTab(data);
+                break;
+            case 'optimization':
+                updateOptimizationTab(data);
+                break;
+            case 'activity':
+                updateActivityTab(data);
+                break;
+        }
+    }
+}
+
+function isPlainObject(value) {
+    return value !== null && typeof value === 'object' && !Array.isArray(value);
+}
+
+function applyEvents(events) {
+    // Snapshots and deltas can overlap; seq makes replays harmless
+    const seen = lastSeq;
+    [['queries', 'query_history'], ['memory', 'memory_history']].forEach(([source, target]) => {
+        const history = dashboardState.metrics[target];
+        (events[source] || []).forEach(entry => {
+            if (entry.seq > seen) {
+                history.push(entry);
+                lastSeq = Math.max(lastSeq, entry.seq);
+            }
+        });
+        history.splice(0, Math.max(history.length - MAX_HISTORY, 0));
+    });
+}
+
+function applyRemovals(removed) {
+    // Applied before changes: a path removed here may come back with a new shape
+    removed.forEach(([group, key, subkey]) => {
+        const target = dashboardState[group];
+        if (!target) return;
+        if (subkey === null) {
+            delete target[key];
+        } else if (isPlainObject(target[key])) {
+            delete target[key][subkey];
+        }
+    });
+}
+
+function applyChanges(changed) {
+    Object.entries(changed).forEach(([group, values]) => {
+        const target = dashboardState[group] = dashboardState[group] || {};
+        Object.entries(values).forEach(([key, value]) => {
+            if (isPlainObject(value) && isPlainObject(target[key])) {
+                Object.assign(target[key], value);
+            } else {
+                target[key] = value;
+            }
+        });
+    });
+}
+
+function renderStreamState() {
+    if (!dashboardState || document.hidden) return;
+    renderData({
+        metrics: Object.assign({}, dashboardState.metrics, { rollups: historyRollups }),
+        performance: dashboardState.performance
+    });
+}
+
+function connectStream() {
+    if (!window.EventSource) {
+        setInterval(refreshData, 30000);
+        return;
+    }
+    if (stream) return;
+    // EventSource reconnects on its own and resumes from Last-Event-ID
+    stream = new EventSource('/admin/stream');
+    stream.addEventListener('snapshot', event => {
+        const snapshot = JSON.parse(event.data);
+        dashboardState = {
+            metrics: Object.assign({}, snapshot.metrics, { query_history: [], memory_history: [] }),
+            performance: snapshot.performance || {}
+        };
+        lastSeq = 0;
+        applyEvents(snapshot.events || {});
+        renderStreamState();
+    });
+    stream.addEventListener('delta', event => {
+        if (!dashboardState) return;
+        const delta = JSON.parse(event.data);
+        applyEvents(delta.events || {});
+        applyRemovals(delta.removed || []);
+        applyChanges(delta.changed || {});
+        renderStreamState();
+    });
+}
+
+document.addEventListener('visibilitychange', renderStreamState);
+
+async function exportMetrics() {
+    try {
+        const response = await fetch('/admin/export');
+        const blob = await response.blob();
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.style.display = 'none';
+        a.href = url;
+        a.download = `ketha-ai-metrics-${Date.now()}.json`;
+        document.body.appendChild(a);
+        a.click();
+        window.URL.revokeObjectURL(url);
+    } catch (error) {
+        console.error('Export failed:', error);
+    }
+}
+
+async function forceCleanup() {
+    try {
+        const response = await fetch('/cleanup', { method: 'POST' });
+        const result = await response.json();
+        console.log('Cleanup result:', result);
+        setTimeout(refreshData, 1000);
+    } catch (error) {
+        console.error('Cleanup failed:', error);
+    }
+}
+
+// Chart.js loads on its own; once it arrives, redraw with the data already shown
+const chartScript = document.getElementById('chart-js');
+if (chartScript && typeof Chart === 'undefined') {
+    chartScript.addEventListener('load', () => {
+        if (sessionStorage.getItem('authenticated') !== 'true') return;
+        if (dashboardState) {
+            renderStreamState();
+        } else {
+            refreshData();
+        }
+    });
+}
+
+// Initialize if authenticated
+if (sessionStorage.getItem('authenticated') === 'true') {
+    refreshData();
+    connectStream(); // Server pushes updates; no polling
+}
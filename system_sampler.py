@@ -0,0 +1,252 @@
+"""
+System Sampler for Ketha AI Agent
+Background thread that samples process RSS and unique/proportional set size,
+CPU, open file descriptors and GC statistics into a shared snapshot. Request handlers and health checks
+read the snapshot instead of querying the OS themselves.
+"""
+
+import gc
+import logging
+import os
+import resource
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from dashboard_config import PERFORMANCE_CONFIG
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+PROC_AVAILABLE = os.path.exists("/proc/self/statm")
+MB = 1024 * 1024
+
+
+def _read_statm() -> Dict[str, float]:
+    with open("/proc/self/statm") as f:
+        size, resident = f.read().split()[:2]
+    return {'rss_mb': int(resident) * PAGE_SIZE / MB, 'vms_mb': int(size) * PAGE_SIZE / MB}
+
+
+def _read_meminfo() -> Dict[str, float]:
+    fields = {}
+    with open("/proc/meminfo") as f:
+        for line in f:
+            name, value = line.split(":", 1)
+            if name in ("MemTotal", "MemAvailable"):
+                fields[name] = int(value.split()[0]) / 1024  # kB -> MB
+                if len(fields) == 2:
+                    break
+    return {'total_mb': fields.get("MemTotal", 0.0), 'available_mb': fields.get("MemAvailable", 0.0)}
+
+
+def _fallback_memory() -> Dict[str, float]:
+    """Memory figures where /proc is unavailable"""
+    if PSUTIL_AVAILABLE:
+        process = psutil.Process(os.getpid())
+        memory_info = process.memory_info()
+        virtual = psutil.virtual_memory()
+        return {
+            'rss_mb': memory_info.rss / MB, 'vms_mb': memory_info.vms / MB,
+            'total_mb': virtual.total / MB, 'available_mb': virtual.available / MB
+        }
+    # Peak rather than current RSS, but never walks the heap; kB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {'rss_mb': peak / (MB if os.uname().sysname == "Darwin" else 1024), 'vms_mb': 0.0,
+            'total_mb': 0.0, 'available_mb': 0.0}
+
+
+def read_process_rss_mb(pid: int) -> Optional[float]:
+    """RSS of another process, or None if it has exited or cannot be read"""
+    try:
+        if PROC_AVAILABLE:
+            with open(f"/proc/{pid}/statm") as f:
+                return int(f.read().split()[1]) * PAGE_SIZE / MB
+        if PSUTIL_AVAILABLE:
+            return psutil.Process(pid).memory_info().rss / MB
+    except Exception:
+        pass
+    return None
+
+
+def read_process_memory(pid: Optional[int] = None) -> Optional[Dict[str, float]]:
+    """
+    RSS, USS (pages only this process maps) and PSS (shared pages split
+    between the processes mapping them) in MB. After a pre-fork preload,
+    RSS minus USS is what a worker shares with its siblings. None if the
+    process has exited or the figures are unavailable.
+    """
+    pid = pid or os.getpid()
+    try:
+        if os.path.exists(f"/proc/{pid}/smaps_rollup"):
+            fields = {}
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    name, _, value = line.partition(":")
+                    if name in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                        fields[name] = int(value.split()[0]) / 1024  # kB -> MB
+            return {'rss_mb': fields.get("Rss", 0.0), 'pss_mb': fields.get("Pss", 0.0),
+                    'uss_mb': fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0)}
+        if PSUTIL_AVAILABLE:
+            info = psutil.Process(pid).memory_full_info()
+            return {'rss_mb': info.rss / MB, 'pss_mb': getattr(info, "pss", info.uss) / MB, 'uss_mb': info.uss / MB}
+    except Exception:
+        pass
+    return None
+
+
+# cgroup v2, then v1: (usage file, limit file, stat file, inactive file counter)
+CGROUP_MEMORY_FILES = (
+    ("/sys/fs/cgroup/memory.current", "/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.stat", "inactive_file"),
+    ("/sys/fs/cgroup/memory/memory.usage_in_bytes", "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+     "/sys/fs/cgroup/memory/memory.stat", "total_inactive_file"),
+)
+
+
+def read_cgroup_memory() -> Optional[Dict[str, Optional[float]]]:
+    """
+    The container's working set (usage minus reclaimable inactive page
+    cache, as the OOM killer sees it) and its limit in MB, or None outside
+    a memory cgroup. The limit is None when the cgroup has none.
+    """
+    for usage_path, limit_path, stat_path, inactive_name in CGROUP_MEMORY_FILES:
+        try:
+            with open(usage_path) as f:
+                usage = int(f.read())
+        except (OSError, ValueError):
+            continue
+        limit = None
+        try:
+            with open(limit_path) as f:
+                value = f.read().strip()
+            # v2 writes "max"; v1 writes a page-rounded huge number
+            if value != "max" and int(value) < 2 ** 60:
+                limit = int(value) / MB
+        except (OSError, ValueError):
+            pass
+        inactive = 0
+        try:
+            with open(stat_path) as f:
+                for line in f:
+                    name, _, value = line.partition(" ")
+                    if name == inactive_name:
+                        inactive = int(value)
+                        break
+        except (OSError, ValueError):
+            pass
+        return {'used_mb': max(usage - inactive, 0) / MB, 'limit_mb': limit}
+    return None
+
+
+def _count_fds() -> Optional[int]:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+class SystemSampler:
+    """
+    Samples every `interval` seconds from a daemon thread and publishes an
+    immutable dict, so readers need no lock. Until the thread is started
+    (scripts, tests) snapshot() samples inline instead.
+    """
+
+    def __init__(self, interval: float = 10):
+        self.interval = interval
+        self.samples = 0
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._last_cpu = None  # (wall, cpu seconds) at the previous sample
+        self._thread = None
+        self._stop = threading.Event()
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+    def on_sample(self, listener: Callable[[Dict[str, Any]], None]):
+        """Call listener with every sample the background thread takes"""
+        self._listeners.append(listener)
+
+    def sample(self) -> Dict[str, Any]:
+        """Read current figures and publish them as the snapshot"""
+        now = time.time()
+        if PROC_AVAILABLE:
+            memory = _read_statm()
+            memory.update(_read_meminfo())
+        else:
+            memory = _fallback_memory()
+        times = os.times()
+        cpu_seconds = times.user + times.system
+        cpu_percent = 0.0
+        if self._last_cpu is not None and now > self._last_cpu[0]:
+            cpu_percent = (cpu_seconds - self._last_cpu[1]) / (now - self._last_cpu[0]) * 100
+        self._last_cpu = (now, cpu_seconds)
+        collections = [generation['collections'] for generation in gc.get_stats()]
+        unique = read_process_memory() or {}
+        cgroup = read_cgroup_memory() or {}
+        snapshot = {
+            'timestamp': now,
+            'rss_mb': memory['rss_mb'],
+            'used_mb': memory['rss_mb'],
+            'vms_mb': memory['vms_mb'],
+            'uss_mb': unique.get('uss_mb'),
+            'pss_mb': unique.get('pss_mb'),
+            'percent': memory['rss_mb'] / memory['total_mb'] * 100 if memory['total_mb'] else 0.0,
+            'available_mb': memory['available_mb'],
+            'total_mb': memory['total_mb'],
+            'cgroup_used_mb': cgroup.get('used_mb'),
+            'cgroup_limit_mb': cgroup.get('limit_mb'),
+            'cpu_percent': round(cpu_percent, 2),
+            'cpu_seconds': round(cpu_seconds, 3),
+            'open_fds': _count_fds(),
+            'threads': threading.active_count(),
+            'gc_counts': gc.get_count(),
+            'gc_collections': collections
+        }
+        self._snapshot = snapshot
+        self.samples += 1
+        return snapshot
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The latest published sample"""
+        snapshot = self._snapshot
+        if snapshot is None or self._thread is None:
+            return self.sample()
+        return snapshot
+
+    def start(self, interval: float = None):
+        """Sample every interval seconds from a background thread"""
+        if self._thread is not None:
+            return self._thread
+        self.interval = interval or self.interval
+        self._stop.clear()
+        self.sample()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                try:
+                    snapshot = self.sample()
+                except Exception as e:
+                    logging.warning(f"Failed to sample system stats: {e}")
+                    continue
+                for listener in self._listeners:
+                    try:
+                        listener(snapshot)
+                    except Exception as e:
+                        logging.warning(f"System sample listener failed: {e}")
+
+        self._thread = threading.Thread(target=run, name="system-sampler", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+        self._thread = None
+
+
+# Global system sampler instance
+system_sampler = SystemSampler(interval=PERFORMANCE_CONFIG["memory_sample_interval"])
@@ -5,7 +5,7 @@ Test script to verify all optimizations are working correctly
 
 import sys
 import traceback
-from memory_utils import log_memory_usage, get_detailed_memory_info, force_cleanup
+from memory_utils import log_memory_usage, get_detailed_memory_info, force_cleanup, get_memory_usage
 
 def test_memory_monitoring():
     """Test memory monitoring functionality"""
@@ -47,6 +47,1159 @@ def test_app_creation():
         traceback.print_exc()
         return False
 
+def test_deadline_cancellation():
+    """Test that cancelling a deadline runs in-flight hooks and fails later checks"""
+    print("🧪 Testing deadline cancellation...")
+    from deadline import Deadline, DeadlineExceeded, deadline_scope, get_current_deadline
+
+    deadline = Deadline(30)
+    cancelled = []
+    unregister = deadline.on_cancel(lambda: cancelled.append("statement"))
+    with deadline_scope(deadline):
+        assert get_current_deadline() is deadline
+        deadline.check("before cancel")
+    assert get_current_deadline() is None
+
+    deadline.cancel("client_disconnected")
+    unregister()
+    assert cancelled == ["statement"]
+    try:
+        deadline.check("after cancel")
+        raise AssertionError("check() should raise once cancelled")
+    except DeadlineExceeded as e:
+        assert e.reason == "client_disconnected"
+
+    # An expired deadline still counts the statement time it avoided
+    from deadline import CancellationStats
+    import deadline as deadline_module
+    stats, saved = CancellationStats(), deadline_module.cancellation_stats
+    deadline_module.cancellation_stats = stats
+    try:
+        expired = Deadline(0)
+        expired.on_cancel(lambda: None, budget=30)
+        try:
+            expired.check("sql execution")
+        except DeadlineExceeded as e:
+            from performance_monitor import PerformanceMonitor
+            assert PerformanceMonitor()._classify_error(str(e)) == 'timeout_error'
+    finally:
+        deadline_module.cancellation_stats = saved
+    assert stats.get_stats()['reclaimed_request_seconds'] > 29
+    print("✅ Deadline cancellation works!")
+    return True
+
+def test_trace_ring_buffer():
+    """Test that spans nest under a trace and old traces are evicted"""
+    print("🧪 Testing request tracing...")
+    from tracing import Tracer, span
+
+    tracer = Tracer(max_traces=3, max_spans_per_trace=10)
+    first = tracer.start_trace()
+    with span("needs_db_query"):
+        with span("execute_query"):
+            pass
+    trace = tracer.get_trace(first.request_id)
+    assert [s['name'] for s in trace['spans']] == ["needs_db_query", "execute_query"]
+    assert trace['spans'][1]['parent_id'] == trace['spans'][0]['span_id']
+
+    for _ in range(3):
+        tracer.start_trace()
+    assert tracer.get_trace(first.request_id) is None
+    assert len(tracer.recent_traces()) == 3
+    print("✅ Request tracing works!")
+    return True
+
+def test_latency_histograms():
+    """Test histogram percentile accuracy and sliding-window expiry"""
+    print("🧪 Testing latency histograms...")
+    from histograms import LogHistogram, WindowedHistogram
+
+    histogram = LogHistogram(relative_error=0.02)
+    for i in range(1, 10001):
+        histogram.record(i / 1000)  # 1ms .. 10s
+    p50, p99 = histogram.percentiles([0.5, 0.99])
+    assert abs(p50 - 5.0) / 5.0 < 0.03
+    assert abs(p99 - 9.9) / 9.9 < 0.03
+
+    now = [1000.0]
+    windowed = WindowedHistogram(clock=lambda: now[0])
+    windowed.record(0.2)
+    now[0] += 120
+    windowed.record(3.0)
+    assert windowed.window(60).count == 1
+    assert windowed.window(900).count == 2
+    now[0] += 3600
+    assert windowed.window(3600).count == 0
+    assert windowed.total.count == 2
+    print("✅ Latency histograms work!")
+    return True
+
+def test_metrics_exporter():
+    """Test the /metrics exposition: summaries, non-finite gauges and exited workers"""
+    print("🧪 Testing Prometheus exporter...")
+    import json
+    import math
+    import os
+    import subprocess
+    import sys
+    import tempfile
+    import metrics_exporter
+    from histograms import LogHistogram
+
+    histogram = LogHistogram()
+    for i in range(1, 101):
+        histogram.record(i / 100)
+    summary = histogram.summary()
+    assert summary['count'] == 100 and summary['p50'] <= summary['p95'] <= summary['p99']
+
+    assert metrics_exporter._format_value(3.0) == "3" and metrics_exporter._format_value(0.25) == "0.25"
+    assert metrics_exporter._format_value(math.nan) == "NaN"
+    assert metrics_exporter._format_value(math.inf) == "+Inf" and metrics_exporter._format_value(-math.inf) == "-Inf"
+    metrics_exporter.register_gauge("ketha_test_broken_ratio", "A gauge that has no value yet", lambda: math.nan)
+    try:
+        body = metrics_exporter.render_metrics()
+    finally:
+        metrics_exporter._registered_gauges.pop("ketha_test_broken_ratio")
+    assert "ketha_test_broken_ratio NaN" in body and "# TYPE ketha_request_duration_seconds histogram" in body
+
+    # A recycled worker's snapshot is folded into the retired totals and removed
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    snapshot = {'pid': exited.pid, 'families': [
+        {'name': "ketha_queries_total", 'type': "counter", 'help': "Queries", 'merge': "sum",
+         'samples': [["ketha_queries_total", {"route": "database"}, 7.0]]},
+        {'name': "ketha_memory_rss_megabytes", 'type': "gauge", 'help': "RSS", 'merge': "per_worker",
+         'samples': [["ketha_memory_rss_megabytes", {}, 300.0]]},
+        {'name': "ketha_sessions", 'type': "gauge", 'help': "Sessions", 'merge': "sum",
+         'samples': [["ketha_sessions", {}, 7.0]]}]}
+    saved = metrics_exporter.MULTIPROC_DIR
+    with tempfile.TemporaryDirectory() as directory:
+        metrics_exporter.MULTIPROC_DIR = directory
+        try:
+            with open(os.path.join(directory, f"worker-{exited.pid}.json"), "w") as f:
+                json.dump(snapshot, f)
+            local = {f.name: f for f in metrics_exporter.collect_local()}
+            local_queries = sum(value for name, labels, value in local["ketha_queries_total"].samples
+                                if labels.get("route") == "database")
+            local_sessions = sum(value for _, _, value in local["ketha_sessions"].samples) \
+                if "ketha_sessions" in local else 0
+            for _ in range(2):  # the second scrape reads the retired totals, not the snapshot
+                families = {f.name: f for f in metrics_exporter.collect_all()}
+                queries = sum(value for name, labels, value in families["ketha_queries_total"].samples
+                              if labels.get("route") == "database")
+                assert queries == local_queries + 7
+                assert all(labels.get("pid") != str(exited.pid)
+                           for _, labels, _ in families["ketha_memory_rss_megabytes"].samples)
+                # Summed gauges left with the worker too
+                sessions = sum(value for _, _, value in families["ketha_sessions"].samples) \
+                    if "ketha_sessions" in families else 0
+                assert sessions == local_sessions
+            assert not os.path.exists(os.path.join(directory, f"worker-{exited.pid}.json"))
+            with open(os.path.join(directory, "retired.json")) as f:
+                assert {family['type'] for family in json.load(f)['families']} == {"counter"}
+        finally:
+            metrics_exporter.MULTIPROC_DIR = saved
+    print("✅ Prometheus exporter works!")
+    return True
+
+def test_metric_rollups():
+    """Test second/minute/hour compaction and resolution picking"""
+    print("🧪 Testing metric rollups...")
+    from metrics_rollup import RollupStore
+
+    now = [1_700_000_000.0 - 1_700_000_000.0 % 3600]
+    store = RollupStore(clock=lambda: now[0])
+    for _ in range(3 * 3600):  # three hours, one request per second
+        store.record("requests")
+        store.record("latency", 0.5)
+        now[0] += 1
+
+    assert store.pick_resolution(120) == 1
+    assert store.pick_resolution(24 * 3600) == 60
+    assert store.pick_resolution(7 * 24 * 3600) == 3600
+
+    minutes = store.query(3600, names=["requests"])['series']['requests']
+    assert minutes and all(point['count'] == 60 for point in minutes)
+    hours = store.query(4 * 3600, resolution=3600, names=["latency"])['series']['latency']
+    assert [point['count'] for point in hours] == [3600, 3600, 3600]
+    assert abs(hours[0]['p95'] - 0.5) / 0.5 < 0.1
+    print("✅ Metric rollups work!")
+    return True
+
+def test_durable_metrics_store():
+    """Test write-behind persistence, compaction and reads across a restart"""
+    print("🧪 Testing durable metrics store...")
+    import os
+    import tempfile
+    import time
+    from metrics_store import MetricsStore
+
+    path = os.path.join(tempfile.mkdtemp(), "metrics.db")
+    store = MetricsStore(path, flush_interval=0.05, raw_retention_days=1 / 24)
+    store.start()
+    for i in range(50):
+        store.record_query("user", "database", 0.5, success=i % 10 != 0)
+        store.record_sample("memory_mb", 200)
+    store.stop()
+
+    restarted = MetricsStore(path, raw_retention_days=1 / 24)
+    restarted.start()
+    lifetime = restarted.lifetime_stats()
+    assert lifetime['process_starts'] == 2
+    assert lifetime['total_queries'] == 50
+    assert lifetime['error_rate'] == 10.0
+
+    restarted.compact(now=time.time() + 3 * 3600)
+    hours = restarted.query_series(5 * 3600, 3600)['series']
+    assert sum(point['count'] for point in hours['requests']) == 50
+    assert sum(point['count'] for point in hours['memory_mb']) == 50
+    assert restarted.lifetime_stats()['total_queries'] == 50
+    restarted.stop()
+    # Two workers up at the same time count their overlap once
+    assert MetricsStore._covered_seconds([(0, 3600), (1800, 5400), (7200, 9000)]) == 7200
+    print("✅ Durable metrics store works!")
+    return True
+
+def test_activity_tracker_soak():
+    """Soak the activity tracker with a million distinct users and check memory stays flat"""
+    print("🧪 Soaking activity tracker with 1,000,000 users...")
+    import gc
+    from activity_tracker import ActivityTracker
+
+    now = [0.0]
+    tracker = ActivityTracker(active_window=300, idle_ttl=3600, max_users=10000, max_events=1000,
+                              clock=lambda: now[0])
+    for i in range(1_000_000):
+        now[0] += 0.01
+        tracker.touch(f"user-{i}", "query_start")
+        if i == 100_000:
+            gc.collect()
+            warm_memory = get_memory_usage()
+    gc.collect()
+    growth = get_memory_usage() - warm_memory
+    print(f"   Memory growth after warm-up: {growth:.1f}MB")
+
+    assert tracker.tracked_count() == 10000
+    assert tracker.active_count() == 10000
+    assert len(tracker.events) == 1000
+    assert growth < 20  # an unbounded tracker would grow by hundreds of MB
+
+    # Idle users age out, and a returning user becomes active again
+    now[0] += 600
+    tracker.touch("user-999999")
+    assert tracker.active_count() == 1
+    now[0] += 3600
+    assert tracker.tracked_count() == 1
+    print("✅ Activity tracker stays bounded!")
+    return True
+
+def test_query_sketches():
+    """Test query fingerprinting, Space-Saving heavy hitters and HyperLogLog counts"""
+    print("🧪 Testing query sketches...")
+    import random
+    from collections import Counter
+    from performance_monitor import fingerprint_query
+    from sketches import SpaceSaving, HyperLogLog
+
+    assert fingerprint_query("Show milk collected by John Kamau on 2024-03-05") == \
+        fingerprint_query("show milk collected by Mary on 5th March, 2023!")
+    assert fingerprint_query("Total for chiller 12") == "total for chiller <num>"
+
+    random.seed(7)
+    stream = [int(random.paretovariate(1.2)) for _ in range(50000)]
+    sketch = SpaceSaving(capacity=50)
+    for item in stream:
+        sketch.add(item)
+    assert len(sketch) == 50
+    exact = [item for item, _ in Counter(stream).most_common(5)]
+    assert [hit['item'] for hit in sketch.top(5)] == exact
+
+    users = HyperLogLog()
+    for i in range(20000):
+        users.add(f"user-{i}")
+        users.add(f"user-{i}")  # repeats must not be counted twice
+    assert abs(users.count() - 20000) / 20000 < 0.05
+    print("✅ Query sketches work!")
+    return True
+
+def test_incremental_performance_summary():
+    """Test rolling handler counts and the published summary snapshot"""
+    print("🧪 Testing incremental performance summary...")
+    from performance_monitor import PerformanceMonitor, RollingCounts
+
+    now = [6000.0]
+    counts = RollingCounts(clock=lambda: now[0])
+    counts.record(True, "simple_select")
+    counts.record(False, "complex_select")
+    now[0] += 1800
+    counts.record(True, "simple_select")
+    assert counts.totals() == (3, 2, {"simple_select": 2, "complex_select": 1})
+    now[0] += 1900  # the first two fall out of the hour
+    assert counts.totals()[:2] == (1, 1)
+
+    monitor = PerformanceMonitor()
+    monitor.log_db_performance("SELECT * FROM farmers", 0.2, True)
+    first = monitor.get_performance_summary()
+    assert first['database_performance']['total_queries'] == 1
+    monitor.log_db_performance("SELECT * FROM farmers", 0.2, False)
+    assert monitor.get_performance_summary() is first  # readers see the published snapshot
+    monitor._snapshot = monitor.build_summary()
+    assert monitor.get_performance_summary()['database_performance']['success_rate'] == 50
+    print("✅ Incremental performance summary works!")
+    return True
+
+def test_dashboard_stream():
+    """Test that the broadcaster builds once per tick and sends only deltas"""
+    print("🧪 Testing dashboard stream...")
+    import asyncio
+    import json
+    from dashboard_stream import DashboardBroadcaster
+
+    builds = []
+    events = []
+    memory = [200]
+
+    def build_state():
+        builds.append(1)
+        return {"metrics": {"stats": {"current_memory": memory[0], "total_queries": len(events)}}}
+
+    def read_events(cursor):
+        return {"queries": [e for e in events if e["seq"] > cursor]}, len(events)
+
+    def payload(message):
+        return json.loads(message.split("data: ", 1)[1])
+
+    async def run():
+        broadcaster = DashboardBroadcaster(build_state, read_events, interval=0.01)
+        watchers = [broadcaster.subscribe() for _ in range(5)]
+        for watcher in watchers:
+            await watcher.__anext__()  # retry hint
+        snapshots = [payload(await watcher.__anext__()) for watcher in watchers]
+        assert snapshots[0]["metrics"]["stats"]["current_memory"] == 200
+
+        events.append({"seq": 1, "query": "total milk"})
+        delta = payload(await watchers[0].__anext__())
+        assert delta["events"]["queries"] == [{"seq": 1, "query": "total milk"}]
+        assert delta["changed"] == {"metrics": {"stats": {"total_queries": 1}}}
+        ticks = broadcaster.ticks
+
+        # A reconnecting client replays only the frames after its cursor
+        resumed = broadcaster.subscribe(cursor=1)
+        await resumed.__anext__()
+        assert payload(await resumed.__anext__())["events"]["queries"][0]["seq"] == 1
+        for watcher in watchers + [resumed]:
+            await watcher.aclose()
+        return ticks
+
+    ticks = asyncio.run(run())
+    assert len(builds) <= ticks + 1  # one build per tick, however many watchers
+
+    # Keys that drop out are sent as removals and forgotten by the broadcaster
+    state = {"metrics": {"user_activity": {"alice": 3, "bob": 1}, "stats": {"workers": 2}}}
+    broadcaster = DashboardBroadcaster(lambda: state, lambda cursor: ({}, cursor))
+    broadcaster._tick()
+    state = {"metrics": {"user_activity": {"carol": 5}, "stats": {"workers": 2}}}
+    delta = json.loads(broadcaster._tick())
+    assert delta["changed"] == {"metrics": {"user_activity": {"carol": 5}}}
+    assert sorted(delta["removed"]) == [["metrics", "user_activity", "alice"], ["metrics", "user_activity", "bob"]]
+    assert len(broadcaster.sections) == 2
+    state = {"metrics": {"user_activity": {}, "stats": {"workers": 2}}}
+    delta = json.loads(broadcaster._tick())
+    assert delta["changed"] == {"metrics": {"user_activity": {}}} and delta["removed"] == [["metrics", "user_activity", "carol"]]
+    print("✅ Dashboard stream works!")
+    return True
+
+def test_static_dashboard_assets():
+    """Test that dashboard assets are hashed, precompressed and revalidated by ETag"""
+    print("🧪 Testing static dashboard assets...")
+    import gzip
+    from enhanced_dashboard import dashboard_assets, StaticAsset
+
+    shell = dashboard_assets.shell.bodies["identity"].decode("utf-8")
+    assert "fonts.googleapis.com" not in shell and "<style>" not in shell
+    assert len(shell) < 10000
+    # The dashboard script never waits behind Chart.js, which may come from an unreachable CDN
+    chart_tag = next(line for line in shell.splitlines() if 'id="chart-js"' in line)
+    assert " async" in chart_tag and " defer" not in chart_tag
+    for asset in dashboard_assets.assets.values():
+        assert asset.url in shell
+        assert gzip.decompress(asset.bodies["gzip"]) == asset.bodies["identity"]
+
+    asset = StaticAsset("app.js", b"console.log('hello');" * 100)
+    assert asset.negotiate("gzip, deflate")[0] == "gzip"
+    assert asset.negotiate("gzip;q=0, identity")[0] == "identity"
+    assert asset.negotiate(None) == ("identity", asset.bodies["identity"])
+    assert asset.matches(asset.etag("gzip")) and not asset.matches('"stale"')
+    assert StaticAsset("app.js", b"changed").hashed_name != asset.hashed_name
+    print("✅ Static dashboard assets work!")
+    return True
+
+def test_system_sampler():
+    """Test that readers share the background sample instead of querying the OS"""
+    print("🧪 Testing system sampler...")
+    import time
+    from system_sampler import SystemSampler
+
+    sampler = SystemSampler(interval=0.05)
+    ticks = []
+    sampler.on_sample(lambda snapshot: ticks.append(snapshot['rss_mb']))
+    sample = sampler.snapshot()  # sampled inline until the thread starts
+    assert sample['rss_mb'] > 0 and sample['used_mb'] == sample['rss_mb']
+    assert len(sample['gc_collections']) == 3
+
+    sampler.start()
+    time.sleep(0.3)
+    samples = sampler.samples
+    assert samples >= 3
+    for _ in range(10000):
+        sampler.snapshot()
+    assert sampler.samples - samples <= 2  # reads never trigger a sample
+    sampler.stop()
+    assert len(ticks) >= 3  # memory history is fed by ticks, not by requests
+    assert "used_mb" in get_detailed_memory_info()
+    print("✅ System sampler works!")
+    return True
+
+def test_gc_manager():
+    """Test that full collections wait for idle time and that pauses are recorded"""
+    print("🧪 Testing GC manager...")
+    import gc
+    from gc_manager import GCManager
+
+    manager = GCManager(thresholds=(5000, 20, 20), pressure_mb=float("inf"), idle_delay=0, min_interval=0)
+    manager.install()
+    try:
+        assert gc.get_threshold() == (5000, 20, 20)
+        manager.freeze()
+        assert manager.frozen_objects > 0
+
+        manager.request_started()
+        for i in range(20000):
+            node = {'id': i}
+            node['self'] = node  # cyclic garbage only the collector can free
+        assert manager.collection_reason() is None  # never while a request is in flight
+        manager.request_finished()
+
+        result = manager.check()
+        assert result['reason'] == "idle" and result['collected'] > 0
+        assert manager.check() is None  # once per idle period
+        stats = manager.get_stats()
+        assert stats['pauses']['gen2']['collections'] >= 1
+        assert stats['managed_collections']['idle'] == 1
+    finally:
+        manager.uninstall()
+    assert gc.get_freeze_count() == 0
+
+    # Pressure collections that free nothing back off instead of repeating every min_interval
+    pressured = GCManager(pressure_mb=0, min_interval=10)
+    assert pressured.collection_reason() == "pressure"
+    pressured.last_full_collection = last = 1000.0
+    pressured._back_off(0.0)
+    pressured._back_off(0.2)
+    assert pressured.pressure_backoff == 40
+    assert pressured.collection_reason(now=last + 30) is None
+    assert pressured.collection_reason(now=last + 45) == "pressure"
+    pressured._back_off(25.0)  # a collection that helps resets the interval
+    assert pressured.pressure_backoff == 10
+    print("✅ GC manager works!")
+    return True
+
+def test_memory_governor():
+    """Test that stages reserve memory, degrade under pressure and report peaks in traces"""
+    print("🧪 Testing memory governor...")
+    from memory_governor import MemoryGovernor, MemoryBudgetExceeded
+    from system_sampler import system_sampler
+    from tracing import Tracer
+
+    rss = system_sampler.snapshot()['rss_mb']
+    governor = MemoryGovernor(limit_mb=rss + 40, headroom_mb=0, queue_timeout=0.05, min_rows=10,
+                              memory_source="process")
+    with governor.reserve("format_results", 1000, 10) as first:
+        assert not first.degraded
+        with governor.reserve("format_results", 10000, 10) as second:
+            assert second.degraded and 0 < second.rows < 10000
+            try:
+                with governor.reserve("analysis", 20000, 10):
+                    raise AssertionError("reservation should not fit")
+            except MemoryBudgetExceeded as e:
+                assert e.stage == "analysis"
+    stats = governor.get_stats()
+    assert stats['reserved_mb'] == 0 and stats['degraded'] == 1 and stats['rejected'] == 1
+
+    governor.calibration_rate = 1.0
+    trace = Tracer().start_trace()
+    with governor.reserve("format_results", 1000, 10):
+        rows = [{f"col{c}": f"value {n} {c}" for c in range(10)} for n in range(1000)]
+    del rows
+    memory = trace.attributes['memory']
+    assert memory['measured_peak_mb'] > 0 and memory['peak_reserved_mb'] > 0
+    assert governor.models["format_results"].samples == 1
+
+    # Workers budget the container's usage, or their share of the limit when only RSS is visible
+    import memory_governor as module
+
+    class FixedSampler:
+        def __init__(self, **snapshot):
+            self.figures = snapshot
+
+        def snapshot(self):
+            return self.figures
+
+    sampler = module.system_sampler
+    try:
+        container = MemoryGovernor(limit_mb=1000, headroom_mb=100)
+        module.system_sampler = FixedSampler(rss_mb=50, cgroup_used_mb=600, cgroup_limit_mb=800)
+        assert container.available_bytes() == 100 * module.MB
+        module.system_sampler = FixedSampler(rss_mb=50, cgroup_used_mb=None, cgroup_limit_mb=None)
+        container.workers = 3
+        assert container.available_bytes() == 250 * module.MB
+    finally:
+        module.system_sampler = sampler
+    print("✅ Memory governor works!")
+    return True
+
+def test_worker_recycling():
+    """Test that the launcher recycles workers after their request limit without dropping requests"""
+    print("🧪 Testing worker recycling...")
+    import http.client
+    import os
+    import signal
+    import time
+    from launcher import RESPAWN_BACKOFF_MIN, Supervisor, Worker, bind_socket
+
+    # A replacement that crashes before READY is retried after a backoff, never doubled up
+    supervisor = Supervisor(None, None, workers=2)
+    spawned = []
+
+    def spawn():
+        worker = Worker(100000 + len(spawned), -1)
+        supervisor.workers[worker.pid] = worker
+        spawned.append(worker)
+        return worker
+
+    supervisor.spawn = spawn
+    first, second = spawn(), spawn()
+    first.ready = second.ready = True
+    first.recycle_reason = "requests"
+    supervisor._roll()
+    assert supervisor.replacing == (first.pid, spawned[2].pid)
+    supervisor._exited(supervisor.workers.pop(spawned[2].pid), 256)
+    assert supervisor.replacing is None and supervisor.respawn_delay == RESPAWN_BACKOFF_MIN
+    supervisor._roll()
+    assert len(spawned) == 3  # still backing off
+    supervisor.respawn_at = 0
+    supervisor._roll()
+    assert len(spawned) == 4 and len(supervisor.workers) == 3
+    assert supervisor.replacing == (first.pid, spawned[3].pid)
+    supervisor._exited(supervisor.workers.pop(spawned[3].pid), 256)
+    assert supervisor.respawn_delay == 2 * RESPAWN_BACKOFF_MIN and supervisor.recycled['crashed'] == 2
+
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        print("✅ Worker recycling skipped: uvicorn is not installed")
+        return True
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": str(os.getpid()).encode()})
+
+    sock = bind_socket("127.0.0.1", 0)
+    port = sock.getsockname()[1]
+    supervisor_pid = os.fork()
+    if supervisor_pid == 0:
+        try:
+            Supervisor(app, sock, workers=2, max_requests=3, drain_timeout=2, check_interval=0.05,
+                       uvicorn_options={'log_level': "warning"}).run()
+        finally:
+            os._exit(0)
+    sock.close()
+    try:
+        pids = []
+        deadline = time.time() + 20
+        while len(set(pids)) < 4 and time.time() < deadline:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            try:
+                connection.request("GET", "/")
+                response = connection.getresponse()
+                assert response.status == 200
+                pids.append(response.read().decode())
+            except OSError:
+                time.sleep(0.1)  # workers still starting, or the request timed out
+            finally:
+                connection.close()
+            time.sleep(0.02)
+        assert len(set(pids)) >= 4  # every request answered while workers were replaced
+    finally:
+        os.kill(supervisor_pid, signal.SIGTERM)
+        stop_deadline = time.time() + 10
+        while os.waitpid(supervisor_pid, os.WNOHANG) == (0, 0):
+            if time.time() > stop_deadline:
+                os.kill(supervisor_pid, signal.SIGKILL)
+                os.waitpid(supervisor_pid, 0)
+                break
+            time.sleep(0.05)
+    print(f"✅ Worker recycling works! {len(set(pids))} workers served {len(pids)} requests")
+    return True
+
+def test_copy_on_write_sharing():
+    """Test that a buffer loaded before fork stays shared and USS reports it"""
+    print("🧪 Testing copy-on-write sharing...")
+    import gc
+    import os
+    import numpy as np
+    from system_sampler import read_process_memory, system_sampler
+
+    snapshot = system_sampler.sample()
+    assert 'uss_mb' in snapshot and 'pss_mb' in snapshot
+    if read_process_memory() is None:
+        print("✅ Copy-on-write sharing skipped: no USS source on this platform")
+        return True
+
+    weights = np.ones(64 * 1024 * 1024 // 4, dtype=np.float32)  # 64 MB, like preloaded model weights
+    weights.setflags(write=False)
+    gc.freeze()
+    ready_read, ready_write = os.pipe()
+    done_read, done_write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(ready_read)
+            os.close(done_write)
+            float(weights.sum())  # a worker reading the shared weights
+            gc.collect()
+            os.write(ready_write, b"R")
+            os.read(done_read, 1)
+        finally:
+            os._exit(0)
+    os.close(ready_write)
+    os.close(done_read)
+    try:
+        os.read(ready_read, 1)
+        memory = read_process_memory(pid)
+    finally:
+        os.write(done_write, b"D")
+        os.waitpid(pid, 0)
+        os.close(ready_read)
+        os.close(done_write)
+        gc.unfreeze()
+    assert memory['rss_mb'] >= 64
+    assert memory['rss_mb'] - memory['uss_mb'] >= 60  # the weights were never copied
+    print(f"✅ Copy-on-write sharing works! child RSS {memory['rss_mb']:.0f} MB, USS {memory['uss_mb']:.0f} MB")
+    return True
+
+def test_shared_metrics():
+    """Test that workers' metrics aggregate through the shared file and survive recycling"""
+    print("🧪 Testing shared metrics aggregation...")
+    import os
+    import tempfile
+    from shared_metrics import SharedMetrics
+
+    with tempfile.TemporaryDirectory() as directory:
+        shared = SharedMetrics(os.path.join(directory, "metrics.mmap"), slots=4).open()
+        ready, done = os.pipe(), os.pipe()
+
+        def run_worker(queries, sessions):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    shared.register_gauge("sessions", lambda: sessions)
+                    for i in range(queries):
+                        shared.record_query(f"user{i % 50}", "database" if i % 2 else "bedrock",
+                                            0.1 * (i % 10 + 1), i % 10 != 0)
+                        shared.record_handler("database", 0.05, True)
+                    shared.publish_gauges()
+                    os.write(ready[1], b"R")
+                    os.read(done[0], 1)  # stay alive until the parent has read the gauges
+                finally:
+                    os._exit(0)
+            os.read(ready[0], 1)
+            return pid
+
+        workers = [run_worker(100, 3), run_worker(60, 4)]
+        fleet = shared.read()
+        assert fleet['workers'] == 2
+        assert fleet['counters'] == {'queries': 160, 'db_queries': 80, 'bedrock_queries': 80, 'errors': 16}
+        assert fleet['gauges']['sessions'] == 7
+        assert 45 <= fleet['unique_users'] <= 55
+        latency, errors = shared.window("route")
+        assert latency.count == 160 and errors == 16
+        assert abs(latency.percentile(0.5) - 0.5) <= 0.5 * 0.02 + 1e-9
+        os.write(done[1], b"DD")
+        for pid in workers:
+            os.waitpid(pid, 0)
+
+        # An exited worker's counts stay in the fleet totals, its gauges do not
+        fleet = shared.read()
+        assert fleet['workers'] == 0 and fleet['gauges']['sessions'] == 0
+        assert fleet['counters']['queries'] == 160
+        # Reads aggregate published values; they never call back into the gauge readers
+        calls = []
+        shared.register_gauge("active_users", lambda: calls.append(1) or 5)
+        shared.read()
+        assert not calls
+        shared.publish_gauges()
+        assert calls and shared.read()['gauges']['active_users'] == 5
+        replacement = run_worker(10, 1)  # reuses an exited worker's slot
+        os.write(done[1], b"D")
+        os.waitpid(replacement, 0)
+        assert shared.read()['counters']['queries'] == 170
+        assert shared.window("database")[0].count == 170
+        for fd in ready + done:
+            os.close(fd)
+        shared.close()
+    print(f"✅ Shared metrics aggregation works! {fleet['counters']['queries']} queries from exited workers kept")
+    return True
+
+def test_session_store():
+    """Test LRU eviction, idle TTL and byte budgets of the session store"""
+    print("🧪 Testing session store...")
+    from session_store import SessionStore
+
+    now = [1000.0]
+    store = SessionStore(max_users=3, max_history=4, idle_ttl=600, max_user_bytes=2000,
+                         max_total_bytes=5000, clock=lambda: now[0])
+    for user in ("a", "b", "c"):
+        store.add_to_session(user, {"user": "hi", "ai": "hello"})
+    store.get_session("a")  # a is now the most recently used
+    store.add_to_session("d", {"user": "hi", "ai": "hello"})
+    assert list(store.store) == ["c", "a", "d"]  # b, the least recently used, was evicted
+    assert store.evictions['lru'] == 1
+
+    for i in range(6):
+        store.add_to_session("a", {"user": f"question {i}", "ai": "answer"})
+    assert [turn["user"] for turn in store.get_session("a")][-1] == "question 5"
+    assert len(store.get_session("a")) == 4
+
+    store.add_to_session("c", {"user": "paste", "ai": "x" * 10000})  # clipped to the per-user budget
+    assert store.store["c"].bytes <= 2000 and store.get_session("c")[-1]["ai"].endswith("[truncated]")
+    assert store.clipped_turns == 1
+
+    now[0] += 400
+    store.get_session("d")
+    now[0] += 201
+    assert store.cleanup() == 2  # a and c idled out; d was used since
+    assert list(store.store) == ["d"] and store.evictions['ttl'] == 2
+
+    for user in ("e", "f", "g"):
+        store.add_to_session(user, {"user": "q", "ai": "y" * 1500})
+    assert store.total_bytes <= 5000 and store.evictions['bytes'] >= 1
+    assert store.total_bytes == sum(session.bytes for session in store.store.values())
+    stats = store.get_stats()
+    assert stats['sessions'] == len(store) and stats['bytes'] == store.total_bytes
+    print(f"✅ Session store works! evictions {stats['evictions']}")
+    return True
+
+def test_durable_session_store():
+    """Test that sessions survive a restart and follow a user across workers"""
+    print("🧪 Testing durable session store...")
+    import os
+    import sqlite3
+    import tempfile
+    from session_store import SessionStore, SQLiteSessionBackend
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sessions.db")
+        worker_a = SessionStore(max_users=64, stripes=8, backend=SQLiteSessionBackend(path))
+        for i in range(20):
+            worker_a.add_to_session(f"user{i}", {"user": f"question {i}", "ai": "answer"})
+        assert worker_a.get_session("user3")[-1]["user"] == "question 3"
+        assert len(worker_a.pending) == 20  # written behind, not on the request path
+        assert worker_a.flush() == 20 and not worker_a.pending
+        assert len({id(worker_a._stripe(f"user{i}")) for i in range(20)}) > 1
+
+        # A restarted worker, or another one, reads the history through
+        worker_b = SessionStore(max_users=64, stripes=8, backend=SQLiteSessionBackend(path))
+        assert worker_b.get_session("user3") == [{"user": "question 3", "ai": "answer"}]
+        worker_b.add_to_session("user3", {"user": "follow-up", "ai": "more"})
+        worker_b.flush()
+        assert [turn["user"] for turn in worker_a.get_session("user3")] == ["question 3", "follow-up"]
+
+        worker_a.clear_session("user4")
+        worker_a.flush()
+        assert worker_b.get_session("user4") == []
+        stats = worker_b.get_stats()
+        assert stats['durable']['loaded'] == 2 and stats['durable']['written'] == 1
+
+        # Clearing reaches a worker that already holds the session, and its next turn does not revive it
+        assert worker_b.get_session("user5")[-1]["user"] == "question 5"
+        worker_a.clear_session("user5")
+        worker_a.flush()
+        assert worker_b.get_session("user5") == []
+        worker_b.add_to_session("user5", {"user": "fresh start", "ai": "ok"})
+        worker_b.flush()
+        assert [turn["user"] for turn in worker_a.get_session("user5")] == ["fresh start"]
+
+        worker_a.idle_ttl = 0
+        worker_a.cleanup()
+        assert worker_a.backend.count() == 0 and len(worker_a) == 0
+        for store in (worker_a, worker_b):
+            store.backend.close()
+
+        # A path that cannot hold a database fails when the backend is built, not on each lookup
+        try:
+            SQLiteSessionBackend(os.path.join(path, "nested", "sessions.db"))
+            raise AssertionError("backend under a file should not open")
+        except (OSError, sqlite3.Error):
+            pass
+
+        class BrokenBackend:
+            shared = True
+
+            def version(self, user_id, *args):
+                raise OSError("disk gone")
+
+            load = version
+
+        broken = SessionStore(backend=BrokenBackend())
+        assert broken.get_session("user1") == []
+        broken.add_to_session("user1", {"user": "still", "ai": "served"})
+        assert broken.get_session("user1")[-1]["user"] == "still"
+    print("✅ Durable session store works!")
+    return True
+
+def test_history_manager():
+    """Test that long histories are compacted into the token budget"""
+    print("🧪 Testing history manager...")
+    from history_manager import HistoryManager, estimate_tokens, normalize_history, strip_tables
+
+    table = "Here are the sales:\n| region | total |\n|---|---|\n" + "\n".join(f"| r{i} | {i * 10} |" for i in range(40))
+    text, replaced = strip_tables(table)
+    assert replaced == 1 and "[table: 40 rows; columns: region, total]" in text
+    csv = "id,name,amount\n" + "\n".join(f"{i},item{i},{i}.5" for i in range(10))
+    assert strip_tables(csv) == ("[table: 10 rows; columns: id, name, amount]", 1)
+    prose = "Sales rose, costs fell, and margins grew. Then, later, they fell."
+    assert strip_tables(prose) == (prose, 0)
+
+    # Both history shapes: client turns and stored session entries
+    assert normalize_history([{"isUser": True, "text": "hi"}, {"isUser": False, "text": "hello"}]) == \
+        normalize_history([{"user": "hi", "ai": "hello"}]) == [("user", "hi"), ("ai", "hello")]
+
+    manager = HistoryManager(token_budget=400, summary_tokens=100)
+    history = []
+    for i in range(30):
+        history.append({"user": f"What were the sales for region {i}?", "ai": table if i % 3 == 0 else
+                        f"Region {i} sold {i * 100} units. " + "Details follow. " * 20})
+    prepared = manager.prepare(history)
+    assert prepared.prompt_tokens <= 400
+    assert prepared.summarized > 0 and prepared.summary.startswith(("User asked", "AI answered"))
+    assert prepared.messages[-1] == ("ai", history[-1]["ai"].strip())
+    assert prepared.saved_tokens > 0 and prepared.saved_tokens == prepared.raw_tokens - prepared.prompt_tokens
+    assert sum(estimate_tokens(text) for _, text in prepared.messages) <= 400
+
+    # The same history again is served from the caches: nothing is re-summarised
+    summarized = manager.get_stats()['turns_summarized']
+    assert manager.prepare(history).summary == prepared.summary
+    assert manager.get_stats()['turns_summarized'] == summarized
+    # One more turn only summarises what newly fell out of the window
+    history.append({"user": "And in total?", "ai": "Total sales were 43500 units."})
+    manager.prepare(history)
+    stats = manager.get_stats()
+    assert stats['turns_summarized'] - summarized <= 4 and stats['summary_cache_hits'] >= 2
+
+    # A single oversized message is clipped rather than sent whole
+    clipped = manager.prepare([{"isUser": True, "text": "word " * 2000}])
+    assert clipped.prompt_tokens <= 400 and clipped.messages[0][1].endswith("...")
+    print(f"✅ History manager works! saved {stats['saved_percent']}% of history tokens")
+    return True
+
+def test_query_capture():
+    """Test that SQL results reach the caller as rows and column metadata"""
+    print("🧪 Testing query result capture...")
+    import asyncio
+    from datetime import date
+    from decimal import Decimal
+    from columnar import ColumnarResult
+    from database import capture_query_results, get_query_capture
+
+    result = ColumnarResult.from_rows(["chiller", "month", "litres", "active"],
+                                      [("North", None, Decimal("12.5"), True),
+                                       ("South", date(2024, 5, 1), 40, False)])
+
+    def tool(query):
+        # What the SQL tool does after a successful execution, in the agent's worker thread
+        get_query_capture().record(query, result)
+        return "sample"
+
+    async def run_agent():
+        with capture_query_results() as capture:
+            await asyncio.to_thread(tool, "SELECT 1")
+            await asyncio.to_thread(tool, "SELECT chiller, month, litres, active FROM t")
+        return capture
+
+    assert get_query_capture() is None
+    capture = asyncio.run(run_agent())
+    assert get_query_capture() is None
+    assert capture.captured and capture.executions == 2
+    assert capture.query.startswith("SELECT chiller") and capture.result is result
+    assert capture.result.describe() == [
+        {"name": "chiller", "type": "text"}, {"name": "month", "type": "datetime"},
+        {"name": "litres", "type": "number"}, {"name": "active", "type": "boolean"}]
+    assert ColumnarResult.from_rows(["empty"], []).describe() == [{"name": "empty", "type": "unknown"}]
+    print("✅ Query result capture works!")
+    return True
+
+def test_columnar_results():
+    """Test that a columnar result is shared without copies and serializes compactly"""
+    print("🧪 Testing columnar results...")
+    import json
+    import numpy as np
+    from datetime import date
+    from columnar import ColumnarResult
+
+    rows = [(f"Chiller {i % 7}", date(2024, 1 + i % 12, 1), i, None if i % 5 == 0 else i * 1.5, i % 2 == 0)
+            for i in range(1000)]
+    result = ColumnarResult.from_rows(["name", "collection_date", "farmer_id", "quantity", "name"], rows)
+    assert result.names == ["name", "collection_date", "farmer_id", "quantity", "name_2"]
+    assert [array.dtype for array in result.arrays[2:]] == [np.int64, np.float64, np.bool_]
+    assert len(result) == 1000 and result.width == 5
+
+    # Analysis and charts read the same arrays; head() is a view
+    frame = result.head(100).to_frame()
+    assert np.shares_memory(frame["quantity"].to_numpy(), result.column("quantity"))
+    assert np.shares_memory(result.head(10).column("farmer_id"), result.column("farmer_id"))
+    assert frame["quantity"].isna().sum() == 20
+
+    # Serialization restores None and ints, and the columns/rows layout is smaller
+    records = result.to_records()
+    assert records[0] == {"name": "Chiller 0", "collection_date": date(2024, 1, 1), "farmer_id": 0,
+                          "quantity": None, "name_2": True}
+    assert result.to_rows()[3] == ["Chiller 3", date(2024, 4, 1), 3, 4.5, False]
+    with_nulls = ColumnarResult.from_rows(["id"], [(1,), (None,), (3,)])
+    assert with_nulls.to_rows() == [[1], [None], [3]] and with_nulls.describe()[0]["type"] == "number"
+    record_bytes = len(json.dumps(records, default=str))
+    columnar_bytes = len(json.dumps({"columns": result.describe(), "rows": result.to_rows()}, default=str))
+    assert columnar_bytes < record_bytes * 0.7
+    print(f"✅ Columnar results work! {record_bytes} -> {columnar_bytes} payload bytes")
+    return True
+
+def test_result_cache():
+    """Test that formats are rendered only on request and results can be fetched later"""
+    print("🧪 Testing lazy formats and the result cache...")
+    import os
+    import tempfile
+    from columnar import ColumnarResult, render_formats
+    from result_cache import RENDERERS, ResultCache
+
+    result = ColumnarResult.from_rows(["chiller", "quantity"], [(f"Chiller {i}", i * 10) for i in range(200)])
+    assert render_formats(result, ()) == {}
+    assert list(render_formats(result, ["csv", "pdf"])) == ["csv"]
+    rendered = render_formats(result)
+    assert rendered["csv"].startswith("chiller,quantity\nChiller 0,0\n")
+    assert rendered["markdown"].count("\n") == 51 and len(rendered["json"]["data"]) == 200
+    assert render_formats(ColumnarResult.from_rows(["a"], []), ["markdown"]) == {"markdown": "No data available"}
+
+    now = [1000.0]
+    with tempfile.TemporaryDirectory() as directory:
+        worker_a = ResultCache(max_results=2, ttl=600, spill_dir=directory, clock=lambda: now[0])
+        worker_b = ResultCache(max_results=2, ttl=600, spill_dir=directory, clock=lambda: now[0])
+        token = worker_a.put("aaaa0000", result, "SELECT chiller, quantity FROM t", owner=7).token
+        assert worker_a.get("aaaa0000", token, 7).result is result
+        # Another worker on the host reads the spill file, which holds no pickle
+        spilled = worker_b.get("aaaa0000", token, 7)
+        assert spilled.query == "SELECT chiller, quantity FROM t" and spilled.result.to_rows() == result.to_rows()
+        media_type, render = RENDERERS["csv"]
+        assert media_type.startswith("text/csv") and render(spilled.result) == rendered["csv"]
+        with open(os.path.join(directory, "aaaa0000.npz"), "rb") as handle:
+            assert handle.read(2) == b"PK"
+        # Knowing the id (it is in traces and admin metrics) is not enough
+        for cache in (worker_a, worker_b):
+            assert cache.get("aaaa0000", None, 7) is None and cache.get("aaaa0000", "guess", 7) is None
+            assert cache.get("aaaa0000", token, 8) is None and cache.get("aaaa0000", token) is None
+        assert worker_a.get_stats()['denied'] == 4
+
+        tokens = {key: worker_a.put(key, result).token for key in ("bbbb0000", "cccc0000")}
+        assert len(worker_a) == 2 and worker_a.get_stats()['evicted'] == 1
+        assert worker_a.get("aaaa0000", token, 7) is not None  # evicted from memory, still on disk
+        assert worker_a.get("../etc/passwd", token) is None and worker_a.get("ABC", token) is None
+
+        now[0] += 601
+        assert worker_a.get("bbbb0000", tokens["bbbb0000"]) is None and worker_b.get("aaaa0000", token, 7) is None
+        assert worker_a.sweep() >= 3
+        stats = worker_a.get_stats()
+        assert stats['results'] == 0 and stats['bytes'] == 0 and stats['spill_hits'] == 1
+
+        # A spill directory others can write to is tightened, and one owned by someone else refused
+        shared = os.path.join(directory, "shared")
+        os.makedirs(shared)
+        os.chmod(shared, 0o777)
+        ResultCache(spill_dir=shared)
+        assert os.stat(shared).st_mode & 0o777 == 0o700
+        link = os.path.join(directory, "link")
+        os.symlink(shared, link)
+        try:
+            ResultCache(spill_dir=link)
+            raise AssertionError("a symlinked spill directory should be refused")
+        except PermissionError:
+            pass
+    print("✅ Lazy formats and the result cache work!")
+    return True
+
+def test_result_export():
+    """Test that exports stream chunk by chunk and count what they sent"""
+    print("🧪 Testing streaming result export...")
+    import csv
+    import gzip
+    import io
+    from columnar import ARROW_AVAILABLE, ColumnarResult
+    from result_export import ExportStats, export_available
+
+    names = ["collection_date", "farmer", "quantity"]
+    fetched = []
+
+    def cursor(chunks=5, chunk_rows=100):
+        for chunk in range(chunks):
+            fetched.append(chunk)
+            yield ColumnarResult.from_rows(names, [("2024-05-01", f"Farmer {i}", None if i % 10 == 0 else i)
+                                                   for i in range(chunk * chunk_rows, (chunk + 1) * chunk_rows)])
+
+    stats = ExportStats()
+    stream = stats.track(cursor(), "csv")
+    first = next(stream)
+    assert fetched == [0] or fetched == [0, 1]  # encoded as fetched, not after reading everything
+    body = gzip.decompress(first + b"".join(stream))
+    rows = list(csv.reader(io.StringIO(body.decode("utf-8"))))
+    assert rows[0] == names and len(rows) == 501
+    assert rows[1] == ["2024-05-01", "Farmer 0", ""] and rows[500] == ["2024-05-01", "Farmer 499", "499"]
+
+    # A result with no rows still gets its header
+    empty = gzip.decompress(b"".join(stats.track(iter([ColumnarResult.from_rows(names, [])]), "csv")))
+    assert empty.decode("utf-8").strip() == ",".join(names)
+
+    # A client that disconnects closes the cursor and counts as aborted
+    source = cursor(chunks=50)
+    stream = stats.track(source, "csv")
+    next(stream)
+    stream.close()
+    assert source.gi_frame is None and len(fetched) < 60
+    result = stats.get_stats()
+    assert result['completed'] == 2 and result['aborted'] == 1 and result['rows'] >= 500
+    assert export_available("csv") and export_available("parquet") == ARROW_AVAILABLE
+    assert not export_available("xlsx")
+
+    if ARROW_AVAILABLE:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        # An integer column that outgrows int64 after the first chunk still fits the stream's schema
+        overflow = [ColumnarResult.from_rows(["n"], [(1,), (2,)]), ColumnarResult.from_rows(["n"], [(2 ** 64,), (None,)])]
+        for format_name in ("parquet", "arrow"):
+            body = b"".join(stats.track(iter(overflow), format_name))
+            table = pq.read_table(io.BytesIO(body)) if format_name == "parquet" else pa.ipc.open_stream(body).read_all()
+            assert table.schema.field("n").type == pa.float64()
+            assert table.column("n").to_pylist() == [1.0, 2.0, float(2 ** 64), None]
+    print("✅ Streaming result export works!")
+    return True
+
+def test_result_pages():
+    """Test that later pages are spilled once, served as written and shared by workers"""
+    print("🧪 Testing result pagination...")
+    import tempfile
+    import threading
+    from columnar import ColumnarResult
+    from result_pages import PageUnavailable, ResultPager, ResultTooLarge, decode_cursor, encode_cursor
+
+    names = ["farmer", "quantity"]
+    runs, release = [], threading.Event()
+
+    def stream(query, chunk_rows, total=2500):
+        runs.append(query)
+        for offset in range(0, total, chunk_rows):
+            if offset >= 2 * chunk_rows:
+                release.wait(5)  # the tail of the result is still being fetched
+            yield ColumnarResult.from_rows(names, [(f"Farmer {i}", i) for i in range(offset, min(offset + chunk_rows, total))])
+
+    token = encode_cursor("abcd1234", 1)
+    assert decode_cursor(token) == ("abcd1234", 1)
+    for bad in ("", "!!!", encode_cursor("abcd1234", 0), encode_cursor("../etc", 1)):
+        try:
+            decode_cursor(bad)
+            assert False, bad
+        except ValueError:
+            pass
+
+    with tempfile.TemporaryDirectory() as directory:
+        worker_a = ResultPager(directory, stream=stream, page_rows=1000, wait_timeout=5)
+        worker_b = ResultPager(directory, stream=stream, page_rows=1000, wait_timeout=5)
+        # Page 1 is served while the rest of the result is still streaming
+        page, last = worker_a.read_page("abcd1234", "SELECT farmer, quantity FROM t", 1)
+        assert not last and len(page) == 1000 and page.to_rows()[0] == ["Farmer 1000", 1000]
+        release.set()
+        # Another worker reads the same spill instead of running the query again
+        page, last = worker_b.read_page("abcd1234", "SELECT farmer, quantity FROM t", 2)
+        assert last and len(page) == 500 and page.to_rows()[-1] == ["Farmer 2499", 2499]
+        assert worker_a.read_page("abcd1234", "SELECT farmer, quantity FROM t", 3) == (None, True)
+        assert runs == ["SELECT farmer, quantity FROM t"]
+
+        # A failure reaches the reader instead of leaving it waiting, without the database's
+        # message, and the next request spills the result again
+        attempts = []
+
+        def flaky(query, chunk_rows):
+            attempts.append(query)
+            for _ in range(2):
+                yield ColumnarResult.from_rows(names, [("Farmer 0", 0)] * chunk_rows)
+            if len(attempts) == 1:
+                raise RuntimeError("server closed the connection unexpectedly")
+
+        broken = ResultPager(directory, stream=flaky, page_rows=10, wait_timeout=5)
+        assert len(broken.read_page("dcba4321", "SELECT 1", 0)[0]) == 10
+        try:
+            broken.read_page("dcba4321", "SELECT 1", 1)
+            assert False
+        except PageUnavailable as e:
+            assert "retry" in str(e) and "connection" not in str(e)
+        page, last = broken.read_page("dcba4321", "SELECT 1", 1)
+        assert last and len(page) == 10 and len(attempts) == 2
+        assert broken.get_stats()['spills'] == 2
+
+        # Too large to page stays failed, without another run of the query
+        small = ResultPager(directory, stream=stream, page_rows=1000, max_bytes=1024, wait_timeout=5)
+        for _ in range(2):
+            try:
+                small.read_page("eeee0000", "SELECT farmer, quantity FROM t", 1)
+                assert False
+            except ResultTooLarge as e:
+                assert "export" in str(e)
+        assert small.get_stats()['spills'] == 1
+
+        # An empty re-run ends with an empty last page instead of a file that never grows
+        empty = ResultPager(directory, stream=lambda query, chunk_rows: iter(()), page_rows=10, wait_timeout=5)
+        page, last = empty.read_page("eeee1111", "SELECT 1", 0)
+        assert last and len(page) == 0
+        assert empty.read_page("eeee1111", "SELECT 1", 1) == (None, True)
+        stats = worker_a.get_stats()
+        assert stats['spills'] == 1 and stats['completed'] == 1 and stats['pages'] == 1 and stats['rows'] == 2500
+
+        # Frames record their owner and are refused to anyone else
+        owned = ResultPager(directory, stream=stream, page_rows=1000, wait_timeout=5)
+        assert len(owned.read_page("ffff0000", "SELECT farmer, quantity FROM t", 1, owner=7)[0]) == 1000
+        try:
+            owned.read_page("ffff0000", "SELECT farmer, quantity FROM t", 1, owner=8)
+            assert False
+        except PermissionError:
+            assert owned.get_stats()['denied'] == 1
+
+        # Each worker runs at most max_writers spills; more page requests are asked to retry
+        hold = threading.Event()
+
+        def slow(query, chunk_rows):
+            hold.wait(5)
+            yield ColumnarResult.from_rows(names, [("Farmer 0", 0)])
+
+        busy = ResultPager(directory, stream=slow, page_rows=10, wait_timeout=0.2, max_writers=1)
+        for result_id in ("aaaa1111", "bbbb2222"):
+            try:
+                busy.read_page(result_id, "SELECT 1", 1)
+                assert False
+            except PageUnavailable as e:
+                message = str(e)
+        assert "retry" in message and busy.get_stats()['throttled'] == 1
+        hold.set()
+    print("✅ Result pagination works!")
+    return True
+
 def main():
     """Run all tests"""
     print("🚀 Starting optimization verification tests...\n")
@@ -54,7 +1207,32 @@ def main():
     tests = [
         test_memory_monitoring,
         test_imports,
-        test_app_creation
+        test_app_creation,
+        test_deadline_cancellation,
+        test_trace_ring_buffer,
+        test_latency_histograms,
+        test_metrics_exporter,
+        test_metric_rollups,
+        test_durable_metrics_store,
+        test_activity_tracker_soak,
+        test_query_sketches,
+        test_incremental_performance_summary,
+        test_dashboard_stream,
+        test_static_dashboard_assets,
+        test_system_sampler,
+        test_gc_manager,
+        test_memory_governor,
+        test_worker_recycling,
+        test_copy_on_write_sharing,
+        test_shared_metrics,
+        test_session_store,
+        test_durable_session_store,
+        test_history_manager,
+        test_query_capture,
+        test_columnar_results,
+        test_result_cache,
+        test_result_export,
+        test_result_pages
     ]
     
     passed = 0
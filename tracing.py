@@ -0,0 +1,237 @@
+"""
+Request Tracing for Ketha AI Agent
+Lightweight in-process spans per request, kept in a bounded ring buffer
+so the admin dashboard can show where a slow request spent its time
+"""
+
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+from dashboard_config import PERFORMANCE_CONFIG
+from histograms import latency_registry
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler
+    LANGCHAIN_AVAILABLE = True
+except ImportError:
+    BaseCallbackHandler = object
+    LANGCHAIN_AVAILABLE = False
+
+_current_trace = contextvars.ContextVar("ketha_trace", default=None)
+_current_span = contextvars.ContextVar("ketha_span", default=None)
+
+
+class Span:
+    """A single timed stage within a request"""
+
+    __slots__ = ("span_id", "parent_id", "name", "start", "end", "attributes")
+
+    def __init__(self, span_id: int, name: str, start: float, parent_id: Optional[int] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start
+        self.end = None
+        self.attributes = attributes or {}
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round((end - self.start) * 1000, 3),
+            'finished': self.end is not None,
+            'attributes': self.attributes
+        }
+
+
+class Trace:
+    """All spans recorded for one request"""
+
+    def __init__(self, request_id: str, max_spans: int, attributes: Optional[Dict[str, Any]] = None):
+        self.request_id = request_id
+        self.timestamp = datetime.now()
+        self.origin = time.perf_counter()
+        self.max_spans = max_spans
+        self.attributes = attributes or {}
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+        self._next_span_id = 0
+        self.lock = threading.Lock()
+
+    def start_span(self, name: str, parent_id: Optional[int] = None, **attributes) -> Optional[Span]:
+        with self.lock:
+            if len(self.spans) >= self.max_spans:
+                self.dropped_spans += 1
+                return None
+            span = Span(self._next_span_id, name, time.perf_counter(), parent_id, attributes)
+            self._next_span_id += 1
+            self.spans.append(span)
+            return span
+
+    def finish_span(self, span: Optional[Span], **attributes):
+        if span is None:
+            return
+        span.attributes.update(attributes)
+        span.end = time.perf_counter()
+        latency_registry.record("stage", span.name, span.end - span.start)
+
+    def duration_ms(self) -> float:
+        ends = [span.end for span in self.spans if span.end is not None]
+        if not ends:
+            return 0.0
+        return round((max(ends) - self.origin) * 1000, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            spans = list(self.spans)
+        return {
+            'request_id': self.request_id,
+            'timestamp': self.timestamp.isoformat(),
+            'duration_ms': self.duration_ms(),
+            'attributes': self.attributes,
+            'dropped_spans': self.dropped_spans,
+            'spans': [span.to_dict(self.origin) for span in spans]
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'request_id': self.request_id,
+            'timestamp': self.timestamp.isoformat(),
+            'duration_ms': self.duration_ms(),
+            'span_count': len(self.spans),
+            'attributes': self.attributes
+        }
+
+
+class Tracer:
+    """Keeps the most recent traces in a bounded ring buffer keyed by request id"""
+
+    def __init__(self, max_traces: int = 200, max_spans_per_trace: int = 100):
+        self.max_traces = max_traces
+        self.max_spans_per_trace = max_spans_per_trace
+        self.traces = OrderedDict()
+        self.lock = threading.Lock()
+
+    def start_trace(self, request_id: Optional[str] = None, **attributes) -> Trace:
+        """Begin a trace and make it current for this context"""
+        trace = Trace(request_id or uuid.uuid4().hex[:16], self.max_spans_per_trace, attributes)
+        with self.lock:
+            self.traces[trace.request_id] = trace
+            while len(self.traces) > self.max_traces:
+                self.traces.popitem(last=False)
+        _current_trace.set(trace)
+        _current_span.set(None)
+        return trace
+
+    def get_trace(self, request_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            trace = self.traces.get(request_id)
+        return trace.to_dict() if trace else None
+
+    def recent_traces(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self.lock:
+            traces = list(self.traces.values())[-limit:]
+        return [trace.summary() for trace in reversed(traces)]
+
+
+def get_current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time the enclosed block as a span of the current trace; a no-op outside a trace"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = trace.start_span(name, parent.span_id if parent else None, **attributes)
+    token = _current_span.set(current or parent)
+    try:
+        yield current
+    except Exception as e:
+        if current is not None:
+            current.attributes['error'] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        trace.finish_span(current)
+
+
+def traced(name: str):
+    """Decorator form of span() for functions that are always a stage of their own"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """LangChain callback handler that records each LLM step and tool call as a span"""
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent else None
+        self.runs = {}
+        self.llm_steps = 0
+
+    def _start(self, run_id, name: str, **attributes):
+        self.runs[run_id] = self.trace.start_span(name, self.parent_id, **attributes)
+
+    def _finish(self, run_id, **attributes):
+        self.trace.finish_span(self.runs.pop(run_id, None), **attributes)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.llm_steps += 1
+        self._start(run_id, "llm_step", step=self.llm_steps, prompt_chars=sum(len(p) for p in prompts))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.llm_steps += 1
+        self._start(run_id, "llm_step", step=self.llm_steps)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=type(error).__name__)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        tool_name = (serialized or {}).get("name", "tool")
+        self._start(run_id, f"tool:{tool_name}")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=type(error).__name__)
+
+
+def get_tracing_callbacks() -> List[Any]:
+    """Callbacks to pass to a LangChain invoke() so agent steps show up in the current trace"""
+    trace = _current_trace.get()
+    if trace is None or not LANGCHAIN_AVAILABLE:
+        return []
+    return [TracingCallbackHandler(trace)]
+
+
+# Global tracer instance
+tracer = Tracer(
+    max_traces=PERFORMANCE_CONFIG["trace_buffer_size"],
+    max_spans_per_trace=PERFORMANCE_CONFIG["max_spans_per_trace"]
+)